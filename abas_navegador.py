@@ -0,0 +1,203 @@
+import os
+import threading
+import logging
+
+from selenium import webdriver
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.mobile import Mobile
+from selenium.webdriver.remote.switch_to import SwitchTo
+
+from scraper import opcoes_navegador
+from perfis_navegador import obter_perfil, aplicar_perfil
+
+logger = logging.getLogger(__name__)
+
+# Jobs atendidos ao mesmo tempo por um processo Chrome, cada um numa janela isolada (1: um Chrome por job)
+POOL_ABAS_POR_NAVEGADOR = int(os.getenv('POOL_ABAS_POR_NAVEGADOR', '1'))
+# Abas abertas ao longo da vida de um Chrome compartilhado; depois disso ele é trocado quando esvaziar
+POOL_MAX_ABAS_POR_NAVEGADOR = int(os.getenv('POOL_MAX_ABAS_POR_NAVEGADOR', '50'))
+# Com a sessão do chromedriver compartilhada, um driver.get que espera a página bloquearia as outras abas
+POOL_ABAS_PERFIL = os.getenv('POOL_ABAS_PERFIL', 'minimo')
+
+# Sem isso o Chrome reduz timers e renderização das janelas que não estão em primeiro plano
+ARGUMENTOS_ABAS = ['--disable-background-timer-throttling', '--disable-backgrounding-occluded-windows',
+                   '--disable-renderer-backgrounding']
+
+
+class NavegadorCompartilhado:
+    """Um processo Chrome (e seu chromedriver) cujas janelas atendem vários jobs.
+
+    O chromedriver executa os comandos na janela atual da sessão: cada comando de uma aba
+    troca para a janela dela, se preciso, e executa sob o mesmo lock. A janela inicial fica
+    em branco e só é usada para abrir e fechar as demais.
+    """
+
+    def __init__(self, perfil):
+        self.perfil = perfil
+        self.driver = None
+        self.erro = None
+        self.lock = threading.Lock()
+        self.ativas = 0  # abas abertas ou sendo abertas (controlado pela FabricaAbas)
+        self.abertas = 0  # abas abertas desde o início do processo
+        self._iniciado = threading.Event()
+
+    def iniciar(self):
+        """Inicia o Chrome; quem reservou abas nele enquanto isso espera em aguardar()"""
+        try:
+            opcoes = opcoes_navegador(self.perfil)
+            for argumento in ARGUMENTOS_ABAS:
+                opcoes.add_argument(argumento)
+            self.driver = webdriver.Chrome(options=opcoes)
+            self.janela_base = self.driver.current_window_handle
+            self.janela_atual = self.janela_base
+        except Exception as e:
+            self.erro = e
+            raise
+        finally:
+            self._iniciado.set()
+
+    def aguardar(self):
+        self._iniciado.wait()
+        if self.erro:
+            raise self.erro
+
+    def trocar_para(self, janela):
+        # Chamado com o lock
+        if janela != self.janela_atual:
+            self.driver.execute(Command.SWITCH_TO_WINDOW, {'handle': janela})
+            self.janela_atual = janela
+
+    def abrir_janela(self):
+        """Cria um contexto isolado (cookies, storage e cache próprios) com uma janela; retorna (janela, contexto)"""
+        with self.lock:
+            self.trocar_para(self.janela_base)
+            contexto_id = self.driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+            try:
+                janela = self.driver.execute_cdp_cmd('Target.createTarget', {
+                    'url': 'about:blank', 'browserContextId': contexto_id, 'newWindow': True})['targetId']
+            except Exception:
+                self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': contexto_id})
+                raise
+        return janela, contexto_id
+
+    def fechar_janela(self, janela, contexto_id):
+        """Descarta o contexto da aba, o que fecha a janela dela"""
+        with self.lock:
+            self.trocar_para(self.janela_base)
+            self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': contexto_id})
+
+    def encerrar(self):
+        if self.driver:
+            self.driver.quit()
+
+
+class AbaNavegador:
+    """Janela de um NavegadorCompartilhado, usada pelo job como se fosse um driver próprio.
+
+    Envolve o driver do navegador em vez de copiar o estado dele: os métodos e propriedades
+    do WebDriver rodam sobre a aba, então todo comando (inclusive os dos elementos, que têm
+    a aba como pai) passa pelo execute daqui; a sessão (command_executor, session_id, caps)
+    é lida do driver compartilhado. Só os comandos passam pelo lock do navegador, então as
+    pausas entre eles (esperas de postback, WebDriverWait) não atrasam as outras abas.
+    """
+
+    def __init__(self, fabrica, navegador, janela, contexto_id):
+        self.fabrica = fabrica
+        self.navegador = navegador
+        self.janela = janela
+        self.contexto_id = contexto_id
+        self._switch_to = SwitchTo(self)
+        self._mobile = Mobile(self)
+
+    def __getattr__(self, nome):
+        if nome in ('navegador', '__setstate__'):
+            raise AttributeError(nome)
+        driver = self.navegador.driver
+        atributo = getattr(type(driver), nome, None)
+        if hasattr(atributo, '__get__'):
+            # Métodos e propriedades da classe do driver, ligados à aba
+            return atributo.__get__(self, type(self))
+        return getattr(driver, nome)
+
+    def execute(self, driver_command, params=None):
+        with self.navegador.lock:
+            self.navegador.trocar_para(self.janela)
+            resposta = type(self.navegador.driver).execute(self, driver_command, params)
+            if driver_command == Command.SWITCH_TO_WINDOW:
+                self.navegador.janela_atual = params['handle']
+            return resposta
+
+    def quit(self):
+        """Fecha só esta aba; o Chrome é encerrado quando a última aba dele fecha"""
+        self.fabrica.fechar(self)
+
+
+class FabricaAbas:
+    """Fábrica do NavegadorPool que entrega abas isoladas em vez de um Chrome por job.
+
+    Cada processo Chrome atende até `abas` jobs; uma aba nova vai para o processo mais ocupado
+    que ainda tem vaga, para que os outros possam esvaziar e ser encerrados.
+    """
+
+    def __init__(self, abas=POOL_ABAS_POR_NAVEGADOR, max_abas=POOL_MAX_ABAS_POR_NAVEGADOR, perfil=POOL_ABAS_PERFIL):
+        self.abas = abas
+        self.max_abas = max_abas
+        self.perfil = obter_perfil(perfil)
+        self._navegadores = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            navegador = self._reservar()
+            novo = navegador is None
+            if novo:
+                # Entra na lista antes de iniciar: quem pedir uma aba enquanto o Chrome sobe
+                # ocupa as vagas dele em vez de iniciar outro processo
+                navegador = NavegadorCompartilhado(self.perfil)
+                navegador.ativas = navegador.abertas = 1
+                self._navegadores.append(navegador)
+        try:
+            if novo:
+                navegador.iniciar()
+                logger.info(f"Chrome compartilhado iniciado para até {self.abas} abas")
+            else:
+                navegador.aguardar()
+            janela, contexto_id = navegador.abrir_janela()
+            return aplicar_perfil(AbaNavegador(self, navegador, janela, contexto_id), self.perfil)
+        except Exception:
+            self._liberar(navegador)
+            raise
+
+    def fechar(self, aba):
+        try:
+            aba.navegador.fechar_janela(aba.janela, aba.contexto_id)
+        finally:
+            self._liberar(aba.navegador)
+
+    def estatisticas(self):
+        with self._lock:
+            return {'processos': len(self._navegadores), 'abas': sum(n.ativas for n in self._navegadores)}
+
+    def _reservar(self):
+        # Chamado com o lock
+        candidatos = [n for n in self._navegadores
+                      if n.ativas < self.abas and n.abertas < self.max_abas and not n.erro]
+        if not candidatos:
+            return None
+        navegador = max(candidatos, key=lambda n: n.ativas)
+        navegador.ativas += 1
+        navegador.abertas += 1
+        return navegador
+
+    def _liberar(self, navegador):
+        with self._lock:
+            navegador.ativas -= 1
+            vazio = navegador.ativas == 0
+            if vazio:
+                self._navegadores.remove(navegador)
+        if vazio:
+            logger.info(f"Encerrando Chrome compartilhado após {navegador.abertas} abas")
+            try:
+                navegador.encerrar()
+            except Exception as e:
+                logger.warning(f"Erro ao encerrar Chrome compartilhado: {str(e)}")
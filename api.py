@@ -1,20 +1,48 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+import os
+import sys
+
+if __name__ == "__main__":
+    # "python api.py" sobe a API sob "python -m uvicorn api:app" antes de criar qualquer singleton: os
+    # processos do pré-processamento (spawn) reimportam o módulo principal, e este arquivo recriaria em
+    # cada um deles os registros em disco, a caixa de saída, os clientes e o pool de navegadores. O
+    # __main__ do uvicorn não é reimportado.
+    os.execv(sys.executable, [sys.executable, '-m', 'uvicorn', 'api:app', '--host', '0.0.0.0', '--port', '8000',
+                              '--app-dir', os.path.dirname(os.path.abspath(__file__))])
+
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Header
 from pydantic import BaseModel, HttpUrl
 from typing import Optional
-import uvicorn
-from scraper import iniciar_navegador, fazer_login, executar_acoes_simulacao, preencher_formulario_cadastro
+from pipeline import (Pipeline, PipelineHTTP, ErroEtapa, LOGIN, SIMULACAO, PROPOSTA, DADOS_CLIENTE, DOCUMENTOS,
+                      APROVACAO, ORDEM_ETAPAS, ETAPAS_REPETIVEIS, SELENIUM, HTTP, MOTORES)
+from motor_http import SessaoPortal, SessoesHTTP
+from pool_navegadores import NavegadorPool
+from sessoes import GerenciadorSessoes
+from contexto import ContextoCadastro
+from cep import resolvedor_cep
+from notificacoes import caixa_saida
+from contas import registro_contas, SemContaDisponivel, CONTAS_TENTATIVAS
+from concorrencia import ControladorConcorrencia, PortalSaturado, CONCORRENCIA_MAXIMA
+from jobs import GerenciadorJobs, FilaCheia, JobEmAndamento
+from checkpoints import RegistroCheckpoints, CheckpointJob
+from idempotencia import RegistroIdempotencia, ChaveReutilizada, chave_idempotencia, impressao_dados
+from area_trabalho import GerenciadorAreas, AreaTrabalho, ArquivoMuitoGrande, CotaExcedida, ARQUIVO_TAMANHO_MAXIMO, BLOCO
+from repositorio_documentos import RepositorioDocumentos, DOCUMENTOS_DIR
+from buscador_documentos import BuscadorDocumentos, ErroDownload, DOCUMENTOS_DOWNLOADS, DOCUMENTOS_BAIXADOS_DIR, remota
+from preprocessamento_documentos import PreprocessadorDocumentos
+from lote import processar_lote, LOTE_WORKERS
+from metricas import registro as registro_metricas, JOBS_EM_ANDAMENTO, JOBS_TOTAL
+from starlette.concurrency import run_in_threadpool
 from selenium import webdriver
-import os
 import logging
-import requests
-import tempfile
-from urllib.parse import urlparse
 import shutil
 import boto3
 from botocore.client import Config
 from dotenv import load_dotenv
 import json
+import uuid
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -30,6 +58,8 @@ DO_SPACES_BUCKET = os.getenv('DO_SPACES_BUCKET')
 DO_SPACES_FOLDER = os.getenv('DO_SPACES_FOLDER')
 DO_SPACES_REGION = os.getenv('DO_SPACES_REGION')
 DO_SPACES_ENDPOINT = os.getenv('DO_SPACES_ENDPOINT')
+# 'path' para servidores compatíveis com S3 sem subdomínio por bucket (ex.: o mock_portal)
+DO_SPACES_ENDERECAMENTO = os.getenv('DO_SPACES_ENDERECAMENTO', 'virtual')
 
 # Configuração do cliente DO Spaces
 session = boto3.session.Session()
@@ -38,7 +68,7 @@ client = session.client('s3',
     endpoint_url=DO_SPACES_ENDPOINT,
     aws_access_key_id=DO_SPACES_KEY,
     aws_secret_access_key=DO_SPACES_SECRET,
-    config=Config(s3={'addressing_style': 'virtual'})
+    config=Config(s3={'addressing_style': DO_SPACES_ENDERECAMENTO}, max_pool_connections=DOCUMENTOS_DOWNLOADS)
 )
 
 app = FastAPI(title="Scraper API", description="API para automação de cadastro e simulação de cartão")
@@ -64,17 +94,156 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Pool de navegadores pré-iniciados, compartilhado por todos os endpoints
+pool_navegadores = NavegadorPool()
+
+# Sessões autenticadas do PixCard reaproveitadas entre jobs, por usuário
+gerenciador_sessoes = GerenciadorSessoes()
+
+MOTOR_PADRAO = os.getenv('MOTOR_PADRAO', SELENIUM)
+
+# Jobs simultâneos contra o portal, ajustados pela duração e falhas das etapas (CONCORRENCIA_*).
+# Com o Selenium, vagas além dos navegadores do pool só deixariam jobs esperando um navegador
+controlador_concorrencia = ControladorConcorrencia(
+    maxima=min(CONCORRENCIA_MAXIMA, pool_navegadores.tamanho) if MOTOR_PADRAO == SELENIUM else CONCORRENCIA_MAXIMA)
+
+# Etapas executadas por cada endpoint (cada etapa roda no máximo uma vez por job)
+pipeline = Pipeline(gerenciador_sessoes, observar=controlador_concorrencia.observar)
+ETAPAS_SIMULACAO = [LOGIN, SIMULACAO, PROPOSTA]
+ETAPAS_CADASTRO = [LOGIN, DADOS_CLIENTE, DOCUMENTOS, APROVACAO]
+ETAPAS_SIMULACAO_E_CADASTRO = ORDEM_ETAPAS
+
+# Motor HTTP (sem navegador), escolhido por job com o campo "motor"; o Selenium é o fallback
+sessoes_http = SessoesHTTP()
+pipeline_http = PipelineHTTP(sessoes_http, observar=controlador_concorrencia.observar)
+
+# Fila de jobs assíncronos (POST /jobs/simular-e-cadastrar, GET /jobs/{id})
+gerenciador_jobs = GerenciadorJobs()
+JOBS_RETRY_AFTER = int(os.getenv('JOBS_RETRY_AFTER', '30'))
+
+# Etapas concluídas por job, para retomar cadastros que falharam no meio
+registro_checkpoints = RegistroCheckpoints()
+
+# Resultados de cadastros já concluídos e execuções em andamento, por Idempotency-Key ou CPF/matrícula/empregador
+registro_idempotencia = RegistroIdempotencia()
+
+# Diretório temporário por job (AREA_TRABALHO_*); os documentos enviados ou baixados ficam no
+# repositório por conteúdo (DOCUMENTOS_*), uma cópia por documento distinto
+repositorio_documentos = RepositorioDocumentos() if DOCUMENTOS_DIR else None
+areas_trabalho = GerenciadorAreas(repositorio=repositorio_documentos)
+
+# Documentos do lote referenciados por do:// ou http(s)://, baixados em paralelo com cache por ETag; sem o
+# repositório de documentos o buscador guarda as suas cópias em DOCUMENTOS_BAIXADOS_DIR
+buscador_documentos = BuscadorDocumentos(client, DO_SPACES_BUCKET, DO_SPACES_FOLDER,
+                                         repositorio=(RepositorioDocumentos(DOCUMENTOS_BAIXADOS_DIR)
+                                                      if not repositorio_documentos and DOCUMENTOS_BAIXADOS_DIR else None))
+ERROS_DOCUMENTOS = (ErroDownload, ArquivoMuitoGrande, CotaExcedida)
+CAMPOS_ARQUIVOS = ['arquivo_rg_verso', 'arquivo_comprovante_endereco', 'arquivo_comprovante_renda']
+
+# Imagens dos documentos reduzidas e recomprimidas num pool de processos antes do envio ao portal
+preprocessador_documentos = PreprocessadorDocumentos()
+
+# Ocupação do pool e da fila, lidas a cada GET /metrics
+registro_metricas.medidor(
+    'pixcard_navegadores', "Navegadores do pool por estado", ('estado',),
+    coletar=lambda: {(estado,): pool_navegadores.estatisticas()[estado] for estado in ('livres', 'em_uso')})
+registro_metricas.medidor(
+    'pixcard_processos_chrome', "Processos Chrome do pool (com POOL_ABAS_POR_NAVEGADOR, cada um atende várias abas)",
+    coletar=lambda: {(): pool_navegadores.estatisticas()['processos']})
+registro_metricas.medidor(
+    'pixcard_fila_jobs', "Jobs assíncronos por estado", ('estado',),
+    coletar=lambda: {(estado,): gerenciador_jobs.estatisticas()[estado] for estado in ('na_fila', 'executando')})
+registro_metricas.medidor(
+    'pixcard_notificacoes', "Notificações do frontend na caixa de saída por estado", ('estado',),
+    coletar=lambda: {(estado,): quantidade for estado, quantidade in caixa_saida.estatisticas().items()})
+registro_metricas.medidor(
+    'pixcard_contas', "Jobs em execução, limite e pausa (s) restante por conta de operador", ('conta', 'estado'),
+    coletar=lambda: {(usuario, estado): conta[estado] for usuario, conta in registro_contas.estatisticas().items()
+                     for estado in ('em_uso', 'limite', 'pausada_por')})
+
+@app.on_event("startup")
+def iniciar_pool_navegadores():
+    areas_trabalho.limpar_orfas()
+    pool_navegadores.iniciar()
+    gerenciador_jobs.iniciar()
+    # Entrega as notificações que ficaram pendentes de execuções anteriores
+    caixa_saida.iniciar()
+
+@app.on_event("shutdown")
+def encerrar_pool_navegadores():
+    gerenciador_jobs.encerrar()
+    caixa_saida.encerrar()
+    pool_navegadores.encerrar()
+    preprocessador_documentos.encerrar()
+    areas_trabalho.encerrar()
+
+# Endpoints que recebem os três documentos; o corpo maior que o permitido é recusado antes de ser lido
+ENDPOINTS_DOCUMENTOS = {"/simular-e-cadastrar", "/jobs/simular-e-cadastrar"}
+ENVIO_TAMANHO_MAXIMO = ARQUIVO_TAMANHO_MAXIMO * 3 + BLOCO
+MENSAGEM_ENVIO_GRANDE = "Arquivos excedem o tamanho máximo permitido"
+
+class LimitarTamanhoEnvio:
+    """Middleware ASGI que responde 413 a um envio de documentos maior que o limite.
+
+    Com Content-Length o envio é recusado antes de ler o corpo; sem ele (chunked), os bytes são
+    contados à medida que chegam e a leitura é interrompida assim que o limite é ultrapassado.
+    """
+
+    def __init__(self, app, caminhos=ENDPOINTS_DOCUMENTOS, limite=ENVIO_TAMANHO_MAXIMO):
+        self.app = app
+        self.caminhos = caminhos
+        self.limite = limite
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.caminhos:
+            return await self.app(scope, receive, send)
+        tamanho = dict(scope["headers"]).get(b"content-length", b"")
+        if tamanho.isdigit() and int(tamanho) > self.limite:
+            return await self._recusar(scope, receive, send)
+
+        recebidos = 0
+        iniciada = False
+
+        async def receber():
+            nonlocal recebidos
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebidos += len(mensagem.get("body", b""))
+                if recebidos > self.limite:
+                    # O FastAPI repassa HTTPException levantada durante a leitura do formulário
+                    raise HTTPException(status_code=413, detail=MENSAGEM_ENVIO_GRANDE)
+            return mensagem
+
+        async def enviar(mensagem):
+            nonlocal iniciada
+            if mensagem["type"] == "http.response.start":
+                iniciada = True
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receber, enviar)
+        except HTTPException as e:
+            if e.status_code != 413 or iniciada:
+                raise
+            await self._recusar(scope, receive, send)
+
+    async def _recusar(self, scope, receive, send):
+        await JSONResponse(status_code=413, content={"detail": MENSAGEM_ENVIO_GRANDE})(scope, receive, send)
+
+app.add_middleware(LimitarTamanhoEnvio)
+
 class DadosSimulacao(BaseModel):
     cpf: str
     matricula: str
     empregador: str
     valor_margem: str
     tipo_produto: str = "1"
+    motor: Optional[str] = None
 
 class DadosCadastroBase(BaseModel):
-    # Dados de Login
-    usuario: str
-    senha: str
+    # Dados de Login (ignorados quando há contas de operador em CONTAS_ARQUIVO)
+    usuario: Optional[str] = None
+    senha: Optional[str] = None
     
     # Dados de Documentação
     rg: str
@@ -119,230 +288,458 @@ class DadosCadastroBase(BaseModel):
     empregador: str
     valor_margem: str
     tipo_produto: str = "1"
+    motor: Optional[str] = None
 
 def get_do_spaces_url(file_path: str) -> str:
     """Gera a URL completa para um arquivo no DO Spaces"""
     return f"{DO_SPACES_ENDPOINT}/{DO_SPACES_BUCKET}/{DO_SPACES_FOLDER}/{file_path}"
 
-def download_from_do_spaces(file_path: str) -> str:
-    """Download um arquivo do DO Spaces e retorna o caminho local temporário"""
-    try:
-        # Cria um arquivo temporário
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_path)[1])
-        
-        # Log do caminho completo
-        bucket = os.getenv('DO_SPACES_BUCKET')
-        folder = os.getenv('DO_SPACES_FOLDER')
-        full_path = f"{folder}/{file_path}"
-        logger.info(f"Tentando baixar arquivo do DO Spaces: bucket={bucket}, path={full_path}")
-        
-        # Faz o download do arquivo
-        client.download_file(
-            bucket,
-            full_path,
-            temp_file.name
-        )
-        
-        logger.info(f"Arquivo baixado com sucesso para {temp_file.name}")
-        return temp_file.name
-    except Exception as e:
-        logger.error(f"Erro ao baixar arquivo do DO Spaces {file_path}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao baixar arquivo do DO Spaces: {str(e)}")
-
-def process_file_path(file_path: str) -> str:
-    """Processa o caminho do arquivo, baixando se for uma URL ou arquivo do DO Spaces"""
-    if file_path.startswith(('http://', 'https://')):
-        logger.info(f"Baixando arquivo de {file_path}")
-        return download_file(file_path)
-    elif file_path.startswith('do://'):
-        # Remove o prefixo 'do://' e baixa do DO Spaces
-        do_path = file_path[5:]
-        logger.info(f"Baixando arquivo do DO Spaces: {do_path}")
-        return download_from_do_spaces(do_path)
-    logger.info(f"Usando arquivo local: {file_path}")
-    return file_path
-
-def download_file(url: str) -> str:
-    """Download um arquivo de uma URL e retorna o caminho local temporário"""
-    try:
-        # Cria um arquivo temporário
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(urlparse(url).path)[1])
-        
-        # Faz o download do arquivo
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # Salva o arquivo
-        with open(temp_file.name, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        return temp_file.name
-    except Exception as e:
-        logger.error(f"Erro ao baixar arquivo de {url}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao baixar arquivo: {str(e)}")
+def erro_arquivo(e: Exception, descricao: str) -> HTTPException:
+    """Converte erros ao gravar um arquivo na área de trabalho na resposta HTTP"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, ArquivoMuitoGrande):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, CotaExcedida):
+        return HTTPException(status_code=507, detail=str(e))
+    return HTTPException(status_code=500, detail=f"{descricao}: {str(e)}")
 
-async def save_upload_file(upload_file: UploadFile) -> str:
-    """Salva um arquivo enviado e retorna o caminho temporário"""
+async def save_upload_file(upload_file: UploadFile, area: AreaTrabalho) -> str:
+    """Copia um arquivo enviado para a área de trabalho do job, um bloco por vez, e retorna o caminho"""
     try:
-        # Cria um arquivo temporário com a extensão correta
-        suffix = os.path.splitext(upload_file.filename)[1]
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-        
-        # Salva o conteúdo do arquivo
-        content = await upload_file.read()
-        with open(temp_file.name, 'wb') as f:
-            f.write(content)
-            
-        return temp_file.name
+        # A cópia roda numa thread para não bloquear o event loop
+        return await run_in_threadpool(area.copiar, upload_file.filename, upload_file.file)
     except Exception as e:
         logger.error(f"Erro ao salvar arquivo {upload_file.filename}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
+        raise erro_arquivo(e, "Erro ao salvar arquivo")
+
+def aguardar_documentos(documentos: dict):
+    """Função para o preparar do pipeline: completa o contexto com os caminhos dos documentos prontos"""
+    return lambda contexto: contexto.atualizar({campo: futuro.result() for campo, futuro in documentos.items()})
+
+def finalizar_tarefas(futuros):
+    """Cancela as tarefas de documentos que não começaram e aguarda as demais"""
+    # Tarefas ainda em andamento gravariam na área do job depois de removida
+    for futuro in futuros:
+        if not futuro.cancel():
+            futuro.exception()
+
+def executar_pipeline(contexto: ContextoCadastro, etapas: list, ao_mudar_etapa=lambda etapa: None,
+                      checkpoint: CheckpointJob = None, motor: str = None, preparar: dict = None) -> list:
+    """Executa as etapas com o motor escolhido; levanta ErroEtapa se uma etapa falhar.
+
+    No motor HTTP, uma falha no login ou na simulação passa o job para o Selenium, que retoma
+    da etapa que falhou; nas demais a etapa pode ter alterado a proposta antes de falhar, então o
+    job falha e pode ser retomado pelo checkpoint.
+    O job só começa quando o controle de concorrência libera uma vaga contra o portal.
+    Com contas de operador configuradas, o job roda com uma delas (ver _executar_com_conta).
+    preparar é repassado a Pipeline.executar.
+    """
+    motor = motor or MOTOR_PADRAO
+    if motor not in MOTORES:
+        raise ValueError(f"Motor desconhecido: {motor}")
+
+    ao_mudar_etapa("aguardando_portal")
+    with controlador_concorrencia.permissao():
+        JOBS_EM_ANDAMENTO.inc()
+        resultado = 'erro'
+        try:
+            if registro_contas:
+                resultados = _executar_com_conta(contexto, etapas, ao_mudar_etapa, checkpoint, motor, preparar)
+            else:
+                resultados = _executar_motores(contexto, etapas, ao_mudar_etapa, checkpoint, motor, preparar)
+            resultado = 'sucesso'
+            return resultados
+        finally:
+            JOBS_EM_ANDAMENTO.dec()
+            JOBS_TOTAL.inc(resultado=resultado)
+
+def _executar_com_conta(contexto, etapas, ao_mudar_etapa, checkpoint, motor, preparar):
+    """Executa o job com a conta de operador menos ocupada.
+
+    Login recusado ou limitação do portal põem a conta em pausa; o login recusado passa o job
+    para outra conta (até CONTAS_TENTATIVAS). Um job retomado depois da proposta aguarda a conta
+    que a criou.
+    """
+    preferida = checkpoint.proposta.get('usuario') if checkpoint and checkpoint.proposta else None
+    for tentativa in range(1, CONTAS_TENTATIVAS + 1):
+        ao_mudar_etapa("aguardando_conta")
+        with registro_contas.emprestar(preferida) as conta:
+            logger.info(f"Job executando com a conta {conta.usuario}")
+            try:
+                resultados = _executar_motores(contexto.atualizar({'usuario': conta.usuario, 'senha': conta.senha}),
+                                               etapas, ao_mudar_etapa, checkpoint, motor, preparar)
+            except ErroEtapa as e:
+                if e.limitada:
+                    registro_contas.pausar(conta, f"portal limitou a conta na etapa {e.etapa}")
+                elif e.etapa == LOGIN:
+                    registro_contas.pausar(conta, "login recusado")
+                    if not preferida and tentativa < CONTAS_TENTATIVAS:
+                        continue
+                else:
+                    registro_contas.registrar_erro(conta)
+                raise
+            except Exception:
+                registro_contas.registrar_erro(conta)
+                raise
+            registro_contas.registrar_sucesso(conta)
+            return resultados
+
+def _executar_motores(contexto, etapas, ao_mudar_etapa, checkpoint, motor, preparar):
+    resultados_http = []
+    if motor == HTTP:
+        # Sem checkpoint do job, o progresso do motor HTTP é passado ao Selenium em memória
+        checkpoint = checkpoint or CheckpointJob(None, None)
+        iniciadas = []
+
+        def mudar_etapa(etapa):
+            iniciadas.append(etapa)
+            ao_mudar_etapa(etapa)
+
+        try:
+            return pipeline_http.executar(SessaoPortal(), contexto, etapas, mudar_etapa, checkpoint, preparar)
+        except ERROS_DOCUMENTOS:
+            # Documento indisponível: o Selenium falharia do mesmo jeito
+            raise
+        except ErroEtapa as e:
+            if e.limitada:
+                # Conta limitada pelo portal: o Selenium seria limitado do mesmo jeito
+                raise
+            if e.etapa not in ETAPAS_REPETIVEIS:
+                # Repetir um upload ou gravação no Selenium poderia duplicá-lo no portal
+                logger.error(f"Motor HTTP falhou na etapa {e.etapa}, que não pode ser repetida por outro motor")
+                raise
+            logger.warning(f"Motor HTTP falhou na etapa {e.etapa}, continuando com o Selenium")
+            resultados_http = e.resultados
+        except Exception as e:
+            if iniciadas and iniciadas[-1] not in ETAPAS_REPETIVEIS:
+                logger.error(f"Erro no motor HTTP na etapa {iniciadas[-1]} ({str(e)}), que não pode ser repetida")
+                raise
+            logger.warning(f"Erro no motor HTTP ({str(e)}), continuando com o Selenium")
+
+    ao_mudar_etapa("aguardando_navegador")
+    with pool_navegadores.emprestar() as driver:
+        try:
+            resultados = pipeline.executar(driver, contexto, etapas, ao_mudar_etapa, checkpoint, preparar)
+        except ErroEtapa as e:
+            e.resultados = resultados_http + [r for r in e.resultados if not (resultados_http and r.get('retomada'))]
+            raise
+    return resultados_http + [r for r in resultados if not (resultados_http and r.get('retomada'))]
+
+def executar_etapas(contexto: ContextoCadastro, etapas: list, ao_mudar_etapa=lambda etapa: None,
+                    job_id: str = None, motor: str = None, preparar: dict = None) -> list:
+    """Executa as etapas do pipeline para um endpoint (síncrono, roda fora do event loop).
+
+    Com job_id, as etapas concluídas em execuções anteriores do mesmo job não são repetidas;
+    um job_id já usado para outro cadastro é recusado (400).
+    """
+    # A consulta do CEP começa antes do navegador, para estar pronta na etapa dados_cliente
+    resolvedor_cep.prefetch(contexto.cep)
+    headers = {"X-Job-Id": job_id} if job_id else None
+    try:
+        checkpoint = registro_checkpoints.abrir(job_id, contexto) if job_id else None
+        if checkpoint and checkpoint.etapas_concluidas:
+            logger.info(f"Retomando job {job_id}; etapas já concluídas: {checkpoint.etapas_concluidas}")
+        return executar_pipeline(contexto, etapas, ao_mudar_etapa, checkpoint, motor, preparar)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (SemContaDisponivel, PortalSaturado) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={**(headers or {}), "Retry-After": str(JOBS_RETRY_AFTER)})
+    except ErroEtapa as e:
+        if e.limitada:
+            raise HTTPException(status_code=503, detail=f"Conta limitada pelo portal na etapa {e.etapa}",
+                                headers={**(headers or {}), "Retry-After": str(JOBS_RETRY_AFTER)})
+        if e.etapa == LOGIN:
+            raise HTTPException(status_code=401, detail="Erro ao fazer login", headers=headers)
+        raise HTTPException(status_code=500, detail=f"Erro na etapa {e.etapa}", headers=headers)
 
 @app.post("/simular-cartao")
-async def simular_cartao(dados: DadosSimulacao):
+def simular_cartao(dados: DadosSimulacao):
     try:
         logger.info("Iniciando simulação de cartão")
         logger.info(f"Dados recebidos: {dados.dict()}")
         
-        driver = iniciar_navegador()
-        url_inicial = "https://pixcard.banksofttecnologia.com.br/AppCartao/Pages/Simulacao/ICSimulacao"
+        # Dados do job; login e demais campos vêm do .env
+        contexto = ContextoCadastro.do_ambiente().atualizar(dados.dict())
         
-        # Configura as variáveis de ambiente temporariamente
-        os.environ['CPF'] = dados.cpf
-        os.environ['MATRICULA'] = dados.matricula
-        os.environ['EMPREGADOR'] = dados.empregador
-        os.environ['VALOR_MARGEM'] = dados.valor_margem
-        os.environ['TIPO_PRODUTO'] = dados.tipo_produto
-        
-        logger.info("Tentando fazer login")
-        if fazer_login(driver, url_inicial):
-            logger.info("Login realizado com sucesso")
-            driver.get(url_inicial)
-            logger.info("Iniciando simulação")
-            if executar_acoes_simulacao(driver):
-                logger.info("Simulação realizada com sucesso")
-                return {"status": "success", "message": "Simulação realizada com sucesso"}
-            else:
-                logger.error("Erro ao executar simulação")
-                raise HTTPException(status_code=500, detail="Erro ao executar simulação")
-        else:
-            logger.error("Erro ao fazer login")
-            raise HTTPException(status_code=401, detail="Erro ao fazer login")
+        etapas = executar_etapas(contexto, ETAPAS_SIMULACAO, motor=dados.motor)
+        logger.info("Simulação realizada com sucesso")
+        return {"status": "success", "message": "Simulação realizada com sucesso", "etapas": etapas}
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro durante a simulação: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if 'driver' in locals():
-            logger.info("Fechando navegador")
-            driver.quit()
 
 @app.post("/cadastrar-cliente")
-async def cadastrar_cliente(dados: DadosCadastroBase):
+def cadastrar_cliente(dados: DadosCadastroBase):
     try:
         logger.info("Iniciando cadastro de cliente")
         logger.info(f"Dados recebidos: {dados.dict()}")
         
-        driver = iniciar_navegador()
-        url_inicial = "https://pixcard.banksofttecnologia.com.br/AppCartao/Pages/Simulacao/ICSimulacao"
+        # Dados do job (valores ausentes vêm do .env)
+        contexto = ContextoCadastro.do_ambiente().atualizar(dados.dict())
         
-        # Configura todas as variáveis de ambiente
-        for key, value in dados.dict().items():
-            os.environ[key.upper()] = value
-        
-        logger.info("Tentando fazer login")
-        if fazer_login(driver, url_inicial):
-            logger.info("Login realizado com sucesso")
-            logger.info("Iniciando preenchimento do formulário")
-            if preencher_formulario_cadastro(driver):
-                logger.info("Cadastro realizado com sucesso")
-                return {"status": "success", "message": "Cadastro realizado com sucesso"}
-            else:
-                logger.error("Erro ao preencher formulário")
-                raise HTTPException(status_code=500, detail="Erro ao preencher formulário")
-        else:
-            logger.error("Erro ao fazer login")
-            raise HTTPException(status_code=401, detail="Erro ao fazer login")
+        etapas = executar_etapas(contexto, ETAPAS_CADASTRO, motor=dados.motor)
+        logger.info("Cadastro realizado com sucesso")
+        return {"status": "success", "message": "Cadastro realizado com sucesso", "etapas": etapas}
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro durante o cadastro: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+def executar_simular_e_cadastrar(dados_dict: dict, ao_mudar_etapa=lambda etapa: None, job_id: str = None,
+                                 area: AreaTrabalho = None) -> dict:
+    """Executa login, simulação e cadastro de forma síncrona (chamado por uma thread, nunca pelo event loop)
+
+    Com a área de trabalho do job, os documentos são pré-processados enquanto o login e a simulação acontecem.
+    """
+    # Dados do job (valores ausentes vêm do .env)
+    contexto = ContextoCadastro.do_ambiente().atualizar(dados_dict)
+    documentos = preprocessador_documentos.iniciar(
+        {campo: dados_dict[campo] for campo in CAMPOS_ARQUIVOS if dados_dict.get(campo)}, area) if area else {}
+    
+    try:
+        etapas = executar_etapas(contexto, ETAPAS_SIMULACAO_E_CADASTRO, ao_mudar_etapa, job_id, dados_dict.get('motor'),
+                                 preparar={DOCUMENTOS: aguardar_documentos(documentos)})
     finally:
-        if 'driver' in locals():
-            logger.info("Fechando navegador")
-            driver.quit()
+        finalizar_tarefas(documentos.values())
+    logger.info("Simulação e cadastro realizados com sucesso")
+    return {"status": "success", "message": "Simulação e cadastro realizados com sucesso", "job_id": job_id, "etapas": etapas}
+
+def iniciar_idempotente(rota: str, idempotency_key: Optional[str], dados_dict: dict, job_id: str):
+    """Registra a requisição no registro de idempotência; retorna (execução ou None sem chave, dona)"""
+    contexto = ContextoCadastro.do_ambiente().atualizar(dados_dict)
+    chave = chave_idempotencia(rota, idempotency_key, contexto.cpf, contexto.matricula, contexto.empregador)
+    if not chave:
+        return None, True
+    try:
+        return registro_idempotencia.iniciar(chave, impressao_dados(dados_dict), job_id, conferir=bool(idempotency_key))
+    except ChaveReutilizada as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def concluir_idempotente(execucao, resultado=None, erro=None):
+    if execucao:
+        registro_idempotencia.concluir(execucao.chave, resultado, erro)
+
+async def salvar_arquivos_cadastro(dados_dict: dict, arquivos: dict) -> AreaTrabalho:
+    """Salva os arquivos enviados numa área de trabalho nova, grava os caminhos em dados_dict e retorna a área"""
+    area = areas_trabalho.criar()
+    try:
+        for campo, upload_file in arquivos.items():
+            dados_dict[campo] = await save_upload_file(upload_file, area)
+    except Exception:
+        area.remover()
+        raise
+    return area
 
 @app.post("/simular-e-cadastrar")
 async def simular_e_cadastrar(
     dados: str = Form(...),
     arquivo_rg_verso: UploadFile = File(...),
     arquivo_comprovante_endereco: UploadFile = File(...),
-    arquivo_comprovante_renda: UploadFile = File(...)
+    arquivo_comprovante_renda: UploadFile = File(...),
+    job_id: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
-    temp_files = []
+    # Reenviar com o job_id de uma tentativa que falhou retoma a partir da última etapa concluída
+    job_id = job_id or uuid.uuid4().hex
     try:
         # Converte a string JSON para dicionário
         dados_dict = json.loads(dados)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="JSON inválido nos dados do formulário")
+    
+    # Uma repetição (mesmo Idempotency-Key, ou mesmo CPF, matrícula e empregador) aguarda a
+    # execução em andamento ou recebe o resultado já concluído, sem abrir outro navegador
+    # O registro usa SQLite e um lock disputado com as threads dos jobs: fora do event loop
+    execucao, dona = await run_in_threadpool(iniciar_idempotente, "/simular-e-cadastrar", idempotency_key, dados_dict, job_id)
+    if not dona:
+        logger.info(f"Requisição repetida, usando o resultado do job {execucao.job_id}")
+        # shield: a desistência desta repetição não pode cancelar a execução da original
+        return await asyncio.shield(asyncio.wrap_future(execucao.futuro))
+    
+    try:
+        resultado = await executar_simular_e_cadastrar_enviado(dados_dict, {
+            'arquivo_rg_verso': arquivo_rg_verso,
+            'arquivo_comprovante_endereco': arquivo_comprovante_endereco,
+            'arquivo_comprovante_renda': arquivo_comprovante_renda
+        }, job_id)
+    except BaseException as e:
+        # Um erro só libera a chave (nada é gravado); sem await, que numa requisição cancelada seria cancelado também
+        concluir_idempotente(execucao, erro=e)
+        raise
+    await run_in_threadpool(concluir_idempotente, execucao, resultado)
+    return resultado
+
+async def executar_simular_e_cadastrar_enviado(dados_dict: dict, arquivos: dict, job_id: str) -> dict:
+    """Grava os documentos enviados na área do job e executa a simulação e o cadastro"""
+    area = None
+    try:
         logger.info("Iniciando simulação e cadastro")
         logger.info(f"Dados recebidos: {dados_dict}")
         
-        # Salva os arquivos enviados
-        arquivo_rg_verso_path = await save_upload_file(arquivo_rg_verso)
-        arquivo_comprovante_endereco_path = await save_upload_file(arquivo_comprovante_endereco)
-        arquivo_comprovante_renda_path = await save_upload_file(arquivo_comprovante_renda)
-        
-        # Adiciona os arquivos à lista de temporários
-        temp_files.extend([
-            arquivo_rg_verso_path,
-            arquivo_comprovante_endereco_path,
-            arquivo_comprovante_renda_path
-        ])
-        
-        # Atualiza o dicionário com os caminhos dos arquivos
-        dados_dict['arquivo_rg_verso'] = arquivo_rg_verso_path
-        dados_dict['arquivo_comprovante_endereco'] = arquivo_comprovante_endereco_path
-        dados_dict['arquivo_comprovante_renda'] = arquivo_comprovante_renda_path
+        # Salva os arquivos enviados e atualiza o dicionário com os caminhos
+        area = await salvar_arquivos_cadastro(dados_dict, arquivos)
         
-        driver = iniciar_navegador()
-        url_inicial = "https://pixcard.banksofttecnologia.com.br/AppCartao/Pages/Simulacao/ICSimulacao"
-        
-        # Configura todas as variáveis de ambiente
-        for key, value in dados_dict.items():
-            os.environ[key.upper()] = value
-        
-        logger.info("Tentando fazer login")
-        if fazer_login(driver, url_inicial):
-            logger.info("Login realizado com sucesso")
-            driver.get(url_inicial)
-            logger.info("Iniciando simulação")
-            if executar_acoes_simulacao(driver):
-                logger.info("Simulação realizada com sucesso")
-                logger.info("Iniciando preenchimento do formulário")
-                if preencher_formulario_cadastro(driver):
-                    logger.info("Cadastro realizado com sucesso")
-                    return {"status": "success", "message": "Simulação e cadastro realizados com sucesso"}
-                else:
-                    logger.error("Erro ao preencher formulário")
-                    raise HTTPException(status_code=500, detail="Erro ao preencher formulário")
-            else:
-                logger.error("Erro ao executar simulação")
-                raise HTTPException(status_code=500, detail="Erro ao executar simulação")
-        else:
-            logger.error("Erro ao fazer login")
-            raise HTTPException(status_code=401, detail="Erro ao fazer login")
+        # O fluxo Selenium é síncrono: roda numa thread para não bloquear o event loop
+        return await run_in_threadpool(executar_simular_e_cadastrar, dados_dict, lambda etapa: None, job_id, area)
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro durante simulação e cadastro: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Limpa arquivos temporários
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-                logger.info(f"Arquivo temporário removido: {temp_file}")
-            except Exception as e:
-                logger.error(f"Erro ao remover arquivo temporário {temp_file}: {str(e)}")
+        # Limpa a área de trabalho do job
+        if area:
+            area.remover()
 
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+@app.post("/jobs/simular-e-cadastrar", status_code=202)
+async def submeter_simular_e_cadastrar(
+    dados: str = Form(...),
+    arquivo_rg_verso: UploadFile = File(...),
+    arquivo_comprovante_endereco: UploadFile = File(...),
+    arquivo_comprovante_renda: UploadFile = File(...),
+    job_id: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Enfileira a simulação e cadastro e retorna o id do job imediatamente.
+
+    Informar o job_id de um job que falhou o retoma a partir da última etapa concluída.
+    Uma repetição (mesmo Idempotency-Key, ou mesmo CPF, matrícula e empregador) recebe o
+    job já existente em vez de enfileirar outro.
+    """
+    try:
+        dados_dict = json.loads(dados)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="JSON inválido nos dados do formulário")
+    
+    job_id = job_id or uuid.uuid4().hex
+    execucao, dona = await run_in_threadpool(iniciar_idempotente, "/jobs/simular-e-cadastrar", idempotency_key,
+                                             dados_dict, job_id)
+    if not dona:
+        logger.info(f"Requisição repetida, usando o job {execucao.job_id}")
+        job = gerenciador_jobs.obter(execucao.job_id)
+        if job:
+            return {"job_id": execucao.job_id, "status": job['status']}
+        # O job já saiu da fila de resultados (JOBS_TTL), mas o resultado continua guardado
+        if execucao.futuro.done():
+            return {"job_id": execucao.job_id, "status": "concluido", "resultado": execucao.futuro.result()}
+        return {"job_id": execucao.job_id, "status": "executando"}
+    
+    resolvedor_cep.prefetch(dados_dict.get('cep'))
+    try:
+        area = await salvar_arquivos_cadastro(dados_dict, {
+            'arquivo_rg_verso': arquivo_rg_verso,
+            'arquivo_comprovante_endereco': arquivo_comprovante_endereco,
+            'arquivo_comprovante_renda': arquivo_comprovante_renda
+        })
+    except Exception as e:
+        concluir_idempotente(execucao, erro=e)
+        raise
+    
+    def job(job_id, dados_dict):
+        try:
+            resultado = executar_simular_e_cadastrar(
+                dados_dict,
+                lambda etapa: gerenciador_jobs.atualizar_etapa(job_id, etapa),
+                job_id,
+                area
+            )
+        except Exception as e:
+            concluir_idempotente(execucao, erro=e)
+            raise
+        concluir_idempotente(execucao, resultado)
+        return resultado
+    
+    try:
+        job_id = gerenciador_jobs.submeter(job, dados_dict, ao_finalizar=area.remover, job_id=job_id)
+    except JobEmAndamento as e:
+        area.remover()
+        concluir_idempotente(execucao, erro=e)
+        raise HTTPException(status_code=409, detail=str(e))
+    except FilaCheia as e:
+        area.remover()
+        concluir_idempotente(execucao, erro=e)
+        logger.warning(str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(JOBS_RETRY_AFTER)})
+    
+    logger.info(f"Job {job_id} enfileirado")
+    return {"job_id": job_id, "status": "pendente"}
+
+def executar_registro_lote(registro: dict, caminhos_locais: bool = False) -> dict:
+    """Executa simulação e cadastro de um registro de lote; documentos podem ser http(s):// ou do://
+
+    caminhos_locais: aceita também caminhos de arquivos do servidor (só na linha de comando, lote.py;
+    pela API qualquer arquivo legível pelo processo seria enviado ao portal).
+    Registros com job_id retomam a partir das etapas já concluídas em execuções anteriores do lote.
+    """
+    dados = dict(registro)
+    job_id = dados.pop('job_id', None)
+    referencias = {campo: dados.pop(campo) for campo in CAMPOS_ARQUIVOS if dados.get(campo)}
+    locais = [campo for campo, referencia in referencias.items() if not remota(referencia)]
+    if locais and not caminhos_locais:
+        return {'status': 'error', 'job_id': job_id, 'etapa_falha': 'entrada', 'etapas': [],
+                'erro': f"Documentos devem ser referenciados por http(s):// ou do:// ({', '.join(locais)})"}
+    resolvedor_cep.prefetch(dados.get('cep'))
+    area = areas_trabalho.criar()
+    # Os documentos são baixados e pré-processados enquanto o login e a simulação acontecem;
+    # a proposta só é criada depois que todos estiverem disponíveis
+    downloads = buscador_documentos.iniciar(referencias, area)
+    documentos = preprocessador_documentos.iniciar(downloads, area)
+    aguardar = aguardar_documentos(documentos)
+    try:
+        contexto = ContextoCadastro.do_ambiente().atualizar(dados)
+        try:
+            checkpoint = registro_checkpoints.abrir(job_id, contexto) if job_id else None
+            etapas = executar_pipeline(contexto, ETAPAS_SIMULACAO_E_CADASTRO, checkpoint=checkpoint, motor=dados.get('motor'),
+                                       preparar={PROPOSTA: aguardar, DOCUMENTOS: aguardar})
+        except ERROS_DOCUMENTOS as e:
+            return {'status': 'error', 'job_id': job_id, 'etapa_falha': 'download_documentos', 'erro': str(e), 'etapas': []}
+        except ValueError as e:
+            return {'status': 'error', 'job_id': job_id, 'etapa_falha': 'entrada', 'erro': str(e), 'etapas': []}
+        except SemContaDisponivel as e:
+            return {'status': 'error', 'job_id': job_id, 'etapa_falha': 'conta', 'erro': str(e), 'etapas': []}
+        except PortalSaturado as e:
+            return {'status': 'error', 'job_id': job_id, 'etapa_falha': 'portal', 'erro': str(e), 'etapas': []}
+        except ErroEtapa as e:
+            return {'status': 'error', 'job_id': job_id, 'etapa_falha': e.etapa, 'erro': str(e), 'etapas': e.resultados}
+        return {'status': 'success', 'job_id': job_id, 'etapas': etapas}
+    finally:
+        finalizar_tarefas(list(documentos.values()) + list(downloads.values()))
+        area.remover()
+
+@app.post("/lote/simular-e-cadastrar")
+def simular_e_cadastrar_lote(arquivo: UploadFile = File(...), workers: int = LOTE_WORKERS):
+    """Processa um arquivo JSONL de cadastros e devolve os resultados em NDJSON conforme cada registro termina"""
+    linhas = arquivo.file.read().decode('utf-8').splitlines()
+    workers = max(1, min(workers, pool_navegadores.tamanho))
+    logger.info(f"Iniciando lote com {len(linhas)} linhas e {workers} workers")
+    
+    resultados = processar_lote(linhas, executar_registro_lote, workers)
+    return StreamingResponse(
+        (json.dumps(resultado, ensure_ascii=False) + "\n" for resultado in resultados),
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/jobs/{job_id}")
+async def consultar_job(job_id: str):
+    """Retorna status, etapa atual e resultado de um job"""
+    job = gerenciador_jobs.obter(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.get("/contas")
+def consultar_contas():
+    """Ocupação, jobs executados e pausa de cada conta de operador"""
+    return registro_contas.estatisticas()
+
+@app.get("/metrics")
+def metricas():
+    """Métricas no formato texto do Prometheus: duração das etapas e passos, falhas, pool e fila"""
+    return PlainTextResponse(registro_metricas.exportar(), media_type="text/plain; version=0.0.4")
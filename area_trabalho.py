@@ -0,0 +1,211 @@
+import os
+import uuid
+import atexit
+import shutil
+import tempfile
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava, as áreas órfãs não são detectadas
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Diretório das áreas de trabalho dos jobs (pode ficar num tmpfs, ex.: /dev/shm/pixcard)
+AREA_TRABALHO_DIR = os.getenv('AREA_TRABALHO_DIR', os.path.join(tempfile.gettempdir(), 'pixcard-jobs'))
+# Bytes somados de todos os arquivos em disco deste processo
+AREA_TRABALHO_COTA = int(os.getenv('AREA_TRABALHO_COTA', str(512 * 1024 * 1024)))
+ARQUIVO_TAMANHO_MAXIMO = int(os.getenv('ARQUIVO_TAMANHO_MAXIMO', str(10 * 1024 * 1024)))
+BLOCO = 1024 * 1024
+
+_TRAVA = '.trava'
+
+
+class ArquivoMuitoGrande(Exception):
+    """O arquivo passou do tamanho máximo enquanto era gravado"""
+
+
+class CotaExcedida(Exception):
+    """Não há espaço na cota da área de trabalho para mais um arquivo"""
+
+
+class AreaTrabalho:
+    """Diretório temporário de um job; arquivos entram por blocos, com limite de tamanho e cota.
+
+    Com um repositório de documentos no gerenciador, os arquivos vão para o repositório
+    (um por conteúdo) e a área guarda só as referências, devolvidas em remover().
+    """
+
+    def __init__(self, gerenciador, caminho):
+        self.gerenciador = gerenciador
+        self.caminho = caminho
+        self.bytes = 0
+        self.arquivos = []
+        self.documentos = []
+
+    def gravar(self, nome, blocos, tamanho_maximo=None):
+        """Grava os blocos em um arquivo da área e retorna o caminho.
+
+        Levanta ArquivoMuitoGrande ou CotaExcedida assim que o limite é atingido,
+        sem esperar o fim do envio; o arquivo parcial é apagado.
+        """
+        return self.gravar_documento(nome, blocos, tamanho_maximo)[1]
+
+    def gravar_documento(self, nome, blocos, tamanho_maximo=None):
+        """Como gravar, retornando (hash no repositório ou None sem repositório, caminho)"""
+        tamanho_maximo = tamanho_maximo or self.gerenciador.tamanho_maximo
+        if self.gerenciador.repositorio:
+            documento = self.gerenciador.repositorio.guardar(nome, blocos, tamanho_maximo)
+            return documento[0], self._referenciar(documento)
+        caminho = os.path.join(self.caminho, f"{len(self.arquivos)}-{nome_seguro(nome)}")
+        gravados = 0
+        try:
+            with open(caminho, 'wb') as f:
+                for bloco in blocos:
+                    if not bloco:
+                        continue
+                    if gravados + len(bloco) > tamanho_maximo:
+                        raise ArquivoMuitoGrande(
+                            f"{nome} excede o tamanho máximo de {tamanho_maximo // (1024 * 1024)}MB")
+                    self.gerenciador._reservar(len(bloco))
+                    gravados += len(bloco)
+                    f.write(bloco)
+        except BaseException:
+            self._apagar(caminho)
+            self.gerenciador._liberar(gravados)
+            raise
+        self.bytes += gravados
+        self.arquivos.append(caminho)
+        return None, caminho
+
+    def copiar(self, nome, arquivo, tamanho_maximo=None):
+        """Grava o conteúdo de um objeto de arquivo (ex.: UploadFile.file) lendo um bloco por vez"""
+        if self.gerenciador.repositorio and arquivo.seekable():
+            return self._referenciar(self.gerenciador.repositorio.guardar_arquivo(
+                nome, arquivo, tamanho_maximo or self.gerenciador.tamanho_maximo))
+        return self.gravar(nome, iter(lambda: arquivo.read(BLOCO), b''), tamanho_maximo)
+
+    def remover(self):
+        """Apaga a área inteira, devolve o espaço à cota e as referências ao repositório"""
+        for hash_documento in self.documentos:
+            self.gerenciador.repositorio.liberar(hash_documento)
+        self.documentos = []
+        shutil.rmtree(self.caminho, ignore_errors=True)
+        self.gerenciador._liberar(self.bytes)
+        self.bytes = 0
+        self.arquivos = []
+
+    def referenciar(self, hash_documento):
+        """Usa um documento já guardado no repositório; retorna o caminho ou None se ele não existe mais"""
+        documento = self.gerenciador.repositorio.referenciar(hash_documento) if self.gerenciador.repositorio else None
+        return self._referenciar(documento) if documento else None
+
+    def _referenciar(self, documento):
+        hash_documento, caminho = documento
+        self.documentos.append(hash_documento)
+        return caminho
+
+    def _apagar(self, caminho):
+        try:
+            os.unlink(caminho)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.remover()
+
+
+class GerenciadorAreas:
+    """Cria as áreas de trabalho dos jobs sob um diretório do processo e controla a cota.
+
+    O diretório do processo fica travado (flock) enquanto ele vive; ao iniciar, diretórios
+    de processos que morreram sem limpar são apagados.
+    repositorio: RepositorioDocumentos opcional onde os arquivos dos jobs são guardados sem duplicatas.
+    """
+
+    def __init__(self, diretorio=AREA_TRABALHO_DIR, cota=AREA_TRABALHO_COTA, tamanho_maximo=ARQUIVO_TAMANHO_MAXIMO,
+                 repositorio=None):
+        self.diretorio = diretorio
+        self.repositorio = repositorio
+        self.cota = cota
+        self.tamanho_maximo = tamanho_maximo
+        self._usados = 0
+        self._lock = threading.Lock()
+        self._processo = None
+        self._trava = None
+
+    def criar(self):
+        """Cria a área de um job"""
+        caminho = os.path.join(self._diretorio_processo(), uuid.uuid4().hex)
+        os.makedirs(caminho)
+        return AreaTrabalho(self, caminho)
+
+    def limpar_orfas(self):
+        """Apaga as áreas de processos que terminaram sem limpar (ex.: worker que caiu)"""
+        if not fcntl or not os.path.isdir(self.diretorio):
+            return 0
+        removidas = 0
+        for nome in os.listdir(self.diretorio):
+            caminho = os.path.join(self.diretorio, nome)
+            if caminho == self._processo or not os.path.isdir(caminho):
+                continue
+            if not os.path.exists(os.path.join(caminho, _TRAVA)):
+                continue  # processo ainda criando o diretório
+            try:
+                with open(os.path.join(caminho, _TRAVA), 'a') as trava:
+                    fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # processo ainda vivo
+            shutil.rmtree(caminho, ignore_errors=True)
+            removidas += 1
+        if removidas:
+            logger.info(f"{removidas} áreas de trabalho órfãs removidas de {self.diretorio}")
+        return removidas
+
+    def encerrar(self):
+        """Apaga o diretório do processo"""
+        with self._lock:
+            if self._processo:
+                shutil.rmtree(self._processo, ignore_errors=True)
+                self._processo = None
+            if self._trava:
+                self._trava.close()
+                self._trava = None
+            self._usados = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {"usados": self._usados, "cota": self.cota}
+
+    def _diretorio_processo(self):
+        with self._lock:
+            if not self._processo:
+                caminho = os.path.join(self.diretorio, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+                os.makedirs(caminho)
+                self._trava = open(os.path.join(caminho, _TRAVA), 'w')
+                if fcntl:
+                    fcntl.flock(self._trava, fcntl.LOCK_EX)
+                self._processo = caminho
+                atexit.register(self.encerrar)
+            return self._processo
+
+    def _reservar(self, tamanho):
+        with self._lock:
+            if self._usados + tamanho > self.cota:
+                raise CotaExcedida("Cota da área de trabalho esgotada; tente novamente em instantes")
+            self._usados += tamanho
+
+    def _liberar(self, tamanho):
+        with self._lock:
+            self._usados = max(0, self._usados - tamanho)
+
+
+def nome_seguro(nome):
+    """Nome de arquivo sem diretórios nem caracteres especiais"""
+    nome = os.path.basename(nome or '') or 'arquivo'
+    return ''.join(c if c.isalnum() or c in '.-_' else '_' for c in nome)[-100:]
@@ -0,0 +1,460 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from contexto import ContextoCadastro
+from pipeline import Pipeline, PipelineHTTP, ErroEtapa, ORDEM_ETAPAS, SELENIUM, HTTP, MOTORES
+from motor_http import SessaoPortal, SessoesHTTP
+from sessoes import GerenciadorSessoes
+from pool_navegadores import NavegadorPool
+from scraper import iniciar_navegador
+from abas_navegador import FabricaAbas
+from perfis_navegador import PERFIS, NAVEGADOR_PERFIL
+from cep import resolvedor_cep
+from concorrencia import ControladorConcorrencia
+import mock_portal
+
+# Resultados de cada execução, acumulados para comparar execuções
+BENCHMARK_ARQUIVO = os.getenv('BENCHMARK_ARQUIVO', 'benchmarks/resultados.jsonl')
+
+# Lead compatível com as opções do mock (ver mock_portal.OPCOES)
+LEAD_EXEMPLO = {
+    'usuario': mock_portal.USUARIO, 'senha': mock_portal.SENHA,
+    'cpf': '637.250.882-68', 'matricula': '123456', 'empregador': '51', 'valor_margem': '300,00', 'tipo_produto': '1',
+    'rg': '123456', 'data_emissao_rg': '01/01/2010', 'orgao_emissor': 'SSP', 'uf_emissao': 'RR',
+    'naturalidade': 'BOA VISTA', 'uf_naturalidade': 'RR', 'sexo': 'MASCULINO', 'estado_civil': '2', 'nome_mae': 'MARIA DA SILVA',
+    'cep': '69301-000', 'numero': '100', 'complemento': 'CASA', 'data_admissao': '20/03/2021',
+    'profissao': '1', 'descricao_profissao': 'SERVIDOR', 'cargo': 'ANALISTA', 'renda': '3500,00',
+    'tipo_conta': '1', 'banco': '001', 'agencia': '1234', 'conta': '56789', 'digito': '0',
+    'ddd': '95', 'telefone': '99999-0000', 'email': 'cliente@exemplo.com',
+}
+
+
+def instrumentar(driver, contador):
+    """Conta os comandos WebDriver enviados pelo driver (cada um é uma ida e volta ao chromedriver)"""
+    executar = driver.execute
+
+    def execute(comando, parametros=None):
+        contador[id(driver)] += 1
+        return executar(comando, parametros)
+
+    driver.execute = execute
+    return driver
+
+
+def _filhos_por_processo():
+    filhos = defaultdict(list)
+    for nome in os.listdir('/proc'):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f'/proc/{nome}/stat') as f:
+                # O nome do processo vem entre parênteses e pode conter espaços
+                campos = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        filhos[int(campos[1])].append(int(nome))
+    return filhos
+
+
+def _memoria_kb(pid):
+    # PSS divide as páginas compartilhadas entre os processos do Chrome; sem smaps_rollup, usa o RSS
+    for arquivo, campo in (('smaps_rollup', 'Pss:'), ('status', 'VmRSS:')):
+        try:
+            with open(f'/proc/{pid}/{arquivo}') as f:
+                for linha in f:
+                    if linha.startswith(campo):
+                        return int(linha.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def memoria_processos(raizes):
+    """Memória (KB) e quantidade dos processos em raizes e de todos os seus descendentes (só Linux)"""
+    filhos = _filhos_por_processo()
+    pendentes, vistos, total = list(raizes), set(), 0
+    while pendentes:
+        pid = pendentes.pop()
+        if pid in vistos:
+            continue
+        vistos.add(pid)
+        total += _memoria_kb(pid)
+        pendentes.extend(filhos.get(pid, []))
+    return total, len(vistos)
+
+
+class AmostradorMemoria:
+    """Acompanha o pico de memória dos chromedrivers (e dos Chromes abertos por eles) durante um nível"""
+
+    def __init__(self, raizes, intervalo=0.5):
+        self.raizes = raizes
+        self.intervalo = intervalo
+        self.pico_kb = 0
+        self.processos = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name="benchmark-memoria", daemon=True)
+
+    def __enter__(self):
+        if os.path.isdir('/proc'):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _amostrar(self):
+        while True:
+            total, processos = memoria_processos(set(self.raizes))
+            if total > self.pico_kb:
+                self.pico_kb, self.processos = total, processos
+            if self._parar.wait(self.intervalo):
+                break
+
+
+def criar_documentos(diretorio, tamanho=200 * 1024):
+    """Gera os três documentos enviados em cada job"""
+    caminhos = {}
+    for campo in ('arquivo_rg_verso', 'arquivo_comprovante_endereco', 'arquivo_comprovante_renda'):
+        caminho = os.path.join(diretorio, f'{campo}.jpg')
+        with open(caminho, 'wb') as f:
+            f.write(b'\xff\xd8\xff' + os.urandom(tamanho))
+        caminhos[campo] = caminho
+    return caminhos
+
+
+class Executor:
+    """Executa jobs completos com um motor e mede etapas e comandos de cada job"""
+
+    def __init__(self, motor, url_inicial, concorrencia, perfil=None, controlador=None, abas=1):
+        self.motor = motor
+        self.concorrencia = concorrencia
+        self.controlador = controlador
+        self._comandos = defaultdict(int)
+        # PIDs dos chromedrivers, para medir a memória dos navegadores
+        self.processos = set()
+        observar = controlador.observar if controlador else None
+        if motor == SELENIUM:
+            criar = FabricaAbas(abas, perfil=perfil) if abas > 1 else lambda: iniciar_navegador(perfil)
+            self.pool = NavegadorPool(tamanho=concorrencia, fabrica=lambda: self._registrar(criar()))
+            self.pipeline = Pipeline(GerenciadorSessoes(), url_inicial, observar)
+        else:
+            self.pool = None
+            self.pipeline = PipelineHTTP(SessoesHTTP(), url_inicial, observar)
+
+    def __enter__(self):
+        if self.pool:
+            self.pool.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool:
+            self.pool.encerrar()
+
+    def executar(self, contexto):
+        if self.controlador:
+            # concorrencia é a carga oferecida; o controlador decide quantos jobs rodam de fato
+            with self.controlador.permissao():
+                return self._executar(contexto)
+        return self._executar(contexto)
+
+    def _executar(self, contexto):
+        inicio = time.monotonic()
+        try:
+            if self.pool:
+                with self.pool.emprestar() as driver:
+                    antes = self._comandos[id(driver)]
+                    resultados, erro = self._pipeline(driver, contexto)
+                    comandos = self._comandos[id(driver)] - antes
+            else:
+                sessao = SessaoPortal()
+                requisicoes = []
+                sessao.http.hooks['response'].append(lambda response, *args, **kwargs: requisicoes.append(1))
+                resultados, erro = self._pipeline(sessao, contexto)
+                comandos = len(requisicoes)
+        except Exception as e:
+            resultados, erro, comandos = [], str(e), 0
+        return {'resultados': resultados, 'erro': erro, 'comandos': comandos, 'duracao': time.monotonic() - inicio}
+
+    def _registrar(self, driver):
+        self.processos.add(driver.service.process.pid)
+        return instrumentar(driver, self._comandos)
+
+    def _pipeline(self, driver, contexto):
+        try:
+            return self.pipeline.executar(driver, contexto, ORDEM_ETAPAS), None
+        except ErroEtapa as e:
+            return e.resultados, str(e)
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _resumo(valores):
+    if not valores:
+        return None
+    return {'media': round(statistics.mean(valores), 3), 'p50': round(_percentil(valores, 50), 3),
+            'p95': round(_percentil(valores, 95), 3), 'max': round(max(valores), 3)}
+
+
+def rodar_nivel(motor, url_inicial, concorrencia, jobs, contexto, perfil=None, trafego=None, janela=None, abas=1):
+    """Roda `jobs` jobs com `concorrencia` em paralelo e resume tempos por etapa, comandos, memória e vazão.
+
+    trafego: função que retorna os bytes já enviados pelo portal (só disponível no mock).
+    janela: com ela, um ControladorConcorrencia (janela em segundos) limita os jobs simultâneos.
+    abas: jobs por processo Chrome no Selenium (1: um Chrome por job).
+    """
+    cpu_inicio = time.process_time()
+    controlador = (ControladorConcorrencia(maxima=concorrencia, janela=janela, ativo=True)
+                   if janela is not None else None)
+    with Executor(motor, url_inicial, concorrencia, perfil, controlador, abas) as executor:
+        bytes_inicio = trafego() if trafego else None
+        inicio = time.monotonic()
+        with AmostradorMemoria(executor.processos) as memoria, \
+                ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="benchmark") as pool:
+            medicoes = list(pool.map(lambda _: executor.executar(contexto), range(jobs)))
+        duracao = time.monotonic() - inicio
+        bytes_por_job = round((trafego() - bytes_inicio) / jobs) if trafego else None
+
+    por_etapa = defaultdict(list)
+    for medicao in medicoes:
+        for resultado in medicao['resultados']:
+            if resultado['sucesso']:
+                por_etapa[resultado['etapa']].append(resultado['duracao'])
+    sucesso = [m for m in medicoes if not m['erro']]
+    return {
+        'motor': motor,
+        'perfil': perfil if motor == SELENIUM else None,
+        'abas': abas if motor == SELENIUM else None,
+        'concorrencia': concorrencia,
+        'jobs': jobs,
+        'sucesso': len(sucesso),
+        'falhas': jobs - len(sucesso),
+        'erros': sorted({m['erro'] for m in medicoes if m['erro']}),
+        'duracao': round(duracao, 3),
+        'jobs_por_minuto': round(len(sucesso) / duracao * 60, 2) if duracao > 0 else 0,
+        'cpu_por_job': round((time.process_time() - cpu_inicio) / jobs, 3),
+        'job': _resumo([m['duracao'] for m in sucesso]),
+        'comandos_por_job': _resumo([m['comandos'] for m in sucesso]),
+        'bytes_por_job': bytes_por_job,
+        # Pico dos navegadores dividido pelos jobs simultâneos (a concorrência)
+        'memoria': ({'pico_mb': round(memoria.pico_kb / 1024, 1), 'processos': memoria.processos,
+                     'mb_por_job': round(memoria.pico_kb / 1024 / concorrencia, 1)} if memoria.pico_kb else None),
+        'etapas': {etapa: _resumo(por_etapa[etapa]) for etapa in ORDEM_ETAPAS if por_etapa[etapa]},
+        'adaptativo': ({chave: valor for chave, valor in controlador.estatisticas().items() if chave in ('limite', 'decisoes')}
+                       if controlador else None),
+    }
+
+
+def comparar_perfis(niveis):
+    """Tempo e bytes economizados por job em cada perfil do Selenium em relação ao perfil completo
+    (ou ao primeiro perfil medido) na mesma concorrência e com as mesmas abas por navegador"""
+    referencias = {}
+    for nivel in niveis:
+        if nivel['motor'] == SELENIUM and nivel['job']:
+            chave = (nivel['concorrencia'], nivel.get('abas'))
+            atual = referencias.get(chave)
+            if atual is None or (nivel['perfil'] == 'completo' and atual['perfil'] != 'completo'):
+                referencias[chave] = nivel
+    for nivel in niveis:
+        referencia = referencias.get((nivel['concorrencia'], nivel.get('abas')))
+        if nivel['motor'] != SELENIUM or not nivel['job'] or not referencia or referencia is nivel:
+            continue
+        nivel['economia'] = {
+            'referencia': referencia['perfil'],
+            'segundos_por_job': round(referencia['job']['media'] - nivel['job']['media'], 3),
+            'bytes_por_job': (referencia['bytes_por_job'] - nivel['bytes_por_job']
+                              if referencia['bytes_por_job'] is not None and nivel['bytes_por_job'] is not None else None),
+        }
+    return niveis
+
+
+def comparar_abas(niveis):
+    """Memória por job e vazão das abas em relação a um Chrome por job, no mesmo perfil e concorrência"""
+    referencias = {(nivel['perfil'], nivel['concorrencia']): nivel for nivel in niveis
+                   if nivel['motor'] == SELENIUM and nivel.get('abas') == 1}
+    for nivel in niveis:
+        referencia = referencias.get((nivel['perfil'], nivel['concorrencia']))
+        if nivel['motor'] != SELENIUM or (nivel.get('abas') or 1) == 1 or not referencia:
+            continue
+        nivel['vs_um_navegador_por_job'] = {
+            'mb_por_job': (round(nivel['memoria']['mb_por_job'] - referencia['memoria']['mb_por_job'], 1)
+                           if nivel['memoria'] and referencia['memoria'] else None),
+            'jobs_por_minuto': round(nivel['jobs_por_minuto'] - referencia['jobs_por_minuto'], 2),
+        }
+    return niveis
+
+
+def _versao():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def salvar(execucao, arquivo=BENCHMARK_ARQUIVO):
+    diretorio = os.path.dirname(arquivo)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    with open(arquivo, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(execucao, ensure_ascii=False) + "\n")
+
+
+def imprimir(niveis, saida=sys.stdout):
+    saida.write(f"{'motor':<22}{'conc':>5}{'ok/jobs':>9}{'jobs/min':>10}{'job p50':>9}{'job p95':>9}{'cmds':>7}"
+                f"{'cpu/job':>9}{'KB/job':>9}{'MB/job':>9}\n")
+    for nivel in niveis:
+        job = nivel['job'] or {}
+        comandos = nivel['comandos_por_job'] or {}
+        motor = f"{nivel['motor']}/{nivel['perfil']}" if nivel.get('perfil') else nivel['motor']
+        if (nivel.get('abas') or 1) > 1:
+            motor += f" x{nivel['abas']}"
+        kb = round(nivel['bytes_por_job'] / 1024) if nivel.get('bytes_por_job') is not None else '-'
+        mb = nivel['memoria']['mb_por_job'] if nivel.get('memoria') else '-'
+        saida.write(f"{motor:<22}{nivel['concorrencia']:>5}{nivel['sucesso']:>5}/{nivel['jobs']:<3}"
+                    f"{nivel['jobs_por_minuto']:>10}{job.get('p50', '-'):>9}{job.get('p95', '-'):>9}"
+                    f"{comandos.get('media', '-'):>7}{nivel['cpu_por_job']:>9}{kb:>9}{mb:>9}\n")
+        memoria = nivel.get('memoria')
+        if memoria:
+            saida.write(f"    navegadores: pico de {memoria['pico_mb']} MB em {memoria['processos']} processos\n")
+        abas = nivel.get('vs_um_navegador_por_job')
+        if abas:
+            saida.write(f"    vs um Chrome por job: {abas['mb_por_job'] if abas['mb_por_job'] is not None else '-'} MB "
+                        f"por job, {abas['jobs_por_minuto']:+} jobs/min\n")
+        economia = nivel.get('economia')
+        if economia:
+            kb_economizados = round(economia['bytes_por_job'] / 1024) if economia['bytes_por_job'] is not None else '-'
+            saida.write(f"    economia vs {economia['referencia']}: {economia['segundos_por_job']}s e "
+                        f"{kb_economizados} KB por job\n")
+        adaptativo = nivel.get('adaptativo')
+        if adaptativo:
+            decisoes = adaptativo['decisoes']
+            saida.write(f"    concorrência adaptativa: limite final {adaptativo['limite']} "
+                        f"({decisoes['aumento']} aumentos, {decisoes['reducao']} reduções)\n")
+        for etapa, resumo in nivel['etapas'].items():
+            saida.write(f"    {etapa:<15} média {resumo['media']:>7}s  p95 {resumo['p95']:>7}s\n")
+        for erro in nivel['erros']:
+            saida.write(f"    erro: {erro}\n")
+
+
+def comparar(arquivo=BENCHMARK_ARQUIVO, ultimas=5):
+    """Mostra as últimas execuções salvas lado a lado"""
+    if not os.path.exists(arquivo):
+        print(f"Nenhuma execução salva em {arquivo}")
+        return
+    with open(arquivo, encoding='utf-8') as f:
+        execucoes = [json.loads(linha) for linha in f if linha.strip()][-ultimas:]
+    for execucao in execucoes:
+        print(f"\n== {execucao['em']}  versão {execucao.get('versao') or '-'}  {execucao.get('descricao') or ''}")
+        imprimir(execucao['niveis'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede login, simulação e cadastro contra o mock local do PixCard")
+    parser.add_argument('--motores', default=SELENIUM, help=f"Motores separados por vírgula ({', '.join(MOTORES)})")
+    parser.add_argument('--perfis', default=NAVEGADOR_PERFIL,
+                        help=f"Perfis do navegador medidos no Selenium, separados por vírgula ({', '.join(PERFIS)})")
+    parser.add_argument('--abas', default='1',
+                        help="Jobs por processo Chrome no Selenium, separados por vírgula (1: um Chrome por job)")
+    parser.add_argument('--concorrencia', default='1,2,4', help="Níveis de concorrência separados por vírgula")
+    parser.add_argument('--jobs', type=int, default=4, help="Jobs por nível de concorrência")
+    parser.add_argument('--url', help="Portal já em execução (padrão: sobe o mock_portal numa porta livre)")
+    parser.add_argument('--lead', help="JSON com os dados do job (padrão: lead de exemplo compatível com o mock)")
+    parser.add_argument('--atraso', action='append', default=[], metavar='TIPO=SEGUNDOS', help="Atrasos do mock")
+    parser.add_argument('--capacidade', type=int, help="Requisições simultâneas que o mock atende sem ficar mais lento")
+    parser.add_argument('--adaptativo', type=float, nargs='?', const=5, metavar='JANELA',
+                        help="Limita os jobs com o controle adaptativo de concorrência (janela em segundos, padrão 5); "
+                             "a concorrência passa a ser o máximo")
+    parser.add_argument('--verboso', action='store_true', help="Mostra a saída do scraper durante os jobs")
+    parser.add_argument('--descricao', help="Texto guardado junto com a execução")
+    parser.add_argument('--arquivo', default=BENCHMARK_ARQUIVO, help="Onde acumular os resultados")
+    parser.add_argument('--comparar', type=int, nargs='?', const=5, metavar='N', help="Mostra as últimas N execuções e sai")
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(args.arquivo, args.comparar)
+        return
+
+    motores = [motor.strip() for motor in args.motores.split(',')]
+    for motor in motores:
+        if motor not in MOTORES:
+            parser.error(f"Motor desconhecido: {motor}")
+    perfis = [perfil.strip() for perfil in args.perfis.split(',')]
+    for perfil in perfis:
+        if perfil not in PERFIS:
+            parser.error(f"Perfil desconhecido: {perfil}")
+    niveis_concorrencia = [int(nivel) for nivel in args.concorrencia.split(',')]
+    niveis_abas = [int(abas) for abas in args.abas.split(',')]
+
+    for item in args.atraso:
+        tipo, segundos = item.split('=', 1)
+        mock_portal.ATRASOS[tipo] = float(segundos)
+    if args.capacidade is not None:
+        mock_portal.CAPACIDADE = args.capacidade
+
+    servidor = None
+    base = args.url
+    if not base:
+        servidor, base = mock_portal.iniciar_servidor()
+        # CEP e notificação do frontend também vão para o mock, para não medir serviços externos
+        resolvedor_cep.url_base = base + '/ws'
+        os.environ['API_URL'] = base + '/api/status'
+    url_inicial = base.rstrip('/') + mock_portal.SIMULACAO
+
+    trafego = (lambda: mock_portal.estado.estatisticas()['bytes_enviados']) if servidor else None
+
+    dados = dict(LEAD_EXEMPLO)
+    if args.lead:
+        with open(args.lead, encoding='utf-8') as f:
+            dados.update(json.load(f))
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as diretorio:
+        contexto = ContextoCadastro().atualizar(dict(dados, **criar_documentos(diretorio)))
+        niveis = []
+        for motor in motores:
+            for perfil in (perfis if motor == SELENIUM else [None]):
+                for abas in (niveis_abas if motor == SELENIUM else [1]):
+                    for concorrencia in niveis_concorrencia:
+                        descricao = f"{motor} ({perfil}{f', {abas} abas por Chrome' if abas > 1 else ''})" if perfil else motor
+                        print(f"Executando {args.jobs} jobs com o motor {descricao} e concorrência {concorrencia}...",
+                              file=sys.stderr)
+                        # Os print() do scraper poluiriam o relatório
+                        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(sys.stdout if args.verboso else nulo):
+                            niveis.append(rodar_nivel(motor, url_inicial, concorrencia, args.jobs, contexto, perfil,
+                                                     trafego, args.adaptativo, abas))
+        comparar_perfis(niveis)
+        comparar_abas(niveis)
+
+    if servidor:
+        servidor.shutdown()
+
+    execucao = {
+        'em': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'versao': _versao(),
+        'descricao': args.descricao,
+        'portal': 'mock' if servidor else base,
+        'atrasos': dict(mock_portal.ATRASOS) if servidor else None,
+        'capacidade': mock_portal.CAPACIDADE if servidor else None,
+        'niveis': niveis,
+    }
+    salvar(execucao, args.arquivo)
+    imprimir(niveis)
+    print(f"\nResultados salvos em {args.arquivo}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from urllib.parse import urlparse
+
+from botocore.exceptions import ClientError
+
+from area_trabalho import ArquivoMuitoGrande, CotaExcedida, BLOCO
+from cliente_http import cliente_http
+
+logger = logging.getLogger(__name__)
+
+# Downloads simultâneos de documentos (também é o tamanho do pool S3)
+DOCUMENTOS_DOWNLOADS = int(os.getenv('DOCUMENTOS_DOWNLOADS', '6'))
+DOCUMENTOS_TIMEOUT_CONEXAO = float(os.getenv('DOCUMENTOS_TIMEOUT_CONEXAO', '5'))
+DOCUMENTOS_TIMEOUT_LEITURA = float(os.getenv('DOCUMENTOS_TIMEOUT_LEITURA', '60'))
+# Referências lembradas com o ETag e o documento baixado
+DOCUMENTOS_REFERENCIAS = int(os.getenv('DOCUMENTOS_REFERENCIAS', '10000'))
+# Cópias dos documentos baixados, para reaproveitá-los quando as áreas não usam o repositório de documentos
+DOCUMENTOS_BAIXADOS_DIR = os.getenv('DOCUMENTOS_BAIXADOS_DIR', 'cache/baixados')
+
+
+class ErroDownload(Exception):
+    """Um documento referenciado por do:// ou http(s):// não pôde ser baixado"""
+
+    def __init__(self, referencia, causa):
+        super().__init__(f"Erro ao baixar {referencia}: {str(causa)}")
+        self.referencia = referencia
+        self.causa = causa
+
+
+class BuscadorDocumentos:
+    """Baixa os documentos referenciados por do:// (DO Spaces) e http(s):// em paralelo.
+
+    Lembra o ETag de cada referência e o documento guardado no repositório; uma nova busca
+    da mesma referência é condicional (If-None-Match) e, sem mudança, reaproveita o documento
+    sem baixar de novo. Caminhos locais são usados como estão (a API só os aceita do lote.py).
+    repositorio: RepositorioDocumentos próprio, usado quando a área do job não tem repositório;
+    o documento baixado fica nele e a área recebe uma cópia local.
+    """
+
+    def __init__(self, cliente_s3, bucket, pasta, workers=DOCUMENTOS_DOWNLOADS,
+                 timeout=(DOCUMENTOS_TIMEOUT_CONEXAO, DOCUMENTOS_TIMEOUT_LEITURA), tamanho_cache=DOCUMENTOS_REFERENCIAS,
+                 repositorio=None):
+        self.s3 = cliente_s3
+        self.bucket = bucket
+        self.pasta = pasta
+        self.repositorio = repositorio
+        self.timeout = timeout
+        self.tamanho_cache = tamanho_cache
+        self._etags = OrderedDict()  # referência -> (etag, hash do documento)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="documentos")
+
+        self._http = cliente_http
+
+    def iniciar(self, referencias, area):
+        """Começa a buscar {campo: referência} na área do job; retorna {campo: Future com o caminho local}"""
+        futuros = {}
+        for campo, referencia in referencias.items():
+            if remota(referencia):
+                futuros[campo] = self._executor.submit(self.buscar, referencia, area)
+            else:
+                futuros[campo] = Future()
+                futuros[campo].set_result(referencia)
+        return futuros
+
+    def buscar(self, referencia, area):
+        """Baixa (ou reaproveita) um documento e retorna o caminho local; levanta ErroDownload"""
+        try:
+            if referencia.startswith('do://'):
+                return self._buscar_s3(referencia, area)
+            if referencia.startswith(('http://', 'https://')):
+                return self._buscar_http(referencia, area)
+            return referencia
+        except (ArquivoMuitoGrande, CotaExcedida):
+            raise
+        except Exception as e:
+            logger.error(f"Erro ao baixar {referencia}: {str(e)}")
+            raise ErroDownload(referencia, e)
+
+    def _buscar_s3(self, referencia, area):
+        chave = f"{self.pasta}/{referencia[5:]}" if self.pasta else referencia[5:]
+        parametros = {'Bucket': self.bucket, 'Key': chave}
+        conhecido = self._conhecido(referencia)
+        if conhecido:
+            parametros['IfNoneMatch'] = conhecido[0]
+        try:
+            resposta = self.s3.get_object(**parametros)
+        except ClientError as e:
+            if conhecido and e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304:
+                caminho = self._reaproveitar(conhecido[1], chave, area)
+                if caminho:
+                    logger.info(f"{referencia} sem alteração (ETag {conhecido[0]}), reaproveitado")
+                    return caminho
+                # O documento saiu do repositório: baixa de novo sem condição
+                self._esquecer(referencia)
+                return self._buscar_s3(referencia, area)
+            raise
+        logger.info(f"Baixando {referencia} do DO Spaces: bucket={self.bucket}, path={chave}")
+        corpo = resposta['Body']
+        try:
+            hash_documento, caminho = self._gravar(chave, corpo.iter_chunks(BLOCO), area)
+        finally:
+            corpo.close()
+        self._lembrar(referencia, resposta.get('ETag'), hash_documento)
+        return caminho
+
+    def _buscar_http(self, referencia, area):
+        headers = {}
+        conhecido = self._conhecido(referencia)
+        if conhecido:
+            headers['If-None-Match'] = conhecido[0]
+        with self._http.get(referencia, stream=True, headers=headers, timeout=self.timeout) as resposta:
+            if resposta.status_code == 304 and conhecido:
+                caminho = self._reaproveitar(conhecido[1], urlparse(referencia).path, area)
+                if caminho:
+                    logger.info(f"{referencia} sem alteração (ETag {conhecido[0]}), reaproveitado")
+                    return caminho
+                self._esquecer(referencia)
+                return self._buscar_http(referencia, area)
+            resposta.raise_for_status()
+            tamanho = resposta.headers.get('Content-Length')
+            if tamanho and tamanho.isdigit() and int(tamanho) > area.gerenciador.tamanho_maximo:
+                raise ArquivoMuitoGrande(
+                    f"{referencia} excede o tamanho máximo de {area.gerenciador.tamanho_maximo // (1024 * 1024)}MB")
+            logger.info(f"Baixando arquivo de {referencia}")
+            hash_documento, caminho = self._gravar(urlparse(referencia).path, resposta.iter_content(chunk_size=BLOCO),
+                                                   area)
+        self._lembrar(referencia, resposta.headers.get('ETag'), hash_documento)
+        return caminho
+
+    def _gravar(self, nome, blocos, area):
+        """Grava o documento baixado na área; retorna (hash no repositório usado ou None, caminho)"""
+        if area.gerenciador.repositorio or not self.repositorio:
+            return area.gravar_documento(nome, blocos)
+        hash_documento, guardado = self.repositorio.guardar(nome, blocos, area.gerenciador.tamanho_maximo)
+        try:
+            return hash_documento, self._copiar(nome, guardado, area)
+        finally:
+            self.repositorio.liberar(hash_documento)
+
+    def _reaproveitar(self, hash_documento, nome, area):
+        """Caminho na área do documento já baixado, ou None se ele não está mais guardado"""
+        if area.gerenciador.repositorio:
+            return area.referenciar(hash_documento)
+        documento = self.repositorio.referenciar(hash_documento) if self.repositorio else None
+        if not documento:
+            return None
+        try:
+            return self._copiar(nome, documento[1], area)
+        finally:
+            self.repositorio.liberar(hash_documento)
+
+    def _copiar(self, nome, guardado, area):
+        with open(guardado, 'rb') as f:
+            return area.gravar(nome, iter(lambda: f.read(BLOCO), b''))
+
+    def _conhecido(self, referencia):
+        with self._lock:
+            return self._etags.get(referencia)
+
+    def _lembrar(self, referencia, etag, hash_documento):
+        # Sem ETag ou sem nenhum repositório de documentos não há como reaproveitar
+        if not etag or not hash_documento:
+            return
+        with self._lock:
+            self._etags[referencia] = (etag, hash_documento)
+            self._etags.move_to_end(referencia)
+            while len(self._etags) > self.tamanho_cache:
+                self._etags.popitem(last=False)
+
+    def _esquecer(self, referencia):
+        with self._lock:
+            self._etags.pop(referencia, None)
+
+
+def remota(referencia):
+    return bool(referencia) and referencia.startswith(('do://', 'http://', 'https://'))
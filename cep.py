@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from cliente_http import cliente_http
+
+logger = logging.getLogger(__name__)
+
+# Configuração da consulta de CEP
+CEP_URL_BASE = os.getenv('CEP_URL_BASE', 'https://viacep.com.br/ws')
+CEP_CACHE_TAMANHO = int(os.getenv('CEP_CACHE_TAMANHO', '5000'))
+CEP_CACHE_ARQUIVO = os.getenv('CEP_CACHE_ARQUIVO', 'cache/cep.sqlite3')
+CEP_CACHE_TTL = float(os.getenv('CEP_CACHE_TTL', str(30 * 24 * 3600)))
+CEP_TIMEOUT_CONEXAO = float(os.getenv('CEP_TIMEOUT_CONEXAO', '2'))
+CEP_TIMEOUT_LEITURA = float(os.getenv('CEP_TIMEOUT_LEITURA', '5'))
+
+
+def normalizar_cep(cep):
+    """Remove caracteres não numéricos do CEP"""
+    return ''.join(filter(str.isdigit, cep or ''))
+
+
+class ResolvedorCEP:
+    """Consulta o ViaCEP com cache LRU em memória, cache em disco com TTL e sessão HTTP reaproveitada"""
+
+    def __init__(self, url_base=CEP_URL_BASE, tamanho_cache=CEP_CACHE_TAMANHO,
+                 arquivo_cache=CEP_CACHE_ARQUIVO, ttl=CEP_CACHE_TTL,
+                 timeout=(CEP_TIMEOUT_CONEXAO, CEP_TIMEOUT_LEITURA)):
+        self.url_base = url_base.rstrip('/')
+        self.tamanho_cache = tamanho_cache
+        self.ttl = ttl
+        self.timeout = timeout
+        self._memoria = OrderedDict()
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cep")
+
+        self._session = cliente_http
+
+        self._db = None
+        if arquivo_cache:
+            diretorio = os.path.dirname(arquivo_cache)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            self._db = sqlite3.connect(arquivo_cache, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cep (cep TEXT PRIMARY KEY, dados TEXT, salvo_em REAL)")
+            self._db.commit()
+
+    def consultar(self, cep):
+        """Retorna o JSON do ViaCEP para o CEP, ou None se não existir ou a consulta falhar"""
+        cep = normalizar_cep(cep)
+        if len(cep) != 8:
+            return None
+
+        encontrado, dados = self._do_cache(cep)
+        if encontrado:
+            return dados
+
+        # Reaproveita uma consulta já em andamento para o mesmo CEP (de um prefetch ou de outro
+        # consultar); sem nenhuma, registra a sua antes de consultar para que as próximas esperem por ela
+        with self._lock:
+            futuro = self._em_andamento.get(cep)
+            if futuro is None:
+                if cep in self._memoria:
+                    return self._memoria[cep]
+                futuro = self._em_andamento[cep] = Future()
+                dono = True
+            else:
+                dono = False
+        if not dono:
+            return futuro.result()
+        dados = None
+        try:
+            dados = self._consultar_remoto(cep)
+            return dados
+        finally:
+            futuro.set_result(dados)
+
+    def prefetch(self, cep):
+        """Inicia a consulta em segundo plano para que o resultado esteja pronto quando o formulário precisar"""
+        cep = normalizar_cep(cep)
+        if len(cep) != 8:
+            return
+        with self._lock:
+            if cep in self._memoria or cep in self._em_andamento:
+                return
+            futuro = self._executor.submit(self._consultar_remoto_ou_disco, cep)
+            self._em_andamento[cep] = futuro
+
+    def _consultar_remoto_ou_disco(self, cep):
+        encontrado, dados = self._do_cache(cep)
+        if encontrado:
+            with self._lock:
+                self._em_andamento.pop(cep, None)
+            return dados
+        return self._consultar_remoto(cep)
+
+    def _consultar_remoto(self, cep):
+        try:
+            response = self._session.get(f'{self.url_base}/{cep}/json/', timeout=self.timeout)
+            if response.status_code == 200:
+                dados = response.json()
+                dados = None if dados.get('erro') else dados
+                self._salvar(cep, dados)
+                return dados
+            if response.status_code == 400:
+                # CEP inválido: guardado como inexistente
+                self._salvar(cep, None)
+            return None
+        except Exception as e:
+            print(f"Erro ao consultar CEP: {str(e)}")
+            return None
+        finally:
+            with self._lock:
+                self._em_andamento.pop(cep, None)
+
+    def _do_cache(self, cep):
+        with self._lock:
+            if cep in self._memoria:
+                self._memoria.move_to_end(cep)
+                return True, self._memoria[cep]
+            if not self._db:
+                return False, None
+            linha = self._db.execute("SELECT dados, salvo_em FROM cep WHERE cep = ?", (cep,)).fetchone()
+        if linha and time.time() - linha[1] < self.ttl:
+            dados = json.loads(linha[0])
+            self._lembrar(cep, dados)
+            return True, dados
+        return False, None
+
+    def _lembrar(self, cep, dados):
+        with self._lock:
+            self._memoria[cep] = dados
+            self._memoria.move_to_end(cep)
+            while len(self._memoria) > self.tamanho_cache:
+                self._memoria.popitem(last=False)
+
+    def _salvar(self, cep, dados):
+        self._lembrar(cep, dados)
+        if not self._db:
+            return
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cep (cep, dados, salvo_em) VALUES (?, ?, ?)",
+                             (cep, json.dumps(dados), time.time()))
+            self._db.commit()
+
+
+resolvedor_cep = ResolvedorCEP()
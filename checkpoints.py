@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+from idempotencia import somente_digitos
+
+logger = logging.getLogger(__name__)
+
+# Log append-only com um checkpoint por etapa concluída
+CHECKPOINTS_ARQUIVO = os.getenv('CHECKPOINTS_ARQUIVO', 'estado/checkpoints.jsonl')
+# Jobs sem etapa nova há mais que isso (s) deixam de ser retomáveis e saem do log na compactação
+CHECKPOINTS_TTL = float(os.getenv('CHECKPOINTS_TTL', str(7 * 24 * 3600)))
+
+# Intervalo (s) entre as remoções de jobs expirados do índice em memória
+INTERVALO_EXPIRACAO = 3600
+
+
+class CheckpointDivergente(ValueError):
+    """O job_id já tem checkpoints de outro cadastro (CPF, matrícula ou empregador diferentes)"""
+
+
+def identificar_dados(contexto):
+    """Impressão digital do cadastro guardada com os checkpoints, para não retomar a proposta de outro cliente"""
+    if contexto is None:
+        return None
+    partes = [somente_digitos(contexto.cpf), somente_digitos(contexto.matricula), str(contexto.empregador or '')]
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+class CheckpointJob:
+    """Estado retomável de um job: etapas concluídas, identificadores da proposta e campos já gravados.
+
+    Sem registro o checkpoint vive só em memória (usado para passar o progresso de um motor a outro).
+    """
+
+    def __init__(self, registro, job_id, etapas_concluidas=None, proposta=None, campos=None, dados=None):
+        self.registro = registro
+        self.job_id = job_id
+        self.dados = dados
+        self.etapas_concluidas = list(etapas_concluidas or [])
+        self.proposta = proposta
+        self.campos = list(campos or [])
+
+    def concluiu(self, etapa):
+        return etapa in self.etapas_concluidas
+
+    def registrar(self, etapa, proposta=None, campos=None):
+        """Grava de forma durável que a etapa foi concluída"""
+        if etapa not in self.etapas_concluidas:
+            self.etapas_concluidas.append(etapa)
+        if proposta is not None:
+            self.proposta = proposta
+        if campos is not None:
+            self.campos = list(campos)
+        if self.registro is None:
+            return
+        self.registro.anexar({
+            'job_id': self.job_id,
+            'etapa': etapa,
+            'proposta': proposta,
+            'campos': campos,
+            'dados': self.dados,
+            'em': time.time(),
+        })
+
+
+class RegistroCheckpoints:
+    """Log append-only de checkpoints com índice em memória reconstruído na inicialização.
+
+    Na inicialização o log é compactado: uma linha por job, sem os jobs expirados (CHECKPOINTS_TTL).
+    """
+
+    def __init__(self, arquivo=CHECKPOINTS_ARQUIVO, ttl=CHECKPOINTS_TTL):
+        self.arquivo = arquivo
+        self.ttl = ttl
+        self._indice = {}
+        self._lock = threading.Lock()
+        self._ultima_expiracao = time.time()
+        diretorio = os.path.dirname(arquivo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        linhas = self._carregar()
+        self._expirar(time.time())
+        if linhas > len(self._indice):
+            self._compactar()
+        self._saida = open(arquivo, 'a', encoding='utf-8')
+        if self._saida.tell() > 0 and not self._termina_com_quebra():
+            self._saida.write("\n")
+
+    def abrir(self, job_id, contexto=None):
+        """Retorna o checkpoint do job (vazio se o job nunca concluiu uma etapa).
+
+        Com o contexto, levanta CheckpointDivergente se o job_id já pertence a outro cadastro.
+        """
+        dados = identificar_dados(contexto)
+        with self._lock:
+            estado = self._indice.get(job_id, {})
+            if estado and time.time() - estado['em'] > self.ttl:
+                del self._indice[job_id]
+                estado = {}
+            if dados and estado.get('dados') and estado['dados'] != dados:
+                raise CheckpointDivergente(f"O job {job_id} pertence a outro cadastro (CPF, matrícula ou empregador "
+                                           f"diferentes); use outro job_id")
+            return CheckpointJob(self, job_id, estado.get('etapas'), estado.get('proposta'), estado.get('campos'),
+                                 dados or estado.get('dados'))
+
+    def existe(self, job_id):
+        with self._lock:
+            return job_id in self._indice
+
+    def anexar(self, entrada):
+        linha = json.dumps(entrada, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._saida.write(linha)
+            self._saida.flush()
+            os.fsync(self._saida.fileno())
+            self._aplicar(entrada)
+            if entrada['em'] - self._ultima_expiracao > INTERVALO_EXPIRACAO:
+                self._expirar(entrada['em'])
+
+    def _termina_com_quebra(self):
+        with open(self.arquivo, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _aplicar(self, entrada):
+        estado = self._indice.setdefault(entrada['job_id'], {'etapas': [], 'proposta': None, 'campos': [],
+                                                             'dados': None, 'em': 0})
+        # Linhas compactadas trazem todas as etapas do job de uma vez
+        for etapa in entrada['etapas'] if 'etapas' in entrada else [entrada['etapa']]:
+            if etapa not in estado['etapas']:
+                estado['etapas'].append(etapa)
+        for chave in ('proposta', 'campos', 'dados'):
+            if entrada.get(chave) is not None:
+                estado[chave] = entrada[chave]
+        estado['em'] = max(estado['em'], entrada.get('em', 0))
+
+    def _expirar(self, agora):
+        # Chamado com o lock (ou antes de o registro ser usado)
+        self._ultima_expiracao = agora
+        for job_id in [job_id for job_id, estado in self._indice.items() if agora - estado['em'] > self.ttl]:
+            del self._indice[job_id]
+
+    def _compactar(self):
+        """Reescreve o log com uma linha por job ainda retomável"""
+        temporario = self.arquivo + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            for job_id, estado in self._indice.items():
+                f.write(json.dumps(dict(estado, job_id=job_id), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.arquivo)
+        logger.info(f"Log de checkpoints compactado com {len(self._indice)} jobs")
+
+    def _carregar(self):
+        """Reconstrói o índice a partir do log; retorna quantas linhas o log tinha"""
+        if not os.path.exists(self.arquivo):
+            return 0
+        linhas = 0
+        with open(self.arquivo, encoding='utf-8') as f:
+            for linha in f:
+                linhas += 1
+                try:
+                    self._aplicar(json.loads(linha))
+                except (ValueError, KeyError):
+                    # Última linha truncada por uma queda durante a escrita
+                    logger.warning("Linha inválida ignorada no log de checkpoints")
+        logger.info(f"{len(self._indice)} jobs carregados do log de checkpoints")
+        return linhas
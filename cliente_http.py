@@ -0,0 +1,181 @@
+import os
+import asyncio
+import weakref
+import threading
+import logging
+from functools import partial
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import EmptyPoolError
+from urllib3.poolmanager import PoolManager
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from metricas import HTTP_REQUISICOES, HTTP_CONEXOES
+
+logger = logging.getLogger(__name__)
+
+# Política comum das chamadas HTTP de saída (ViaCEP, frontend, downloads de documentos, portal)
+HTTP_TIMEOUT_CONEXAO = float(os.getenv('HTTP_TIMEOUT_CONEXAO', '5'))
+HTTP_TIMEOUT_LEITURA = float(os.getenv('HTTP_TIMEOUT_LEITURA', '30'))
+# Conexões simultâneas por host; além disso as requisições aguardam uma conexão livre
+HTTP_CONEXOES_POR_HOST = int(os.getenv('HTTP_CONEXOES_POR_HOST', '10'))
+# Tempo máximo (s) aguardando uma conexão livre do host antes de desistir com PoolEsgotado
+HTTP_ESPERA_CONEXAO = float(os.getenv('HTTP_ESPERA_CONEXAO', '10'))
+# Limites específicos, ex.: "viacep.com.br=4,frontend.local=2"
+HTTP_LIMITES_HOST = {host.strip(): int(limite) for host, limite in
+                     (item.split('=', 1) for item in os.getenv('HTTP_LIMITES_HOST', '').split(',') if '=' in item)}
+# Novas tentativas em falha de conexão e em 502/503/504 (POST só é repetido se a conexão nem abriu)
+HTTP_TENTATIVAS = int(os.getenv('HTTP_TENTATIVAS', '2'))
+HTTP_ESPERA_TENTATIVA = float(os.getenv('HTTP_ESPERA_TENTATIVA', '0.5'))
+# Hosts com conexões mantidas abertas ao mesmo tempo
+HTTP_HOSTS = int(os.getenv('HTTP_HOSTS', '20'))
+
+
+class PoolEsgotado(requests.exceptions.ConnectionError):
+    """Todas as conexões do host ficaram ocupadas por mais que HTTP_ESPERA_CONEXAO"""
+
+
+def politica_tentativas(tentativas=HTTP_TENTATIVAS, espera=HTTP_ESPERA_TENTATIVA):
+    return Retry(total=tentativas, backoff_factor=espera, status_forcelist=(502, 503, 504),
+                 respect_retry_after_header=True, raise_on_status=False)
+
+
+class _ContarConexoes:
+    # Conta cada conexão nova aberta pelo pool; as demais requisições reaproveitaram uma conexão
+    espera_conexao = HTTP_ESPERA_CONEXAO
+
+    def _new_conn(self):
+        HTTP_CONEXOES.inc(host=self.host)
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        # O requests não informa pool_timeout: com o pool bloqueante a espera seria infinita
+        if kwargs.get('pool_timeout') is None:
+            kwargs['pool_timeout'] = self.espera_conexao
+        return super().urlopen(*args, **kwargs)
+
+
+class _PoolHTTP(_ContarConexoes, HTTPConnectionPool):
+    pass
+
+
+class _PoolHTTPS(_ContarConexoes, HTTPSConnectionPool):
+    pass
+
+
+class _GerenciadorPools(PoolManager):
+    """PoolManager com limite de conexões próprio para alguns hosts"""
+
+    def __init__(self, limites, espera_conexao=HTTP_ESPERA_CONEXAO, **kwargs):
+        super().__init__(**kwargs)
+        self.limites = limites
+        self.espera_conexao = espera_conexao
+        self.pool_classes_by_scheme = {'http': _PoolHTTP, 'https': _PoolHTTPS}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        if host in self.limites:
+            request_context = dict(request_context or self.connection_pool_kw, maxsize=self.limites[host])
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.espera_conexao = self.espera_conexao
+        return pool
+
+
+class AdaptadorHTTP(HTTPAdapter):
+    """Adaptador do requests com conexões keep-alive por host, limite de conexões por host,
+    timeout padrão e política de novas tentativas; pode ser montado em várias sessões.
+    Uma requisição que espera mais que espera_conexao por uma conexão livre levanta PoolEsgotado."""
+
+    def __init__(self, conexoes=HTTP_CONEXOES_POR_HOST, limites=HTTP_LIMITES_HOST, tentativas=HTTP_TENTATIVAS,
+                 timeout=(HTTP_TIMEOUT_CONEXAO, HTTP_TIMEOUT_LEITURA), hosts=HTTP_HOSTS,
+                 espera_conexao=HTTP_ESPERA_CONEXAO):
+        self.limites = dict(limites)
+        self.timeout = timeout
+        self.espera_conexao = espera_conexao
+        super().__init__(pool_connections=hosts, pool_maxsize=conexoes, max_retries=politica_tentativas(tentativas),
+                         pool_block=True)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _GerenciadorPools(self.limites, self.espera_conexao, num_pools=connections, maxsize=maxsize,
+                                             block=block, **pool_kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        host = urlparse(request.url).hostname
+        try:
+            response = super().send(request, timeout=timeout or self.timeout, **kwargs)
+        except EmptyPoolError as e:
+            HTTP_REQUISICOES.inc(host=host, resultado='pool_esgotado')
+            logger.warning(f"Sem conexão livre para {host} em {self.espera_conexao}s")
+            raise PoolEsgotado(e, request=request)
+        except requests.exceptions.RequestException:
+            HTTP_REQUISICOES.inc(host=host, resultado='erro')
+            raise
+        HTTP_REQUISICOES.inc(host=host, resultado=str(response.status_code))
+        return response
+
+
+def nova_sessao(adaptador=None):
+    """Sessão requests (cookies próprios) usando o adaptador compartilhado"""
+    adaptador = adaptador or adaptador_http
+    sessao = requests.Session()
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    return sessao
+
+
+class ClienteHTTPAssincrono:
+    """Variante para código asyncio: as requisições da sessão síncrona rodam em threads, sem
+    bloquear o event loop, com no máximo limite_por_host em andamento por host (os mesmos limites
+    do adaptador). Quem espera mais que espera_conexao por uma vaga recebe PoolEsgotado."""
+
+    def __init__(self, sessao, limite_por_host=HTTP_CONEXOES_POR_HOST, limites=HTTP_LIMITES_HOST,
+                 espera_conexao=HTTP_ESPERA_CONEXAO):
+        self.sessao = sessao
+        self.limite_por_host = limite_por_host
+        self.limites = dict(limites)
+        self.espera_conexao = espera_conexao
+        # Semáforos por event loop (um asyncio.Semaphore só pode ser usado no loop em que foi criado)
+        self._semaforos = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=limite_por_host * 2, thread_name_prefix="http-async")
+
+    async def request(self, metodo, url, **kwargs):
+        host = urlparse(url).hostname
+        semaforo = self._semaforo(host)
+        try:
+            await asyncio.wait_for(semaforo.acquire(), self.espera_conexao)
+        except asyncio.TimeoutError:
+            HTTP_REQUISICOES.inc(host=host, resultado='pool_esgotado')
+            logger.warning(f"Sem vaga para {host} em {self.espera_conexao}s")
+            raise PoolEsgotado(f"Sem conexão livre para {host} em {self.espera_conexao}s")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(self.sessao.request, metodo, url, **kwargs))
+        finally:
+            semaforo.release()
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    def _semaforo(self, host):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaforos = self._semaforos.setdefault(loop, {})
+            if host not in semaforos:
+                semaforos[host] = asyncio.Semaphore(self.limites.get(host, self.limite_por_host))
+            return semaforos[host]
+
+
+adaptador_http = AdaptadorHTTP()
+# Sessão sem estado compartilhada pelas chamadas de saída da API e do scraper
+cliente_http = nova_sessao()
+cliente_http_assincrono = ClienteHTTPAssincrono(cliente_http)
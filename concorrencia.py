@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+from pipeline import LOGIN
+from metricas import CONCORRENCIA_LIMITE, CONCORRENCIA_EM_USO, CONCORRENCIA_DECISOES, CONCORRENCIA_LENTIDAO, CONCORRENCIA_FALHAS
+
+logger = logging.getLogger(__name__)
+
+# Controle adaptativo dos jobs executando contra o portal ao mesmo tempo (0 desativa: sem limite)
+CONCORRENCIA_ADAPTATIVA = os.getenv('CONCORRENCIA_ADAPTATIVA', '1') == '1'
+CONCORRENCIA_MINIMA = int(os.getenv('CONCORRENCIA_MINIMA', '1'))
+CONCORRENCIA_MAXIMA = int(os.getenv('CONCORRENCIA_MAXIMA', '10'))
+CONCORRENCIA_INICIAL = int(os.getenv('CONCORRENCIA_INICIAL', os.getenv('POOL_NAVEGADORES_TAMANHO', '2')))
+# Cada decisão usa as etapas concluídas numa janela de pelo menos tantos segundos e amostras
+CONCORRENCIA_JANELA = float(os.getenv('CONCORRENCIA_JANELA', '30'))
+CONCORRENCIA_AMOSTRAS = int(os.getenv('CONCORRENCIA_AMOSTRAS', '10'))
+# O limite cai quando as etapas ficam mais lentas que isso em relação à referência, ou falham mais que a taxa
+CONCORRENCIA_LENTIDAO_MAXIMA = float(os.getenv('CONCORRENCIA_LENTIDAO_MAXIMA', '1.5'))
+CONCORRENCIA_TAXA_FALHAS = float(os.getenv('CONCORRENCIA_TAXA_FALHAS', '0.1'))
+# Fator aplicado ao limite numa redução (o aumento é sempre de 1)
+CONCORRENCIA_REDUCAO = float(os.getenv('CONCORRENCIA_REDUCAO', '0.5'))
+CONCORRENCIA_TIMEOUT = float(os.getenv('CONCORRENCIA_TIMEOUT', '300'))
+
+# A referência de cada etapa é a menor média das últimas janelas, para acompanhar mudanças duradouras do portal
+JANELAS_REFERENCIA = 20
+# O login reaproveita sessões e sua duração varia sem relação com a carga do portal
+ETAPAS_IGNORADAS = {LOGIN}
+
+AUMENTO = 'aumento'
+REDUCAO = 'reducao'
+MANTIDO = 'mantido'
+
+
+class PortalSaturado(Exception):
+    """O job esperou mais que o permitido por uma vaga de execução contra o portal"""
+
+
+class ControladorConcorrencia:
+    """Limita os jobs simultâneos contra o portal com AIMD (aumento aditivo, redução multiplicativa).
+
+    O pipeline informa a duração e o resultado de cada etapa. A cada janela, se as etapas
+    ficaram muito mais lentas que a referência (a menor média recente de cada etapa) ou a
+    taxa de falhas (timeouts do WebDriverWait, erros do portal) passou do limite, o limite é
+    multiplicado por CONCORRENCIA_REDUCAO; se o limite foi todo usado sem sinais de sobrecarga,
+    ganha mais uma vaga.
+    """
+
+    def __init__(self, inicial=CONCORRENCIA_INICIAL, minima=CONCORRENCIA_MINIMA, maxima=CONCORRENCIA_MAXIMA,
+                 janela=CONCORRENCIA_JANELA, amostras=CONCORRENCIA_AMOSTRAS, lentidao_maxima=CONCORRENCIA_LENTIDAO_MAXIMA,
+                 taxa_falhas=CONCORRENCIA_TAXA_FALHAS, reducao=CONCORRENCIA_REDUCAO, ativo=CONCORRENCIA_ADAPTATIVA):
+        self.minima = minima
+        self.maxima = maxima
+        self.janela = janela
+        self.amostras = amostras
+        self.lentidao_maxima = lentidao_maxima
+        self.taxa_falhas = taxa_falhas
+        self.reducao = reducao
+        self.ativo = ativo
+        self.limite = max(minima, min(maxima, inicial))
+        self.em_uso = 0
+        self._aguardando = 0
+        self.decisoes = {AUMENTO: 0, REDUCAO: 0, MANTIDO: 0}
+        self._ultima_decisao = MANTIDO
+        self._medias = {}  # etapa -> médias das últimas JANELAS_REFERENCIA janelas
+        self._condicao = threading.Condition()
+        self._iniciar_janela()
+        CONCORRENCIA_LIMITE.definir(self.limite if ativo else 0)
+
+    @contextmanager
+    def permissao(self, timeout=CONCORRENCIA_TIMEOUT):
+        """Aguarda uma vaga para executar um job contra o portal; levanta PortalSaturado no timeout"""
+        self._entrar(timeout)
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self.em_uso -= 1
+                self._condicao.notify_all()
+            CONCORRENCIA_EM_USO.dec()
+
+    def observar(self, etapa, duracao, sucesso):
+        """Registra uma etapa concluída (ou que falhou) e reavalia o limite ao fim da janela"""
+        if not self.ativo or etapa in ETAPAS_IGNORADAS:
+            return
+        with self._condicao:
+            if sucesso:
+                soma, quantidade = self._duracoes.get(etapa, (0.0, 0))
+                self._duracoes[etapa] = (soma + duracao, quantidade + 1)
+            else:
+                self._falhas += 1
+            self._total += 1
+            if self._total >= self.amostras and time.monotonic() - self._inicio_janela >= self.janela:
+                self._avaliar()
+
+    def estatisticas(self):
+        with self._condicao:
+            return {'limite': self.limite, 'em_uso': self.em_uso, 'aguardando': self._aguardando,
+                    'decisoes': dict(self.decisoes),
+                    'referencias': {etapa: round(min(medias), 3) for etapa, medias in self._medias.items()}}
+
+    def _entrar(self, timeout):
+        limite_tempo = time.monotonic() + timeout
+        with self._condicao:
+            self._aguardando += 1
+            try:
+                while self.ativo and self.em_uso >= self.limite:
+                    self._saturado = True
+                    restante = limite_tempo - time.monotonic()
+                    if restante <= 0:
+                        raise PortalSaturado(f"Sem vaga para executar contra o portal em {timeout:.0f}s "
+                                             f"(limite atual {self.limite})")
+                    self._condicao.wait(timeout=restante)
+            finally:
+                self._aguardando -= 1
+            self.em_uso += 1
+            if self.em_uso >= self.limite:
+                self._saturado = True
+        CONCORRENCIA_EM_USO.inc()
+
+    def _avaliar(self):
+        # Chamado com o lock, ao fim de uma janela
+        taxa_falhas = self._falhas / self._total
+        lentidao = self._lentidao()
+        anterior = self.limite
+        sobrecarga = taxa_falhas > self.taxa_falhas or lentidao > self.lentidao_maxima
+        if sobrecarga and self._ultima_decisao == REDUCAO:
+            # A janela seguinte a uma redução ainda mede jobs iniciados com o limite antigo
+            decisao = MANTIDO
+        elif sobrecarga:
+            self.limite = max(self.minima, int(self.limite * self.reducao))
+            decisao = REDUCAO
+        elif self._saturado and self.limite < self.maxima:
+            self.limite += 1
+            decisao = AUMENTO
+        else:
+            decisao = MANTIDO
+
+        if decisao != MANTIDO:
+            logger.info(f"Concorrência contra o portal {anterior} -> {self.limite} "
+                        f"(lentidão {lentidao:.2f}x, falhas {taxa_falhas:.0%} em {self._total} etapas)")
+        self.decisoes[decisao] += 1
+        self._ultima_decisao = decisao
+        CONCORRENCIA_DECISOES.inc(decisao=decisao)
+        CONCORRENCIA_LIMITE.definir(self.limite)
+        CONCORRENCIA_LENTIDAO.definir(round(lentidao, 3))
+        CONCORRENCIA_FALHAS.definir(round(taxa_falhas, 3))
+        for etapa, (soma, quantidade) in self._duracoes.items():
+            self._medias.setdefault(etapa, deque(maxlen=JANELAS_REFERENCIA)).append(soma / quantidade)
+        self._iniciar_janela()
+        self._condicao.notify_all()
+
+    def _lentidao(self):
+        """Quanto as etapas da janela demoraram em relação às referências (1 = igual à referência)"""
+        medido = esperado = 0.0
+        for etapa, (soma, quantidade) in self._duracoes.items():
+            if etapa in self._medias:
+                medido += soma
+                esperado += min(self._medias[etapa]) * quantidade
+        return medido / esperado if esperado else 1.0
+
+    def _iniciar_janela(self):
+        self._inicio_janela = time.monotonic()
+        self._duracoes = {}
+        self._falhas = 0
+        self._total = 0
+        # Jobs já aguardando vaga contam como demanda para a nova janela
+        self._saturado = self._aguardando > 0 or self.em_uso >= self.limite
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+from metricas import CONTAS_JOBS
+
+logger = logging.getLogger(__name__)
+
+# Contas de operador do portal usadas pelos jobs (vazio: cada job usa o usuario/senha recebido)
+CONTAS_ARQUIVO = os.getenv('CONTAS_ARQUIVO', '')
+# Jobs simultâneos por conta quando o arquivo não informa "limite"
+CONTAS_LIMITE_PADRAO = int(os.getenv('CONTAS_LIMITE_PADRAO', '2'))
+# Pausa (s) de uma conta após falha de login ou limitação do portal, dobrada a cada falha seguida
+CONTAS_PAUSA = float(os.getenv('CONTAS_PAUSA', '300'))
+CONTAS_PAUSA_MAXIMA = float(os.getenv('CONTAS_PAUSA_MAXIMA', '3600'))
+CONTAS_TIMEOUT_EMPRESTIMO = float(os.getenv('CONTAS_TIMEOUT_EMPRESTIMO', '120'))
+# Contas tentadas por job quando o login é recusado
+CONTAS_TENTATIVAS = int(os.getenv('CONTAS_TENTATIVAS', '2'))
+
+
+class SemContaDisponivel(Exception):
+    """Nenhuma conta ficou livre (ou saiu da pausa) dentro do tempo de espera"""
+
+
+class Conta:
+    """Uma conta de operador com seu limite de jobs simultâneos e estado de pausa"""
+
+    def __init__(self, usuario, senha, limite=CONTAS_LIMITE_PADRAO):
+        self.usuario = usuario
+        self.senha = senha
+        self.limite = limite
+        self.em_uso = 0
+        self.jobs = 0
+        self.falhas_seguidas = 0
+        self.pausada_ate = 0.0
+
+    def disponivel(self, agora):
+        return self.em_uso < self.limite and self.pausada_ate <= agora
+
+
+class RegistroContas:
+    """Distribui os jobs entre várias contas de operador do portal.
+
+    Cada job recebe a conta disponível menos ocupada (em relação ao seu limite); uma conta
+    cujo login falhou ou que foi limitada pelo portal fica em pausa e só volta a receber
+    jobs depois dela. As sessões continuam sendo reaproveitadas por usuário.
+    """
+
+    def __init__(self, contas=(), pausa=CONTAS_PAUSA, pausa_maxima=CONTAS_PAUSA_MAXIMA):
+        self.pausa = pausa
+        self.pausa_maxima = pausa_maxima
+        self._contas = {conta.usuario: conta for conta in contas}
+        self._condicao = threading.Condition()
+
+    @classmethod
+    def do_arquivo(cls, arquivo=CONTAS_ARQUIVO):
+        """Lê as contas de um JSON: [{"usuario": ..., "senha": ..., "limite": 2}, ...]"""
+        if not arquivo:
+            return cls()
+        with open(arquivo, encoding='utf-8') as f:
+            contas = [Conta(item['usuario'], item['senha'], int(item.get('limite', CONTAS_LIMITE_PADRAO)))
+                      for item in json.load(f)]
+        logger.info(f"{len(contas)} contas de operador carregadas de {arquivo}")
+        return cls(contas)
+
+    def __bool__(self):
+        return bool(self._contas)
+
+    @contextmanager
+    def emprestar(self, preferida=None, timeout=CONTAS_TIMEOUT_EMPRESTIMO):
+        """Reserva uma conta para o job e a libera ao final.
+
+        preferida: usuário que deve ser usado se estiver registrado (ex.: dono da proposta de um
+        job retomado); o job aguarda essa conta em vez de usar outra.
+        """
+        conta = self._obter(preferida if preferida in self._contas else None, timeout)
+        try:
+            yield conta
+        finally:
+            with self._condicao:
+                conta.em_uso -= 1
+                self._condicao.notify_all()
+
+    def registrar_sucesso(self, conta):
+        with self._condicao:
+            conta.falhas_seguidas = 0
+        CONTAS_JOBS.inc(conta=conta.usuario, resultado='sucesso')
+
+    def registrar_erro(self, conta):
+        """Falha do job que não é culpa da conta: ela continua recebendo jobs"""
+        CONTAS_JOBS.inc(conta=conta.usuario, resultado='erro')
+
+    def pausar(self, conta, motivo):
+        with self._condicao:
+            conta.falhas_seguidas += 1
+            espera = min(self.pausa_maxima, self.pausa * 2 ** (conta.falhas_seguidas - 1))
+            conta.pausada_ate = time.monotonic() + espera
+        logger.warning(f"Conta {conta.usuario} em pausa por {espera:.0f}s: {motivo}")
+        CONTAS_JOBS.inc(conta=conta.usuario, resultado='pausada')
+
+    def estatisticas(self):
+        agora = time.monotonic()
+        with self._condicao:
+            return {conta.usuario: {
+                'em_uso': conta.em_uso,
+                'limite': conta.limite,
+                'jobs': conta.jobs,
+                'pausada_por': round(max(0.0, conta.pausada_ate - agora), 1),
+            } for conta in self._contas.values()}
+
+    def _obter(self, preferida, timeout):
+        limite = time.monotonic() + timeout
+        with self._condicao:
+            while True:
+                agora = time.monotonic()
+                conta = self._escolher(preferida, agora)
+                if conta:
+                    conta.em_uso += 1
+                    conta.jobs += 1
+                    return conta
+                if agora >= limite:
+                    raise SemContaDisponivel(
+                        f"Conta {preferida} indisponível" if preferida else "Nenhuma conta de operador disponível")
+                # Acorda quando uma conta é liberada ou quando a primeira pausa termina
+                fim_pausa = min((c.pausada_ate for c in self._contas.values() if c.pausada_ate > agora), default=limite)
+                self._condicao.wait(timeout=max(0.01, min(limite, fim_pausa) - agora))
+
+    def _escolher(self, preferida, agora):
+        # Chamado com o lock
+        if preferida:
+            conta = self._contas[preferida]
+            return conta if conta.disponivel(agora) else None
+        candidatas = [conta for conta in self._contas.values() if conta.disponivel(agora)]
+        if not candidatas:
+            return None
+        return min(candidatas, key=lambda conta: (conta.em_uso / conta.limite, conta.jobs))
+
+
+registro_contas = RegistroContas.do_arquivo()
@@ -0,0 +1,81 @@
+import os
+from dataclasses import dataclass, fields, replace
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class ContextoCadastro:
+    """Dados de um job de simulação/cadastro, passados explicitamente para as funções do scraper"""
+    # Dados de Login
+    usuario: Optional[str] = None
+    senha: Optional[str] = None
+
+    # Dados da Simulação
+    cpf: Optional[str] = None
+    matricula: Optional[str] = None
+    tipo_produto: str = '1'  # 1 para Consignado, 4 para Benefício
+    empregador: str = '51'
+    valor_margem: Optional[str] = None
+    renda: Optional[str] = None
+    numero_beneficio: Optional[str] = None
+
+    # Dados de Documentação
+    rg: Optional[str] = None
+    data_emissao_rg: Optional[str] = None
+    orgao_emissor: Optional[str] = None
+    uf_emissao: Optional[str] = None
+
+    # Dados Pessoais
+    naturalidade: Optional[str] = None
+    uf_naturalidade: Optional[str] = None
+    sexo: Optional[str] = None
+    estado_civil: Optional[str] = None
+    nome_mae: Optional[str] = None
+
+    # Endereço
+    cep: Optional[str] = None
+    endereco: Optional[str] = None
+    numero: Optional[str] = None
+    numero_log: Optional[str] = None
+    complemento: Optional[str] = None
+    bairro: Optional[str] = None
+    cidade: Optional[str] = None
+    uf: Optional[str] = None
+
+    # Dados Profissionais
+    data_admissao: Optional[str] = None
+    profissao: Optional[str] = None
+    descricao_profissao: Optional[str] = None
+    cargo: Optional[str] = None
+
+    # Dados Bancários
+    tipo_conta: Optional[str] = None
+    banco: Optional[str] = None
+    agencia: Optional[str] = None
+    conta: Optional[str] = None
+    digito: Optional[str] = None
+
+    # Contato
+    ddd: Optional[str] = None
+    telefone: Optional[str] = None
+    email: Optional[str] = None
+
+    # Documentos (caminhos locais)
+    arquivo_rg_verso: Optional[str] = None
+    arquivo_comprovante_endereco: Optional[str] = None
+    arquivo_comprovante_renda: Optional[str] = None
+
+    @classmethod
+    def do_ambiente(cls) -> 'ContextoCadastro':
+        """Cria o contexto a partir das variáveis de ambiente (.env), usadas como valores padrão"""
+        valores = {}
+        for campo in fields(cls):
+            valor = os.getenv(campo.name.upper())
+            if valor is not None:
+                valores[campo.name] = valor
+        return cls(**valores)
+
+    def atualizar(self, dados: dict) -> 'ContextoCadastro':
+        """Retorna uma cópia com os valores de dados sobrepostos (chaves desconhecidas são ignoradas)"""
+        nomes = {campo.name for campo in fields(self)}
+        return replace(self, **{chave: valor for chave, valor in dados.items() if chave in nomes and valor is not None})
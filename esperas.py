@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException, UnexpectedAlertPresentException
+
+from metricas import ESPERA_TIMEOUTS
+
+# "postback" aguarda o portal responder; "sleep" usa as pausas fixas antigas (para depuração)
+ESPERA_MODO = os.getenv('ESPERA_MODO', 'postback')
+ESPERA_TIMEOUT = float(os.getenv('ESPERA_TIMEOUT', '10'))
+ESPERA_INTERVALO = 0.1
+# Segundos aguardando um postback começar, quando o chamador não sabe se o passo dispara um
+ESPERA_INICIO = float(os.getenv('ESPERA_INICIO', '1'))
+
+# Instala ganchos no PageRequestManager do ASP.NET para contar postbacks assíncronos, e no submit e no
+# beforeunload para saber que um postback completo está a caminho enquanto a página antiga ainda está aberta
+_JS_INSTALAR = """
+if (!window.__esperaInstalado) {
+    window.__esperaInstalado = true;
+    window.__esperaInicio = 0;
+    window.__esperaFim = 0;
+    window.__esperaSaindo = false;
+    // Na fase de bolha, depois do PageRequestManager: um submit que ele transformou em postback
+    // assíncrono chega aqui cancelado
+    window.addEventListener('submit', function (e) { if (!e.defaultPrevented) window.__esperaSaindo = true; });
+    window.addEventListener('beforeunload', function () { window.__esperaSaindo = true; });
+    if (window.Sys && Sys.WebForms && Sys.WebForms.PageRequestManager) {
+        var prm = Sys.WebForms.PageRequestManager.getInstance();
+        prm.add_beginRequest(function () { window.__esperaInicio++; });
+        prm.add_endRequest(function () { window.__esperaFim++; });
+    }
+}
+return [window.__esperaInicio, window.__esperaFim];
+"""
+
+_JS_ESTADO = """
+var prm = (window.Sys && Sys.WebForms && Sys.WebForms.PageRequestManager)
+    ? Sys.WebForms.PageRequestManager.getInstance() : null;
+return {
+    novo: !window.__esperaInstalado,
+    inicio: window.__esperaInicio || 0,
+    fim: window.__esperaFim || 0,
+    saindo: !!window.__esperaSaindo,
+    ocupado: (prm ? prm.get_isInAsyncPostBack() : false) || (window.jQuery ? jQuery.active > 0 : false),
+    pronto: document.readyState === 'complete'
+};
+"""
+
+
+_local = threading.local()
+
+
+def timeouts():
+    """Esperas que esgotaram o tempo nesta thread, inclusive as que a etapa tratou e seguiu adiante"""
+    return getattr(_local, 'timeouts', 0)
+
+
+def _registrar_timeout(origem):
+    _local.timeouts = timeouts() + 1
+    ESPERA_TIMEOUTS.inc(origem=origem)
+
+
+class Espera(WebDriverWait):
+    """WebDriverWait que registra os timeouts, para que não se percam nos except das etapas"""
+
+    def until(self, method, message=''):
+        try:
+            return super().until(method, message)
+        except TimeoutException:
+            _registrar_timeout('wait')
+            raise
+
+    def until_not(self, method, message=''):
+        try:
+            return super().until_not(method, message)
+        except TimeoutException:
+            _registrar_timeout('wait')
+            raise
+
+
+def _autopostback(elemento):
+    try:
+        return '__doPostBack' in (elemento.get_attribute('onchange') or '')
+    except WebDriverException:
+        return True  # na dúvida, espera como antes
+
+
+def _instalar(driver):
+    try:
+        return driver.execute_script(_JS_INSTALAR)
+    except WebDriverException:
+        return [0, 0]
+
+
+@contextmanager
+def postback(driver, timeout=ESPERA_TIMEOUT, inicio=ESPERA_INICIO, fallback=1, elemento=None):
+    """Executa o bloco e aguarda o postback (assíncrono ou completo) disparado por ele terminar.
+
+    inicio: segundos aguardando o postback começar; se nada for disparado nesse
+    intervalo o passo segue sem esperar mais. Um postback completo já enviado conta como
+    disparado e é aguardado até a nova página carregar.
+    elemento: campo alterado pelo bloco; sem autopostback (onchange com __doPostBack)
+    ele não dispara nada e o bloco segue sem espera.
+    fallback: pausa fixa usada quando ESPERA_MODO=sleep.
+    """
+    if ESPERA_MODO == 'sleep':
+        yield
+        time.sleep(fallback)
+        return
+
+    if elemento is not None and not _autopostback(elemento):
+        yield
+        return
+
+    inicio_antes, _ = _instalar(driver)
+    yield
+    limite_inicio = time.monotonic() + inicio
+
+    def terminou(d):
+        try:
+            estado = d.execute_script(_JS_ESTADO)
+        except UnexpectedAlertPresentException:
+            # Um alerta só aparece depois que o portal respondeu
+            return True
+        except WebDriverException:
+            return False
+        if estado['novo']:
+            # Postback completo: o documento foi substituído
+            if estado['pronto']:
+                _instalar(d)
+                return True
+            return False
+        if estado['saindo']:
+            # Postback completo enviado e ainda sem resposta: a página antiga continua "pronta"
+            return False
+        disparado = estado['inicio'] > inicio_antes or estado['ocupado']
+        if not disparado:
+            return time.monotonic() > limite_inicio
+        return estado['fim'] >= estado['inicio'] and not estado['ocupado'] and estado['pronto']
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=ESPERA_INTERVALO).until(terminou)
+    except TimeoutException:
+        _registrar_timeout('postback')
+        print(f"Aviso: postback não concluído em {timeout}s, prosseguindo")
+
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select
+
+from esperas import postback
+
+PREFIXO_CADASTRO = "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_"
+
+TEXTO = 'texto'
+SELECT = 'select'
+MASCARA = 'mascara'
+
+
+@dataclass(frozen=True)
+class Campo:
+    """Descreve um campo do formulário de cadastro do portal"""
+    id: str
+    tipo: str
+    origem: str
+    postback: bool = False
+    obrigatorio: bool = True
+    descricao: str = ''
+
+
+CAMPOS_CADASTRO = [
+    # Dados de Documentação
+    Campo(PREFIXO_CADASTRO + "txtRG_CAMPO", TEXTO, 'rg', descricao="RG"),
+    Campo(PREFIXO_CADASTRO + "txtDtEmissao_CAMPO", MASCARA, 'data_emissao_rg', descricao="Data de emissão"),
+    Campo(PREFIXO_CADASTRO + "txtLocalEmissao_CAMPO", TEXTO, 'orgao_emissor', descricao="Órgão emissor"),
+    Campo(PREFIXO_CADASTRO + "cbUFEmissao_CAMPO", SELECT, 'uf_emissao', descricao="UF de emissão"),
+    # Dados Pessoais
+    Campo(PREFIXO_CADASTRO + "txtCidadeNatal_CAMPO", TEXTO, 'naturalidade', descricao="Naturalidade"),
+    Campo(PREFIXO_CADASTRO + "cbUFNatal_CAMPO", SELECT, 'uf_naturalidade', descricao="UF de naturalidade"),
+    Campo(PREFIXO_CADASTRO + "cbSexo_CAMPO", SELECT, 'sexo', descricao="Sexo"),
+    Campo(PREFIXO_CADASTRO + "cbEstadoCivil_CAMPO", SELECT, 'estado_civil', descricao="Estado civil"),
+    # Filiação
+    Campo(PREFIXO_CADASTRO + "txtNomeMae_CAMPO", TEXTO, 'nome_mae', descricao="Nome da mãe"),
+    # Endereço (o CEP dispara o preenchimento automático do portal)
+    Campo(PREFIXO_CADASTRO + "ucEnderecoResidencial_txtCEP_CAMPO", MASCARA, 'cep', postback=True, descricao="CEP"),
+    Campo(PREFIXO_CADASTRO + "ucEnderecoResidencial_txtEndereco_CAMPO", TEXTO, 'endereco', descricao="Endereço"),
+    Campo(PREFIXO_CADASTRO + "ucEnderecoResidencial_txtEnderecoNR_CAMPO", TEXTO, 'numero', descricao="Número"),
+    Campo(PREFIXO_CADASTRO + "ucEnderecoResidencial_txtBairro_CAMPO", TEXTO, 'bairro', descricao="Bairro"),
+    Campo(PREFIXO_CADASTRO + "ucEnderecoResidencial_cbUF_CAMPO", SELECT, 'uf', descricao="UF"),
+    Campo(PREFIXO_CADASTRO + "ucEnderecoResidencial_txtComplemento_CAMPO", TEXTO, 'complemento', descricao="Complemento"),
+    # Dados Profissionais
+    Campo(PREFIXO_CADASTRO + "txtDataAdmissao_CAMPO", MASCARA, 'data_admissao', descricao="Data de admissão"),
+    Campo(PREFIXO_CADASTRO + "cbProfissao_CAMPO", SELECT, 'profissao', obrigatorio=False, descricao="Profissão"),
+    Campo(PREFIXO_CADASTRO + "txtProfissao_CAMPO", TEXTO, 'descricao_profissao', obrigatorio=False, descricao="Descrição da profissão"),
+    Campo(PREFIXO_CADASTRO + "txtCargo_CAMPO", TEXTO, 'cargo', obrigatorio=False, descricao="Cargo"),
+    # Rendas
+    Campo(PREFIXO_CADASTRO + "txtRenda_CAMPO", MASCARA, 'renda', obrigatorio=False, descricao="Renda"),
+    # Dados Bancários
+    Campo(PREFIXO_CADASTRO + "cbTipoConta_CAMPO", SELECT, 'tipo_conta', obrigatorio=False, descricao="Tipo de conta"),
+    Campo(PREFIXO_CADASTRO + "cbBanco_CAMPO", SELECT, 'banco', obrigatorio=False, descricao="Banco"),
+    Campo(PREFIXO_CADASTRO + "txtAgencia_CAMPO", TEXTO, 'agencia', obrigatorio=False, descricao="Agência"),
+    Campo(PREFIXO_CADASTRO + "txtConta_CAMPO", TEXTO, 'conta', obrigatorio=False, descricao="Conta"),
+    Campo(PREFIXO_CADASTRO + "txtContaDV_CAMPO", TEXTO, 'digito', obrigatorio=False, descricao="Dígito"),
+    # Contato
+    Campo(PREFIXO_CADASTRO + "ucTelefoneCelular_txtDDD_CAMPO", TEXTO, 'ddd', obrigatorio=False, descricao="DDD"),
+    Campo(PREFIXO_CADASTRO + "ucTelefoneCelular_txtFone_CAMPO", MASCARA, 'telefone', obrigatorio=False, descricao="Telefone"),
+    Campo(PREFIXO_CADASTRO + "txtEmail_CAMPO", TEXTO, 'email', obrigatorio=False, descricao="Email"),
+]
+
+# Descobre de uma vez quais campos existem e quais têm AutoPostBack no onchange
+_JS_INSPECIONAR = """
+var ids = arguments[0], r = {};
+for (var i = 0; i < ids.length; i++) {
+    var el = document.getElementById(ids[i]);
+    if (!el) { r[ids[i]] = null; continue; }
+    var onchange = el.getAttribute('onchange') || '';
+    r[ids[i]] = {autopostback: onchange.indexOf('__doPostBack') >= 0};
+}
+return r;
+"""
+
+# Preenche vários campos numa única chamada, disparando os eventos que o WebForms observa
+_JS_PREENCHER = """
+var itens = arguments[0], falhas = [];
+function disparar(el, tipo) {
+    el.dispatchEvent(new Event(tipo, {bubbles: true}));
+}
+for (var i = 0; i < itens.length; i++) {
+    var id = itens[i][0], tipo = itens[i][1], valor = itens[i][2];
+    var el = document.getElementById(id);
+    if (!el) { falhas.push([id, 'ausente']); continue; }
+    if (tipo === 'select') {
+        var existe = false;
+        for (var j = 0; j < el.options.length; j++) {
+            if (el.options[j].value === valor) { existe = true; break; }
+        }
+        if (!existe) { falhas.push([id, 'opção inexistente: ' + valor]); continue; }
+    }
+    el.focus();
+    el.value = valor;
+    disparar(el, 'input');
+    disparar(el, 'change');
+    disparar(el, 'blur');
+}
+return falhas;
+"""
+
+
+def _tratar_falha(campo, motivo):
+    mensagem = f"Erro ao preencher {campo.descricao or campo.id}: {motivo}"
+    if campo.obrigatorio:
+        raise Exception(mensagem)
+    print(mensagem)
+
+
+def _digitar(driver, campo, valor):
+    elemento = driver.find_element(By.ID, campo.id)
+    elemento.clear()
+    elemento.send_keys(valor)
+    # Força o blur para aplicar a máscara
+    driver.execute_script("arguments[0].blur();", elemento)
+
+
+def _preencher_um(driver, campo, valor):
+    if campo.tipo == SELECT:
+        Select(driver.find_element(By.ID, campo.id)).select_by_value(valor)
+    else:
+        _digitar(driver, campo, valor)
+
+
+def preencher_campos(driver, campos, valores):
+    """Preenche os campos com o mínimo de chamadas ao WebDriver.
+
+    Campos que disparam postback são preenchidos primeiro, um a um, aguardando o
+    portal; os demais campos de texto e select vão em um único execute_script;
+    campos com máscara são digitados por último.
+    """
+    pendentes = []
+    for campo in campos:
+        valor = valores.get(campo.origem)
+        if valor is None:
+            continue
+        pendentes.append((campo, str(valor)))
+
+    estado = driver.execute_script(_JS_INSPECIONAR, [campo.id for campo, _ in pendentes])
+
+    com_postback, em_lote, mascarados = [], [], []
+    for campo, valor in pendentes:
+        info = estado.get(campo.id)
+        if info is None:
+            _tratar_falha(campo, "campo não encontrado na página")
+        elif campo.postback or info['autopostback']:
+            com_postback.append((campo, valor))
+        elif campo.tipo == MASCARA:
+            mascarados.append((campo, valor))
+        else:
+            em_lote.append((campo, valor))
+
+    for campo, valor in com_postback:
+        try:
+            with postback(driver, inicio=2, fallback=2):
+                _preencher_um(driver, campo, valor)
+            print(f"{campo.descricao} preenchido (postback)")
+        except Exception as e:
+            _tratar_falha(campo, str(e))
+
+    if em_lote:
+        por_id = {campo.id: campo for campo, _ in em_lote}
+        falhas = driver.execute_script(_JS_PREENCHER, [[campo.id, campo.tipo, valor] for campo, valor in em_lote])
+        for id_campo, motivo in falhas:
+            _tratar_falha(por_id[id_campo], motivo)
+        print(f"{len(em_lote) - len(falhas)} campos preenchidos em lote")
+
+    for campo, valor in mascarados:
+        try:
+            _digitar(driver, campo, valor)
+            print(f"{campo.descricao} preenchido")
+        except Exception as e:
+            _tratar_falha(campo, str(e))
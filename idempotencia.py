@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Resultados de requisições concluídas, devolvidos a repetições com a mesma chave dentro do TTL
+IDEMPOTENCIA_ARQUIVO = os.getenv('IDEMPOTENCIA_ARQUIVO', 'estado/idempotencia.sqlite3')
+IDEMPOTENCIA_TTL = float(os.getenv('IDEMPOTENCIA_TTL', str(24 * 3600)))
+
+
+class ChaveReutilizada(Exception):
+    """A mesma Idempotency-Key foi enviada com dados diferentes"""
+
+
+def somente_digitos(valor):
+    return ''.join(filter(str.isdigit, str(valor or '')))
+
+
+def chave_idempotencia(rota, cabecalho, cpf, matricula, empregador):
+    """Chave da requisição: o Idempotency-Key informado ou, sem ele, derivada de CPF, matrícula e empregador.
+
+    Retorna None quando não há como identificar a requisição (sem cabeçalho e sem CPF).
+    """
+    if cabecalho:
+        return f"{rota}:{cabecalho}"
+    if not somente_digitos(cpf):
+        return None
+    identificacao = '|'.join([somente_digitos(cpf), str(matricula or '').strip(), str(empregador or '').strip()])
+    return f"{rota}:{hashlib.sha256(identificacao.encode('utf-8')).hexdigest()}"
+
+
+def impressao_dados(dados):
+    """Hash dos dados da requisição, para recusar uma chave reaproveitada com outro conteúdo"""
+    return hashlib.sha256(json.dumps(dados, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class Execucao:
+    """Uma execução identificada por chave; futuro é resolvido com o resultado (ou a exceção)"""
+
+    def __init__(self, chave, impressao, job_id, futuro=None):
+        self.chave = chave
+        self.impressao = impressao
+        self.job_id = job_id
+        self.futuro = futuro or Future()
+
+
+class RegistroIdempotencia:
+    """Deduplica requisições repetidas de cadastro.
+
+    Uma repetição enquanto a original executa recebe a mesma execução (e aguarda o mesmo
+    resultado); depois de concluída com sucesso, recebe o resultado guardado em SQLite até
+    o TTL vencer. Execuções que falharam não são guardadas: a repetição executa de novo.
+    """
+
+    def __init__(self, arquivo=IDEMPOTENCIA_ARQUIVO, ttl=IDEMPOTENCIA_TTL):
+        self.ttl = ttl
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if arquivo:
+            diretorio = os.path.dirname(arquivo)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            self._db = sqlite3.connect(arquivo, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS resultado (chave TEXT PRIMARY KEY, impressao TEXT, job_id TEXT, "
+                             "resultado TEXT, concluido_em REAL)")
+            self._db.commit()
+            self._remover_expirados()
+
+    def iniciar(self, chave, impressao, job_id, conferir=True):
+        """Retorna (execução, dona): dona=True se esta requisição deve executar e depois chamar concluir.
+
+        Com dona=False a execução é a que está em andamento ou já terminou (futuro resolvido).
+        conferir: levanta ChaveReutilizada se a chave já foi usada com outros dados (Idempotency-Key
+        informado). Sem conferir (chave derivada do CPF), dados diferentes ainda aguardam a execução
+        em andamento, para não criar duas propostas, mas não recebem um resultado guardado.
+        """
+        with self._lock:
+            execucao = self._em_andamento.get(chave)
+            guardada = self._guardada(chave) if not execucao else None
+            if guardada and (guardada.impressao == impressao or conferir):
+                execucao = guardada
+            if execucao:
+                if conferir and execucao.impressao != impressao:
+                    raise ChaveReutilizada(f"Idempotency-Key já usada com outros dados (job {execucao.job_id})")
+                return execucao, False
+            execucao = Execucao(chave, impressao, job_id)
+            self._em_andamento[chave] = execucao
+            return execucao, True
+
+    def concluir(self, chave, resultado=None, erro=None):
+        """Resolve a execução; o resultado de sucesso é guardado, um erro libera a chave"""
+        with self._lock:
+            execucao = self._em_andamento.pop(chave, None)
+            if execucao and erro is None and self._db:
+                self._db.execute("INSERT OR REPLACE INTO resultado (chave, impressao, job_id, resultado, concluido_em) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 (chave, execucao.impressao, execucao.job_id, json.dumps(resultado, default=str), time.time()))
+                self._db.commit()
+        if not execucao:
+            return
+        if erro is not None:
+            execucao.futuro.set_exception(erro)
+        else:
+            execucao.futuro.set_result(resultado)
+
+    def _guardada(self, chave):
+        # Chamado com o lock
+        if not self._db:
+            return None
+        linha = self._db.execute("SELECT impressao, job_id, resultado, concluido_em FROM resultado WHERE chave = ?",
+                                 (chave,)).fetchone()
+        if not linha or time.time() - linha[3] >= self.ttl:
+            return None
+        execucao = Execucao(chave, linha[0], linha[1])
+        execucao.futuro.set_result(json.loads(linha[2]))
+        return execucao
+
+    def _remover_expirados(self):
+        with self._lock:
+            removidos = self._db.execute("DELETE FROM resultado WHERE concluido_em < ?", (time.time() - self.ttl,)).rowcount
+            self._db.commit()
+        if removidos:
+            logger.info(f"{removidos} resultados vencidos removidos do registro de idempotência")
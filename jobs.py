@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Configuração da fila de jobs
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', os.getenv('POOL_NAVEGADORES_TAMANHO', '2')))
+JOBS_MAX_FILA = int(os.getenv('JOBS_MAX_FILA', '20'))
+JOBS_TTL = float(os.getenv('JOBS_TTL', '3600'))
+
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+
+class FilaCheia(Exception):
+    """A fila de jobs atingiu a profundidade máxima configurada"""
+
+
+class JobEmAndamento(Exception):
+    """Já existe um job pendente ou executando com o mesmo id"""
+
+
+class GerenciadorJobs:
+    """Executa jobs em um pool limitado de threads e guarda status, etapa e resultado"""
+
+    def __init__(self, workers=JOBS_WORKERS, max_fila=JOBS_MAX_FILA, ttl=JOBS_TTL):
+        self.workers = workers
+        self.ttl = ttl
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def iniciar(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Fila de jobs iniciada com {self.workers} workers")
+
+    def encerrar(self):
+        for _ in self._threads:
+            self._fila.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def submeter(self, funcao, *args, ao_finalizar=None, job_id=None):
+        """Enfileira funcao(job_id, *args) e retorna o id do job.
+
+        ao_finalizar, se informado, é chamado ao término do job (com sucesso ou erro).
+        job_id permite reenviar um job já conhecido (ex.: para retomá-lo após uma falha).
+        Levanta FilaCheia se a fila estiver na profundidade máxima e JobEmAndamento se
+        o job_id informado ainda estiver pendente ou executando.
+        """
+        self._remover_expirados()
+        job_id = job_id or uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': PENDENTE,
+            'etapa': None,
+            'resultado': None,
+            'erro': None,
+            'criado_em': time.time(),
+            'iniciado_em': None,
+            'concluido_em': None,
+        }
+        with self._lock:
+            anterior = self._jobs.get(job_id)
+            if anterior and anterior['status'] in (PENDENTE, EXECUTANDO):
+                raise JobEmAndamento(f"Job {job_id} já está {anterior['status']}")
+            self._jobs[job_id] = job
+        try:
+            self._fila.put_nowait((job_id, funcao, args, ao_finalizar))
+        except queue.Full:
+            with self._lock:
+                if anterior:
+                    self._jobs[job_id] = anterior
+                else:
+                    del self._jobs[job_id]
+            raise FilaCheia(f"Fila de jobs cheia ({self._fila.maxsize} pendentes)")
+        return job_id
+
+    def obter(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def atualizar_etapa(self, job_id, etapa):
+        self._atualizar(job_id, etapa=etapa)
+
+    def estatisticas(self):
+        with self._lock:
+            executando = sum(1 for job in self._jobs.values() if job['status'] == EXECUTANDO)
+        return {"workers": self.workers, "na_fila": self._fila.qsize(), "executando": executando}
+
+    def _atualizar(self, job_id, **campos):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(campos)
+
+    def _remover_expirados(self):
+        limite = time.time() - self.ttl
+        with self._lock:
+            expirados = [job_id for job_id, job in self._jobs.items()
+                         if job['concluido_em'] and job['concluido_em'] < limite]
+            for job_id in expirados:
+                del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                break
+            job_id, funcao, args, ao_finalizar = item
+            self._atualizar(job_id, status=EXECUTANDO, iniciado_em=time.time())
+            try:
+                resultado = funcao(job_id, *args)
+                self._atualizar(job_id, status=CONCLUIDO, resultado=resultado, concluido_em=time.time())
+            except Exception as e:
+                logger.error(f"Erro no job {job_id}: {str(e)}")
+                erro = {'status_code': getattr(e, 'status_code', 500), 'detail': getattr(e, 'detail', str(e))}
+                self._atualizar(job_id, status=ERRO, erro=erro, concluido_em=time.time())
+            finally:
+                if ao_finalizar:
+                    try:
+                        ao_finalizar()
+                    except Exception as e:
+                        logger.error(f"Erro ao finalizar job {job_id}: {str(e)}")
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import argparse
+from functools import partial
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Configuração do processamento em lote
+LOTE_WORKERS = int(os.getenv('LOTE_WORKERS', '2'))
+
+
+def ler_registros(linhas):
+    """Lê linhas JSONL e gera (número da linha, registro) ignorando linhas vazias.
+
+    Linhas inválidas geram (número, exceção) para serem reportadas no resultado.
+    """
+    for numero, linha in enumerate(linhas, start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            registro = json.loads(linha)
+            if not isinstance(registro, dict):
+                raise ValueError("registro não é um objeto JSON")
+            yield numero, registro
+        except ValueError as e:
+            yield numero, e
+
+
+def _executar(numero, registro, executar_registro):
+    inicio = time.monotonic()
+    if isinstance(registro, Exception):
+        resultado = {'status': 'error', 'etapa_falha': 'entrada', 'erro': f"JSON inválido: {str(registro)}", 'etapas': []}
+    else:
+        try:
+            resultado = executar_registro(registro)
+        except Exception as e:
+            resultado = {'status': 'error', 'etapa_falha': 'desconhecida', 'erro': str(e), 'etapas': []}
+        resultado.setdefault('cpf', registro.get('cpf'))
+    resultado['linha'] = numero
+    resultado['duracao'] = round(time.monotonic() - inicio, 3)
+    return resultado
+
+
+def processar_lote(linhas, executar_registro, workers=LOTE_WORKERS):
+    """Distribui os registros entre `workers` threads e gera cada resultado assim que termina.
+
+    executar_registro(registro) deve retornar um dict com 'status' ('success' ou 'error'),
+    'etapas' e, em caso de erro, 'etapa_falha' e 'erro'. O último item gerado é o resumo do lote.
+    """
+    inicio = time.monotonic()
+    total = 0
+    sucesso = 0
+    falhas_por_etapa = Counter()
+
+    def contabilizar(resultado):
+        nonlocal total, sucesso
+        total += 1
+        if resultado['status'] == 'success':
+            sucesso += 1
+        else:
+            falhas_por_etapa[resultado.get('etapa_falha') or 'desconhecida'] += 1
+        return resultado
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lote") as executor:
+        pendentes = set()
+        for numero, registro in ler_registros(linhas):
+            pendentes.add(executor.submit(_executar, numero, registro, executar_registro))
+            # Limita os registros em memória a dois por worker
+            if len(pendentes) >= workers * 2:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    yield contabilizar(futuro.result())
+        while pendentes:
+            prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                yield contabilizar(futuro.result())
+
+    duracao = time.monotonic() - inicio
+    yield {
+        'resumo': {
+            'total': total,
+            'sucesso': sucesso,
+            'falhas': total - sucesso,
+            'falhas_por_etapa': dict(falhas_por_etapa),
+            'workers': workers,
+            'duracao': round(duracao, 3),
+            'registros_por_minuto': round(total / duracao * 60, 2) if duracao > 0 else 0,
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa um lote JSONL de cadastros e escreve os resultados em NDJSON")
+    parser.add_argument('entrada', help="Arquivo JSONL com um cadastro por linha ('-' para stdin)")
+    parser.add_argument('--workers', type=int, default=LOTE_WORKERS, help="Navegadores usados em paralelo")
+    parser.add_argument('--saida', default='-', help="Arquivo NDJSON de resultados ('-' para stdout)")
+    args = parser.parse_args()
+
+    # Importado aqui para que o módulo possa ser usado pela API sem ciclo de imports
+    from api import executar_registro_lote, pool_navegadores
+    # Na linha de comando os documentos também podem ser caminhos locais
+    executar_registro = partial(executar_registro_lote, caminhos_locais=True)
+
+    entrada = sys.stdin if args.entrada == '-' else open(args.entrada, encoding='utf-8')
+    saida = sys.stdout if args.saida == '-' else open(args.saida, 'w', encoding='utf-8')
+
+    pool_navegadores.tamanho = args.workers
+    pool_navegadores.iniciar()
+    try:
+        for resultado in processar_lote(entrada, executar_registro, args.workers):
+            saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            saida.flush()
+    finally:
+        pool_navegadores.encerrar()
+        if entrada is not sys.stdin:
+            entrada.close()
+        if saida is not sys.stdout:
+            saida.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -39,7 +39,7 @@ app.add_middleware(
 )
 
 @app.post("/simular-e-cadastrar")
-async def simular_e_cadastrar(
+def simular_e_cadastrar(
     dados: str = Form(...),
     arquivo_rg_verso: UploadFile = File(...),
     arquivo_comprovante_endereco: UploadFile = File(...),
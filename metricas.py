@@ -0,0 +1,189 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Métricas em memória expostas no formato texto do Prometheus (GET /metrics)
+
+BUCKETS_SEGUNDOS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores):
+    if not nomes:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            linhas.extend(self._linhas(chave, valor))
+        return linhas
+
+    def _linhas(self, chave, valor):
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"]
+
+
+class Contador(_Metrica):
+    """Valor que só aumenta (ex.: falhas por etapa)"""
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    """Valor que sobe e desce; com coletar, é lido no momento da exportação"""
+    tipo = 'gauge'
+
+    def __init__(self, nome, descricao, rotulos=(), coletar=None):
+        super().__init__(nome, descricao, rotulos)
+        self.coletar = coletar
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def dec(self, valor=1, **rotulos):
+        self.inc(-valor, **rotulos)
+
+    def definir(self, valor, **rotulos):
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+
+    def exportar(self):
+        if self.coletar:
+            # coletar() retorna {tupla de rótulos: valor}
+            valores = self.coletar()
+            with self._lock:
+                self._valores = {tuple(str(v) for v in chave): valor for chave, valor in valores.items()}
+        return super().exportar()
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações em buckets cumulativos"""
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            contagens, soma = self._valores.get(chave, ([0] * (len(self.buckets) + 1), 0.0))
+            contagens[indice] += 1
+            self._valores[chave] = (contagens, soma + valor)
+
+    def _linhas(self, chave, valor):
+        contagens, soma = valor
+        linhas = []
+        acumulado = 0
+        for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+            acumulado += contagem
+            linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos + ('le',), chave + (_numero(limite),))} {acumulado}")
+        linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {soma}")
+        linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportadas juntas"""
+
+    def __init__(self):
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        return self._metricas.setdefault(metrica.nome, metrica)
+
+    def contador(self, nome, descricao, rotulos=()):
+        return self._registrar(Contador(nome, descricao, rotulos))
+
+    def medidor(self, nome, descricao, rotulos=(), coletar=None):
+        return self._registrar(Medidor(nome, descricao, rotulos, coletar))
+
+    def histograma(self, nome, descricao, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(nome, descricao, rotulos, buckets))
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas.values():
+            try:
+                linhas.extend(metrica.exportar())
+            except Exception:
+                # Uma métrica coletada com erro não derruba o /metrics inteiro
+                continue
+        return "\n".join(linhas) + "\n"
+
+
+registro = RegistroMetricas()
+
+ETAPA_DURACAO = registro.histograma('pixcard_etapa_duracao_segundos', "Duração das etapas do pipeline", ('etapa', 'motor'))
+ETAPA_FALHAS = registro.contador('pixcard_etapa_falhas_total', "Etapas que falharam", ('etapa', 'motor'))
+PASSO_DURACAO = registro.histograma('pixcard_passo_duracao_segundos', "Duração dos passos dentro das etapas", ('passo',))
+ESPERA_TIMEOUTS = registro.contador('pixcard_espera_timeouts_total',
+                                   "Esperas do Selenium que esgotaram o tempo, inclusive as ignoradas pela etapa", ('origem',))
+PASSO_FALHAS = registro.contador('pixcard_passo_falhas_total', "Passos que terminaram com exceção", ('passo',))
+DOCUMENTOS_RECEBIDOS = registro.contador('pixcard_documentos_total', "Documentos recebidos, novos ou já guardados", ('resultado',))
+DOCUMENTOS_PREPROCESSADOS = registro.contador('pixcard_documentos_preprocessados_total',
+                                             "Documentos pré-processados antes do envio ao portal", ('resultado',))
+DOCUMENTOS_BYTES_ECONOMIZADOS = registro.contador('pixcard_documentos_bytes_economizados_total',
+                                                  "Bytes a menos enviados ao portal graças ao pré-processamento")
+HTTP_REQUISICOES = registro.contador('pixcard_http_requisicoes_total', "Requisições HTTP de saída por host e status", ('host', 'resultado'))
+HTTP_CONEXOES = registro.contador('pixcard_http_conexoes_total',
+                                  "Conexões HTTP abertas por host (as demais requisições reaproveitaram uma conexão)", ('host',))
+NOTIFICACOES = registro.contador('pixcard_notificacoes_total', "Tentativas de entrega de notificações ao frontend", ('resultado',))
+CONTAS_JOBS = registro.contador('pixcard_contas_jobs_total', "Jobs executados por conta de operador", ('conta', 'resultado'))
+CONCORRENCIA_LIMITE = registro.medidor('pixcard_concorrencia_limite', "Jobs permitidos contra o portal ao mesmo tempo")
+CONCORRENCIA_EM_USO = registro.medidor('pixcard_concorrencia_em_uso', "Jobs executando contra o portal no momento")
+CONCORRENCIA_EM_USO.definir(0)
+CONCORRENCIA_DECISOES = registro.contador('pixcard_concorrencia_decisoes_total',
+                                          "Decisões do controle adaptativo de concorrência", ('decisao',))
+CONCORRENCIA_LENTIDAO = registro.medidor('pixcard_concorrencia_lentidao',
+                                         "Duração das etapas na última janela em relação à referência (1 = normal)")
+CONCORRENCIA_FALHAS = registro.medidor('pixcard_concorrencia_taxa_falhas', "Fração das etapas que falharam na última janela")
+JOBS_EM_ANDAMENTO = registro.medidor('pixcard_jobs_em_andamento', "Jobs executando etapas no momento")
+JOBS_EM_ANDAMENTO.definir(0)
+JOBS_TOTAL = registro.contador('pixcard_jobs_total', "Jobs finalizados por resultado", ('resultado',))
+
+
+@contextmanager
+def medir(passo):
+    """Mede a duração de um passo; serve como `with medir('x'):` ou como decorador `@medir('x')`"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        PASSO_FALHAS.inc(passo=passo)
+        raise
+    finally:
+        PASSO_DURACAO.observar(time.perf_counter() - inicio, passo=passo)
@@ -0,0 +1,826 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from html import escape
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote, unquote
+
+from formulario_cadastro import CAMPOS_CADASTRO, PREFIXO_CADASTRO, SELECT
+
+# Servidor local que imita as páginas do PixCard usadas pelo scraper (mesmos ids, postbacks e alertas)
+
+BASE = '/AppCartao/Pages'
+LOGIN = BASE + '/Login/ICLogin'
+SIMULACAO = BASE + '/Simulacao/ICSimulacao'
+CADASTRO = BASE + '/Cadastro/ICCadastro'
+
+# Atrasos (s) do lado do servidor, configuráveis por MOCK_ATRASO_<TIPO> ou --atraso tipo=segundos
+ATRASOS = {
+    'pagina': float(os.getenv('MOCK_ATRASO_PAGINA', '0.05')),
+    'login': float(os.getenv('MOCK_ATRASO_LOGIN', '0.2')),
+    'postback': float(os.getenv('MOCK_ATRASO_POSTBACK', '0.1')),
+    'margem': float(os.getenv('MOCK_ATRASO_MARGEM', '0.5')),
+    'upload': float(os.getenv('MOCK_ATRASO_UPLOAD', '0.3')),
+    'aprovacao': float(os.getenv('MOCK_ATRASO_APROVACAO', '0.3')),
+    'recurso': float(os.getenv('MOCK_ATRASO_RECURSO', '0.02')),
+    'objeto': float(os.getenv('MOCK_ATRASO_OBJETO', '0.2')),
+    'cep': float(os.getenv('MOCK_ATRASO_CEP', '0.05')),
+}
+
+# Requisições atendidas ao mesmo tempo sem ficar mais lento; acima disso os atrasos crescem na
+# proporção da carga, como um portal sobrecarregado (0: sem limite)
+CAPACIDADE = int(os.getenv('MOCK_CAPACIDADE', '0'))
+
+USUARIO = os.getenv('MOCK_USUARIO', 'teste')
+SENHA = os.getenv('MOCK_SENHA', 'teste')
+# Bucket do DO Spaces simulado (endereçamento por caminho: <base>/<bucket>/<chave>)
+BUCKET = os.getenv('MOCK_BUCKET', 'pixcard')
+
+SIM = "ctl00_Cph_ucSimulacaoCartaoConsignado_"
+DOC = "ctl00_Cph_ucAnexarDocumento1_"
+ENDERECO = PREFIXO_CADASTRO + "ucEnderecoResidencial_"
+GRAVAR = "ctl00_Cph_Container_AbaCliente_bbGravar"
+APROVAR = "ctl00_Cph_ucBotoesEsteira1_bbAprovar"
+
+UFS = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB', 'PE', 'PI',
+       'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+
+OPCOES = {
+    SIM + "cbLoja_CAMPO": [('', '-'), ('101', 'LOJA CENTRO'), ('102', 'LOJA NORTE')],
+    SIM + "cbTipoProduto_CAMPO": [('', '-'), ('1', 'CARTÃO CONSIGNADO'), ('4', 'CARTÃO BENEFÍCIO')],
+    SIM + "cbEmpregador_CAMPO": [('', '-'), ('51', 'GOVERNO DE RORAIMA'), ('52', 'PREFEITURA DE BOA VISTA')],
+    DOC + "cbTipoDocumento_CAMPO": [('', '-'), ('20', 'RG - VERSO'), ('4', 'COMPROVANTE DE ENDEREÇO'), ('5', 'COMPROVANTE DE RENDA')],
+    PREFIXO_CADASTRO + "cbSexo_CAMPO": [('', '-'), ('M', 'MASCULINO'), ('F', 'FEMININO')],
+    PREFIXO_CADASTRO + "cbEstadoCivil_CAMPO": [('', '-'), ('1', 'CASADO'), ('2', 'SOLTEIRO'), ('3', 'DIVORCIADO'),
+                                              ('4', 'VIÚVO'), ('5', 'DESQUITADO')],
+    PREFIXO_CADASTRO + "cbProfissao_CAMPO": [('', '-')] + [(str(i), f'PROFISSÃO {i}') for i in range(1, 100)],
+    PREFIXO_CADASTRO + "cbTipoConta_CAMPO": [('', '-'), ('1', 'CONTA CORRENTE'), ('2', 'POUPANÇA')],
+    PREFIXO_CADASTRO + "cbBanco_CAMPO": [('', '-')] + [(codigo, f'BANCO {codigo}') for codigo in
+                                                      ('001', '033', '041', '070', '077', '104', '237', '260', '290',
+                                                       '336', '341', '380', '748', '756')],
+}
+for _id in ("cbUFEmissao_CAMPO", "cbUFNatal_CAMPO", "ucEnderecoResidencial_cbUF_CAMPO"):
+    OPCOES[PREFIXO_CADASTRO + _id] = [('', '-')] + [(uf, uf) for uf in UFS]
+
+# Campos do cadastro exigidos ao gravar
+OBRIGATORIOS_CADASTRO = [campo.id for campo in CAMPOS_CADASTRO if campo.obrigatorio] + [ENDERECO + "txtCidade_CAMPO"]
+
+# Recursos estáticos referenciados pelas páginas (imagens, fontes, CSS e analytics), como no portal real
+RECURSOS = {
+    '/AppCartao/Content/site.css': ('text/css', b'body{font-family:Roboto,sans-serif}' + b' ' * 40000),
+    '/AppCartao/Content/logo.png': ('image/png', b'\x89PNG\r\n\x1a\n' + b'\0' * 120000),
+    '/AppCartao/Content/banner.jpg': ('image/jpeg', b'\xff\xd8\xff' + b'\0' * 250000),
+    '/AppCartao/Content/fonts/roboto.woff2': ('font/woff2', b'wOF2' + b'\0' * 60000),
+    '/AppCartao/Scripts/jquery.min.js': ('application/javascript', b'window.jQuery=window.jQuery||{active:0};' + b' ' * 90000),
+    '/analytics/gtag.js': ('application/javascript', b'window.dataLayer=[];' + b' ' * 80000),
+}
+
+# PageRequestManager mínimo: postbacks assíncronos por XHR com resposta delta, como o ASP.NET AJAX
+_SCRIPT_CLIENTE = r"""
+var Sys = {WebForms: {PageRequestManager: (function () {
+    var instancia = null;
+    function PRM() { this._inicio = []; this._fim = []; this._ocupado = false; this._sm = null; this._sync = []; }
+    PRM.getInstance = function () { return instancia || (instancia = new PRM()); };
+    PRM._initialize = function (sm, form, paineis, async, sync) {
+        var p = PRM.getInstance(); p._sm = sm; p._sync = sync || [];
+    };
+    PRM.prototype.add_beginRequest = function (f) { this._inicio.push(f); };
+    PRM.prototype.add_endRequest = function (f) { this._fim.push(f); };
+    PRM.prototype.get_isInAsyncPostBack = function () { return this._ocupado; };
+    return PRM;
+})()}};
+function __aplicarDelta(texto) {
+    var form = document.forms['aspnetForm'], pos = 0, scripts = [];
+    while (pos < texto.length) {
+        var a = texto.indexOf('|', pos), tamanho = parseInt(texto.substring(pos, a), 10);
+        var b = texto.indexOf('|', a + 1), c = texto.indexOf('|', b + 1);
+        var tipo = texto.substring(a + 1, b), id = texto.substring(b + 1, c);
+        var conteudo = texto.substr(c + 1, tamanho);
+        pos = c + 2 + tamanho;
+        if (tipo === 'updatePanel') { document.getElementById(id).innerHTML = conteudo; }
+        else if (tipo === 'hiddenField') { form.elements[id].value = conteudo; }
+        else if (tipo === 'pageRedirect') { window.location.href = decodeURIComponent(conteudo); }
+        else if (tipo === 'scriptStartupBlock' || tipo === 'scriptBlock') { scripts.push(conteudo); }
+        else if (tipo === 'error') { scripts.push("alert(" + JSON.stringify(conteudo) + ")"); }
+    }
+    return scripts;
+}
+function __doPostBack(alvo, argumento) {
+    var form = document.forms['aspnetForm'], prm = Sys.WebForms.PageRequestManager.getInstance();
+    form.__EVENTTARGET.value = alvo;
+    form.__EVENTARGUMENT.value = argumento;
+    if (!prm._sm || prm._sync.indexOf(alvo) >= 0) { form.submit(); return; }
+    var dados = new FormData(form);
+    dados.set(prm._sm, alvo);
+    dados.set('__ASYNCPOST', 'true');
+    prm._ocupado = true;
+    prm._inicio.forEach(function (f) { f(); });
+    var xhr = new XMLHttpRequest();
+    xhr.open('POST', form.action);
+    xhr.setRequestHeader('X-MicrosoftAjax', 'Delta=true');
+    xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
+    xhr.onload = function () {
+        var scripts = __aplicarDelta(xhr.responseText);
+        prm._ocupado = false;
+        prm._fim.forEach(function (f) { f(); });
+        setTimeout(function () { scripts.forEach(function (s) { eval(s); }); }, 0);
+    };
+    xhr.send(dados);
+}
+"""
+
+
+def nome(id_elemento):
+    """Nome do campo no post (ids do WebForms usam '_' onde o nome usa '$')"""
+    return id_elemento.replace('_', '$')
+
+
+class EstadoMock:
+    """Sessões, páginas abertas, propostas e contadores do servidor mock.
+
+    Como no WebForms, o estado de cada página aberta acompanha o __VIEWSTATE dela e não a
+    sessão, então jobs simultâneos com o mesmo login não interferem entre si.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.em_atendimento = 0
+        self.sessoes = {}
+        self.paginas = {}
+        self.propostas = {}
+        self.objetos = {}  # chave -> (etag, conteúdo) do bucket simulado
+        self.multipart = {}  # upload id -> {'chave', 'partes': {número: (etag, conteúdo)}}
+        self.recusas = 0  # próximas requisições ao portal respondidas com 429
+        self.contadores = {'requisicoes': 0, 'bytes_enviados': 0, 'postbacks': 0, 'recursos': 0, 'aprovadas': 0,
+                           'notificacoes': 0, 'notificacoes_requisicoes': 0,
+                           'objetos_baixados': 0, 'objetos_nao_modificados': 0, 'objetos_enviados': 0, 'ceps': 0,
+                           'recusadas': 0}
+
+    def contar(self, chave, valor=1):
+        with self.lock:
+            self.contadores[chave] += valor
+
+    def recusar(self, quantidade):
+        """Responde as próximas requisições de páginas e postbacks com 429, como o portal no limite da conta"""
+        with self.lock:
+            self.recusas = quantidade
+
+    def consumir_recusa(self):
+        with self.lock:
+            if not self.recusas:
+                return False
+            self.recusas -= 1
+            self.contadores['recusadas'] += 1
+            return True
+
+    def atrasar(self, tipo):
+        """Aplica o atraso do tipo de requisição, multiplicado pela sobrecarga acima da CAPACIDADE"""
+        with self.lock:
+            self.em_atendimento += 1
+            fator = max(1.0, self.em_atendimento / CAPACIDADE) if CAPACIDADE else 1.0
+        try:
+            time.sleep(ATRASOS[tipo] * fator)
+        finally:
+            with self.lock:
+                self.em_atendimento -= 1
+
+    def estatisticas(self):
+        with self.lock:
+            return dict(self.contadores, sessoes=len(self.sessoes), paginas=len(self.paginas), propostas=len(self.propostas),
+                        objetos=len(self.objetos))
+
+    def guardar_objeto(self, chave, conteudo, etag=None):
+        etag = etag or '"' + hashlib.md5(conteudo).hexdigest() + '"'
+        with self.lock:
+            self.objetos[chave] = (etag, conteudo)
+        return etag
+
+
+estado = EstadoMock()
+
+
+# --- Renderização ---
+
+def _atributos(**attrs):
+    return ''.join(f' {chave.rstrip("_")}="{escape(str(valor))}"' for chave, valor in attrs.items() if valor is not None)
+
+
+def texto(id_elemento, valor='', autopostback=False, somente_leitura=False):
+    onchange = None
+    if autopostback:
+        onchange = f"javascript:setTimeout('__doPostBack(\\'{nome(id_elemento)}\\',\\'\\')', 0)"
+    return (f'<input type="text"{_atributos(id=id_elemento, name=nome(id_elemento), value=valor, onchange=onchange)}'
+            f'{" readonly" if somente_leitura else ""} />')
+
+
+def selecao(id_elemento, valor='', autopostback=False):
+    onchange = f"javascript:setTimeout('__doPostBack(\\'{nome(id_elemento)}\\',\\'\\')', 0)" if autopostback else None
+    opcoes = ''.join(f'<option value="{escape(v)}"{" selected" if v == valor else ""}>{escape(t)}</option>'
+                     for v, t in OPCOES[id_elemento])
+    return f'<select{_atributos(id=id_elemento, name=nome(id_elemento), onchange=onchange)}>{opcoes}</select>'
+
+
+def botao(id_elemento, rotulo, classe='btn btn-primary'):
+    """LinkButton do WebForms"""
+    return f'<a id="{id_elemento}" class="{classe}" href="javascript:__doPostBack(\'{nome(id_elemento)}\',\'\')">{rotulo}</a>'
+
+
+def pagina(titulo, acao, paineis, viewstate, script_manager=True, sincronos=(), multipart=False, alerta=None):
+    """Página completa; paineis é uma lista de (id do UpdatePanel, html)"""
+    corpo = ''.join(f'<div id="{id_painel}">{conteudo}</div>' for id_painel, conteudo in paineis)
+    inicializacao = ''
+    if script_manager:
+        nomes = ', '.join(f"'t{nome(id_painel)}'" for id_painel, _ in paineis)
+        sync = ', '.join(f"'{nome(id_elemento)}'" for id_elemento in sincronos)
+        inicializacao = (f"<script>Sys.WebForms.PageRequestManager._initialize('ctl00$ScriptManager1', 'aspnetForm', "
+                         f"[{nomes}], [], [{sync}], 90, 'ctl00');</script>")
+    script_alerta = f"<script>window.onload = function () {{ alert({json.dumps(alerta)}); }};</script>" if alerta else ''
+    enctype = ' enctype="multipart/form-data"' if multipart else ''
+    return f"""<!DOCTYPE html>
+<html><head><title>{titulo}</title>
+<link rel="stylesheet" href="/AppCartao/Content/site.css" />
+<link rel="preload" href="/AppCartao/Content/fonts/roboto.woff2" as="font" crossorigin />
+<script src="/AppCartao/Scripts/jquery.min.js"></script>
+<script async src="/analytics/gtag.js"></script>
+<script>{_SCRIPT_CLIENTE}</script>
+</head><body>
+<img src="/AppCartao/Content/logo.png" alt="PixCard" /><img src="/AppCartao/Content/banner.jpg" alt="" />
+<form method="post" action="{escape(acao)}" id="aspnetForm"{enctype}>
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}" />
+{inicializacao}
+{corpo}
+</form>{script_alerta}
+</body></html>"""
+
+
+def delta(paineis, viewstate, extras=()):
+    """Resposta de postback assíncrono no formato `tamanho|tipo|id|conteúdo|`"""
+    partes = [('updatePanel', id_painel, conteudo) for id_painel, conteudo in paineis]
+    partes.append(('hiddenField', '__VIEWSTATE', viewstate))
+    partes.extend(extras)
+    return ''.join(f'{len(conteudo)}|{tipo}|{id_parte}|{conteudo}|' for tipo, id_parte, conteudo in partes)
+
+
+def painel_simulacao(sim):
+    v = sim['valores']
+    html = [
+        f'<span id="{SIM}lblErro" class="erro">{escape(sim.get("erro", ""))}</span>',
+        selecao(SIM + "cbLoja_CAMPO", v.get(SIM + "cbLoja_CAMPO", ''), autopostback=True),
+    ]
+    if v.get(SIM + "cbLoja_CAMPO"):
+        html.append(selecao(SIM + "cbTipoProduto_CAMPO", v.get(SIM + "cbTipoProduto_CAMPO", ''), autopostback=True))
+    html.append(texto(SIM + "txtCPF_CAMPO", v.get(SIM + "txtCPF_CAMPO", ''), autopostback=True))
+    if sim.get('nome'):
+        html.append(texto(SIM + "txtNome_CAMPO", sim['nome'], somente_leitura=True))
+        html.append(texto(SIM + "txtDataNascimento_CAMPO", '01/01/1980', somente_leitura=True))
+    html.append(texto(SIM + "txtNumeroBeneficio_CAMPO", v.get(SIM + "txtNumeroBeneficio_CAMPO", '')))
+    html.append(selecao(SIM + "cbEmpregador_CAMPO", v.get(SIM + "cbEmpregador_CAMPO", ''), autopostback=True))
+    html.append(botao(SIM + "bbCalcularMargem", "Calcular Margem"))
+    if sim.get('margem'):
+        html.append(texto(SIM + "txtValorMargem_CAMPO", v.get(SIM + "txtValorMargem_CAMPO", sim['margem'])))
+        html.append(botao(SIM + "lnkMargemOK", "OK"))
+    if sim.get('margem_ok'):
+        html.append(botao(SIM + "bbSimularConsignado", "Exibir Tabelas"))
+    if sim.get('tabelas'):
+        linhas = ''.join(f'<tr><td>TABELA {i - 1}</td><td>{botao(f"{SIM}gridTabelas_ctl0{i}_lnkDetalhes", "Selecionar")}</td></tr>'
+                         for i in (2, 3))
+        html.append(f'<table id="{SIM}gridTabelas">{linhas}</table>')
+    if sim.get('tabela'):
+        html.append(botao(SIM + "bbSimularSaque", "Simular Saque"))
+    if sim.get('saque'):
+        html.append(f'<span id="{SIM}lblValorSaque">R$ 1.234,56</span>')
+        html.append(botao(SIM + "bbSolicitarProposta", "Solicitar Proposta"))
+    if sim.get('confirmando'):
+        html.append(botao(SIM + "bbContinuarSim", "Sim") + botao(SIM + "bbContinuarNao", "Não"))
+    if sim.get('proposta'):
+        html.append(f'<span id="{SIM}lblProposta">Proposta {sim["proposta"]} gerada</span>')
+        html.append(botao(SIM + "bbIniciarEsteira", "OK", classe='btn btn-success'))
+    return '\n'.join(html)
+
+
+def _campo_cadastro(campo, valores):
+    valor = valores.get(campo.id, '')
+    if campo.tipo == SELECT:
+        return selecao(campo.id, valor)
+    return texto(campo.id, valor, autopostback=campo.postback)
+
+
+def painel_cliente(proposta):
+    valores = proposta['valores']
+    html = [f'<span id="ctl00_Cph_Container_AbaCliente_lblMensagem">{escape(proposta.get("mensagem", ""))}</span>']
+    for campo in CAMPOS_CADASTRO:
+        html.append(f'<label for="{campo.id}">{escape(campo.descricao)}</label>{_campo_cadastro(campo, valores)}')
+        if campo.id == ENDERECO + "txtBairro_CAMPO":
+            html.append(texto(ENDERECO + "txtCidade_CAMPO", valores.get(ENDERECO + "txtCidade_CAMPO", '')))
+    html.append(botao(GRAVAR, "Atualizar Cliente"))
+    return '\n'.join(html)
+
+
+def painel_documentos(proposta):
+    tipo = proposta['valores'].get(DOC + "cbTipoDocumento_CAMPO", '')
+    anexados = ''.join(f'<li>{escape(tipo_doc)}: {escape(arquivo)} ({tamanho} bytes)</li>'
+                       for tipo_doc, arquivo, tamanho in proposta['documentos'])
+    return '\n'.join([
+        selecao(DOC + "cbTipoDocumento_CAMPO", tipo, autopostback=True),
+        f'<input type="file" id="{DOC}fileUpload" name="{nome(DOC + "fileUpload")}" />',
+        botao(DOC + "bbEnviar", "Importar"),
+        f'<ul id="{DOC}listaDocumentos">{anexados}</ul>',
+    ])
+
+
+def painel_esteira(proposta):
+    return f'<span id="ctl00_Cph_ucBotoesEsteira1_lblSituacao">{escape(proposta["situacao"])}</span>' + botao(APROVAR, "Aprovar", 'btn btn-success')
+
+
+# --- Servidor ---
+
+class ManipuladorMock(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    # Infraestrutura
+
+    def _sessao(self, criar=False):
+        cookies = dict(parte.strip().split('=', 1) for parte in self.headers.get('Cookie', '').split(';') if '=' in parte)
+        sid = cookies.get('ASP.NET_SessionId')
+        with estado.lock:
+            sessao = estado.sessoes.get(sid)
+            if sessao is None and criar:
+                sid = uuid.uuid4().hex[:24]
+                sessao = {'id': sid, 'novo': True, 'usuario': None}
+                estado.sessoes[sid] = sessao
+            return sessao
+
+    def _responder(self, status, corpo=b'', tipo='text/html; charset=utf-8', headers=None, sessao=None):
+        if isinstance(corpo, str):
+            corpo = corpo.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.send_header('Cache-Control', 'private')
+        if sessao is not None and sessao.pop('novo', False):
+            self.send_header('Set-Cookie', f"ASP.NET_SessionId={sessao['id']}; path=/; HttpOnly")
+        for chave, valor in (headers or {}).items():
+            self.send_header(chave, valor)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(corpo)
+        estado.contar('requisicoes')
+        estado.contar('bytes_enviados', len(corpo))
+
+    def _redirecionar(self, destino, sessao=None):
+        self._responder(302, f'<a href="{escape(destino)}">Object moved</a>', headers={'Location': destino}, sessao=sessao)
+
+    def _ler_formulario(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        corpo = self.rfile.read(tamanho)
+        tipo = self.headers.get('Content-Type', '')
+        campos, arquivos = {}, {}
+        if tipo.startswith('multipart/form-data'):
+            mensagem = BytesParser(policy=HTTP).parsebytes(f'Content-Type: {tipo}\r\n\r\n'.encode('latin-1') + corpo)
+            for parte in mensagem.iter_parts():
+                chave = parte.get_param('name', header='content-disposition')
+                if parte.get_filename() is not None:
+                    arquivos[chave] = (parte.get_filename(), parte.get_payload(decode=True) or b'')
+                else:
+                    campos[chave] = parte.get_content()
+        else:
+            campos = {chave: valores[0] for chave, valores in parse_qs(corpo.decode('utf-8'), keep_blank_values=True).items()}
+        return campos, arquivos
+
+    def _nova_pagina(self, caminho):
+        return {'caminho': caminho, 'viewstate': None, 'simulacao': {'valores': {}}}
+
+    def _novo_viewstate(self, pagina_aberta):
+        """Só o __VIEWSTATE mais recente de cada página é aceito no próximo postback"""
+        viewstate = uuid.uuid4().hex
+        with estado.lock:
+            estado.paginas.pop(pagina_aberta['viewstate'], None)
+            estado.paginas[viewstate] = pagina_aberta
+        pagina_aberta['viewstate'] = viewstate
+        return viewstate
+
+    def _recusar(self):
+        """Responde 429 se o mock foi instruído a recusar esta requisição"""
+        if not estado.consumir_recusa():
+            return False
+        self._responder(429, 'Too Many Requests', tipo='text/plain; charset=utf-8', headers={'Retry-After': '1'})
+        return True
+
+    def _erro_postback(self, sessao, assincrono, mensagem, pagina_aberta=None):
+        if assincrono:
+            viewstate = pagina_aberta['viewstate'] if pagina_aberta else ''
+            self._responder(200, delta([], viewstate, [('error', '500', mensagem)]),
+                            tipo='text/plain; charset=utf-8', sessao=sessao)
+        else:
+            self._responder(500, f'<h1>Server Error</h1><p>{escape(mensagem)}</p>', sessao=sessao)
+
+    # Roteamento
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self._caminho = url.path
+        if url.path in RECURSOS:
+            estado.atrasar('recurso')
+            estado.contar('recursos')
+            tipo, corpo = RECURSOS[url.path]
+            return self._responder(200, corpo, tipo=tipo, headers={'Cache-Control': 'no-cache'})
+        if url.path == '/__mock/estatisticas':
+            return self._responder(200, json.dumps(estado.estatisticas()), tipo='application/json')
+        if url.path in (f'/{BUCKET}', f'/{BUCKET}/') and 'list-type' in parse_qs(url.query):
+            return self._listar_objetos(url)
+        if url.path.startswith(f'/{BUCKET}/'):
+            return self._objeto(url)
+        cep = re.fullmatch(r'/ws/(\d{8})/json/?', url.path)
+        if cep:
+            # Mesmo formato do ViaCEP, para apontar CEP_URL_BASE para o mock
+            estado.atrasar('cep')
+            estado.contar('ceps')
+            dados = {'cep': cep.group(1), 'logradouro': 'RUA DAS FLORES', 'bairro': 'CENTRO', 'localidade': 'Boa Vista', 'uf': 'RR'}
+            return self._responder(200, json.dumps(dados), tipo='application/json')
+
+        if self._recusar():
+            return
+        sessao = self._sessao(criar=True)
+        estado.atrasar('pagina')
+        if url.path == LOGIN:
+            return self._pagina_login(sessao, self._nova_pagina(LOGIN))
+        if url.path in (SIMULACAO, CADASTRO) and not sessao['usuario']:
+            return self._redirecionar(f"{LOGIN}?ReturnUrl={quote(url.path)}", sessao)
+        if url.path == SIMULACAO:
+            return self._pagina_simulacao(sessao, self._nova_pagina(SIMULACAO))
+        if url.path == CADASTRO:
+            proposta = self._proposta(url)
+            if not proposta:
+                return self._responder(404, 'Proposta não encontrada', sessao=sessao)
+            return self._pagina_cadastro(sessao, self._nova_pagina(CADASTRO), proposta)
+        self._responder(404, 'Não encontrado', sessao=sessao)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        self._caminho = url.path
+        if url.path in ('/api/status', '/api/status/lote'):
+            # Endpoint de status do frontend (API_URL) e sua versão em lote (NOTIFICACOES_URL_LOTE)
+            corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'null')
+            estado.contar('notificacoes_requisicoes')
+            estado.contar('notificacoes', len(corpo) if isinstance(corpo, list) else 1)
+            return self._responder(200, '{"ok": true}', tipo='application/json')
+        if url.path.startswith(f'/{BUCKET}/'):
+            return self._multipart(url)
+        sessao = self._sessao(criar=True)
+        campos, arquivos = self._ler_formulario()
+        if self._recusar():
+            return
+        assincrono = campos.get('__ASYNCPOST') == 'true'
+        estado.contar('postbacks')
+
+        with estado.lock:
+            pagina_aberta = estado.paginas.get(campos.get('__VIEWSTATE'))
+        if not pagina_aberta or pagina_aberta['caminho'] != url.path:
+            return self._erro_postback(sessao, assincrono, "Validation of viewstate MAC failed.")
+        if url.path == LOGIN:
+            return self._postback_login(sessao, pagina_aberta, campos)
+        if not sessao['usuario']:
+            return self._redirecionar(f"{LOGIN}?ReturnUrl={quote(url.path)}", sessao)
+
+        alvo = campos.get('__EVENTTARGET') or ''
+        if assincrono:
+            alvo = campos.get('ctl00$ScriptManager1', '').split('|')[-1] or alvo
+        if url.path == SIMULACAO:
+            return self._postback_simulacao(sessao, pagina_aberta, campos, alvo, assincrono)
+        if url.path == CADASTRO:
+            proposta = self._proposta(url)
+            if not proposta:
+                return self._erro_postback(sessao, assincrono, "Proposta não encontrada", pagina_aberta)
+            return self._postback_cadastro(sessao, pagina_aberta, proposta, campos, arquivos, alvo, assincrono)
+        self._responder(404, 'Não encontrado', sessao=sessao)
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        self._caminho = url.path
+        corpo = self._ler_objeto()
+        if not url.path.startswith(f'/{BUCKET}/'):
+            return self._responder(404, 'Não encontrado')
+        parametros = parse_qs(url.query)
+        etag = '"' + hashlib.md5(corpo).hexdigest() + '"'
+        if 'uploadId' in parametros:
+            with estado.lock:
+                upload = estado.multipart.get(parametros['uploadId'][0])
+                if upload is not None:
+                    upload['partes'][int(parametros['partNumber'][0])] = (etag, corpo)
+            if upload is None:
+                return self._erro_s3(404, 'NoSuchUpload')
+        else:
+            estado.contar('objetos_enviados')
+            estado.guardar_objeto(self._chave(url), corpo)
+        self._responder(200, b'', tipo='application/xml', headers={'ETag': etag})
+
+    def do_DELETE(self):
+        url = urlparse(self.path)
+        self._caminho = url.path
+        parametros = parse_qs(url.query)
+        with estado.lock:
+            if 'uploadId' in parametros:
+                estado.multipart.pop(parametros['uploadId'][0], None)
+            else:
+                estado.objetos.pop(self._chave(url), None)
+        self._responder(204)
+
+    # Bucket S3 (DO Spaces) simulado: GET/HEAD com ETag e If-None-Match, PUT, upload multipart e listagem
+
+    def _chave(self, url):
+        return unquote(url.path[len(BUCKET) + 2:])
+
+    def _erro_s3(self, status, codigo):
+        return self._responder(status, f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{codigo}</Code></Error>',
+                               tipo='application/xml')
+
+    def _ler_objeto(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            corpo = b''
+            while True:
+                tamanho = int(self.rfile.readline().split(b';')[0], 16)
+                if not tamanho:
+                    while self.rfile.readline() not in (b'\r\n', b''):
+                        pass
+                    break
+                corpo += self.rfile.read(tamanho)
+                self.rfile.readline()
+        else:
+            corpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if 'aws-chunked' in self.headers.get('Content-Encoding', ''):
+            # Corpo em blocos "<tamanho hex>[;chunk-signature=...]\r\n<dados>\r\n" com checksums no final
+            dados, posicao = b'', 0
+            while True:
+                fim_linha = corpo.index(b'\r\n', posicao)
+                tamanho = int(corpo[posicao:fim_linha].split(b';')[0], 16)
+                if not tamanho:
+                    break
+                dados += corpo[fim_linha + 2:fim_linha + 2 + tamanho]
+                posicao = fim_linha + 2 + tamanho + 2
+            corpo = dados
+        return corpo
+
+    def _multipart(self, url):
+        parametros = parse_qs(url.query, keep_blank_values=True)
+        corpo = self._ler_objeto()
+        chave = self._chave(url)
+        if 'uploads' in parametros:
+            upload_id = uuid.uuid4().hex
+            with estado.lock:
+                estado.multipart[upload_id] = {'chave': chave, 'partes': {}}
+            return self._responder(200, f'<?xml version="1.0" encoding="UTF-8"?><InitiateMultipartUploadResult>'
+                                        f'<Bucket>{BUCKET}</Bucket><Key>{escape(chave)}</Key><UploadId>{upload_id}</UploadId>'
+                                        f'</InitiateMultipartUploadResult>', tipo='application/xml')
+        if 'uploadId' not in parametros:
+            return self._erro_s3(400, 'InvalidRequest')
+        with estado.lock:
+            upload = estado.multipart.pop(parametros['uploadId'][0], None)
+        if upload is None:
+            return self._erro_s3(404, 'NoSuchUpload')
+        numeros = [int(numero) for numero in re.findall(rb'<PartNumber>(\d+)</PartNumber>', corpo)]
+        partes = [upload['partes'][numero] for numero in numeros]
+        # ETag de objeto multipart no S3: md5 dos md5 das partes, seguido do número de partes
+        etag = '"' + hashlib.md5(b''.join(bytes.fromhex(parte[0].strip('"')) for parte in partes)).hexdigest() + f'-{len(partes)}"'
+        estado.contar('objetos_enviados')
+        estado.guardar_objeto(chave, b''.join(parte[1] for parte in partes), etag)
+        self._responder(200, f'<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUploadResult>'
+                             f'<Bucket>{BUCKET}</Bucket><Key>{escape(chave)}</Key><ETag>{escape(etag)}</ETag>'
+                             f'</CompleteMultipartUploadResult>', tipo='application/xml')
+
+    def _listar_objetos(self, url):
+        parametros = parse_qs(url.query)
+        prefixo = parametros.get('prefix', [''])[0]
+        inicio = parametros.get('continuation-token', parametros.get('start-after', ['']))[0]
+        limite = int(parametros.get('max-keys', ['1000'])[0])
+        with estado.lock:
+            chaves = sorted(chave for chave in estado.objetos if chave.startswith(prefixo) and chave > inicio)
+            pagina = [(chave, estado.objetos[chave]) for chave in chaves[:limite]]
+        truncado = len(chaves) > limite
+        itens = ''.join(f'<Contents><Key>{escape(chave)}</Key><ETag>{escape(etag)}</ETag><Size>{len(conteudo)}</Size>'
+                        f'<LastModified>2024-01-01T00:00:00.000Z</LastModified><StorageClass>STANDARD</StorageClass></Contents>'
+                        for chave, (etag, conteudo) in pagina)
+        continuacao = f'<NextContinuationToken>{escape(pagina[-1][0])}</NextContinuationToken>' if truncado else ''
+        self._responder(200, f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{BUCKET}</Name>'
+                             f'<Prefix>{escape(prefixo)}</Prefix><KeyCount>{len(pagina)}</KeyCount><MaxKeys>{limite}</MaxKeys>'
+                             f'<IsTruncated>{"true" if truncado else "false"}</IsTruncated>{continuacao}{itens}</ListBucketResult>',
+                        tipo='application/xml')
+
+    def _objeto(self, url):
+        estado.atrasar('objeto')
+        with estado.lock:
+            objeto = estado.objetos.get(unquote(url.path[len(BUCKET) + 2:]))
+        if not objeto:
+            return self._responder(404, '<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey</Code>'
+                                        '<Message>The specified key does not exist.</Message></Error>',
+                                   tipo='application/xml')
+        etag, conteudo = objeto
+        if self.headers.get('If-None-Match') == etag:
+            estado.contar('objetos_nao_modificados')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        if self.command == 'GET':
+            estado.contar('objetos_baixados')
+        self._responder(200, conteudo, tipo='application/octet-stream', headers={'ETag': etag})
+
+    # Login
+
+    def _pagina_login(self, sessao, pagina_aberta, erro=''):
+        corpo = (f'<span id="lblErro">{escape(erro)}</span>'
+                 + texto("txtUsuario_CAMPO") + '<input type="password" id="txtSenha_CAMPO" name="txtSenha$CAMPO" />'
+                 + botao("bbConfirmar", "Entrar"))
+        viewstate = self._novo_viewstate(pagina_aberta)
+        self._responder(200, pagina("PixCard - Login", self.path, [('pnlLogin', corpo)], viewstate, script_manager=False),
+                        sessao=sessao)
+
+    def _postback_login(self, sessao, pagina_aberta, campos):
+        estado.atrasar('login')
+        if campos.get('__EVENTTARGET') != 'bbConfirmar':
+            return self._pagina_login(sessao, pagina_aberta)
+        if campos.get('txtUsuario$CAMPO') != USUARIO or campos.get('txtSenha$CAMPO') != SENHA:
+            return self._pagina_login(sessao, pagina_aberta, 'Usuário ou senha inválidos')
+        sessao['usuario'] = campos['txtUsuario$CAMPO']
+        destino = parse_qs(urlparse(self.path).query).get('ReturnUrl', [SIMULACAO])[0]
+        self._redirecionar(destino, sessao)
+
+    # Simulação
+
+    def _pagina_simulacao(self, sessao, pagina_aberta):
+        viewstate = self._novo_viewstate(pagina_aberta)
+        html = pagina("PixCard - Simulação", SIMULACAO, [('ctl00_Cph_upSimulacao', painel_simulacao(pagina_aberta['simulacao']))], viewstate)
+        self._responder(200, html, sessao=sessao)
+
+    def _postback_simulacao(self, sessao, pagina_aberta, campos, alvo, assincrono):
+        estado.atrasar('postback')
+        sim = pagina_aberta['simulacao']
+        # Como o EventValidation: só aceita postbacks de controles presentes na página
+        if alvo and f'id="{alvo.replace("$", "_")}"' not in painel_simulacao(sim):
+            return self._erro_postback(sessao, assincrono, f"Invalid postback or callback argument: {alvo}", pagina_aberta)
+
+        for chave, valor in campos.items():
+            id_campo = chave.replace('$', '_')
+            if id_campo.startswith(SIM):
+                sim['valores'][id_campo] = valor
+        v = sim['valores']
+        sim['erro'] = ''
+        redirecionar = None
+        id_alvo = alvo.replace('$', '_')
+
+        if id_alvo == SIM + "txtCPF_CAMPO":
+            cpf = re.sub(r'\D', '', v.get(id_alvo, ''))
+            sim['nome'] = 'CLIENTE TESTE' if len(cpf) == 11 else None
+            if len(cpf) != 11:
+                sim['erro'] = 'CPF inválido'
+        elif id_alvo == SIM + "bbCalcularMargem":
+            faltando = [c for c in ("cbLoja_CAMPO", "cbTipoProduto_CAMPO", "txtNumeroBeneficio_CAMPO", "cbEmpregador_CAMPO")
+                        if not v.get(SIM + c)]
+            if faltando or not sim.get('nome'):
+                sim['erro'] = 'Preencha os dados do cliente antes de calcular a margem'
+            else:
+                estado.atrasar('margem')
+                sim['margem'] = '350,00'
+        elif id_alvo == SIM + "lnkMargemOK":
+            sim['margem_ok'] = bool(v.get(SIM + "txtValorMargem_CAMPO"))
+        elif id_alvo == SIM + "bbSimularConsignado":
+            sim['tabelas'] = True
+        elif id_alvo.endswith('_lnkDetalhes'):
+            sim['tabela'] = id_alvo
+        elif id_alvo == SIM + "bbSimularSaque":
+            sim['saque'] = True
+        elif id_alvo == SIM + "bbSolicitarProposta":
+            sim['confirmando'] = True
+        elif id_alvo == SIM + "bbContinuarSim":
+            sim['confirmando'] = False
+            with estado.lock:
+                numero = str(100000 + len(estado.propostas) + 1)
+                estado.propostas[numero] = {
+                    'numero': numero, 'cpf': v.get(SIM + "txtCPF_CAMPO"), 'valores': {}, 'documentos': [],
+                    'gravado': False, 'situacao': 'EM DIGITAÇÃO',
+                }
+            sim['proposta'] = numero
+        elif id_alvo == SIM + "bbIniciarEsteira":
+            redirecionar = f"{CADASTRO}?Proposta={sim['proposta']}"
+
+        if not assincrono:
+            return self._pagina_simulacao(sessao, pagina_aberta)
+        viewstate = self._novo_viewstate(pagina_aberta)
+        extras = [('pageRedirect', '', quote(redirecionar, safe=''))] if redirecionar else []
+        self._responder(200, delta([('ctl00_Cph_upSimulacao', painel_simulacao(sim))], viewstate, extras),
+                        tipo='text/plain; charset=utf-8', sessao=sessao)
+
+    # Cadastro
+
+    def _proposta(self, url):
+        numero = parse_qs(url.query).get('Proposta', [None])[0]
+        with estado.lock:
+            return estado.propostas.get(numero)
+
+    def _paineis_cadastro(self, proposta):
+        return [
+            ('ctl00_Cph_Container_AbaCliente_upCliente', painel_cliente(proposta)),
+            ('ctl00_Cph_ucAnexarDocumento1_upAnexo', painel_documentos(proposta)),
+            ('ctl00_Cph_ucBotoesEsteira1_upEsteira', painel_esteira(proposta)),
+        ]
+
+    def _pagina_cadastro(self, sessao, pagina_aberta, proposta, alerta=None):
+        viewstate = self._novo_viewstate(pagina_aberta)
+        html = pagina(f"PixCard - Proposta {proposta['numero']}", self.path, self._paineis_cadastro(proposta), viewstate,
+                      sincronos=[DOC + "bbEnviar"], multipart=True, alerta=alerta)
+        self._responder(200, html, sessao=sessao)
+
+    def _postback_cadastro(self, sessao, pagina_aberta, proposta, campos, arquivos, alvo, assincrono):
+        estado.atrasar('postback')
+        if alvo and not any(f'id="{alvo.replace("$", "_")}"' in html for _, html in self._paineis_cadastro(proposta)):
+            return self._erro_postback(sessao, assincrono, f"Invalid postback or callback argument: {alvo}", pagina_aberta)
+        for chave, valor in campos.items():
+            id_campo = chave.replace('$', '_')
+            if id_campo.startswith((PREFIXO_CADASTRO, DOC)):
+                proposta['valores'][id_campo] = valor
+        v = proposta['valores']
+        id_alvo = alvo.replace('$', '_')
+        alerta = None
+
+        if id_alvo == ENDERECO + "txtCEP_CAMPO":
+            if len(re.sub(r'\D', '', v.get(id_alvo, ''))) == 8:
+                v.setdefault(ENDERECO + "txtEndereco_CAMPO", 'RUA DAS FLORES')
+                v[ENDERECO + "txtBairro_CAMPO"] = v.get(ENDERECO + "txtBairro_CAMPO") or 'CENTRO'
+                v[ENDERECO + "txtCidade_CAMPO"] = 'BOA VISTA'
+                v[ENDERECO + "cbUF_CAMPO"] = 'RR'
+        elif id_alvo == GRAVAR:
+            faltando = [campo for campo in OBRIGATORIOS_CADASTRO if not v.get(campo)]
+            proposta['gravado'] = not faltando
+            proposta['mensagem'] = 'Cliente atualizado com sucesso' if not faltando else f'Campos obrigatórios: {len(faltando)}'
+        elif id_alvo == DOC + "bbEnviar":
+            estado.atrasar('upload')
+            arquivo = arquivos.get(nome(DOC + "fileUpload"))
+            tipo = v.get(DOC + "cbTipoDocumento_CAMPO")
+            if arquivo and arquivo[1] and tipo:
+                proposta['documentos'].append((tipo, arquivo[0], len(arquivo[1])))
+        elif id_alvo == APROVAR:
+            estado.atrasar('aprovacao')
+            tipos = {tipo for tipo, _, _ in proposta['documentos']}
+            if proposta['gravado'] and {'20', '4', '5'} <= tipos:
+                proposta['situacao'] = 'APROVADA'
+                estado.contar('aprovadas')
+                alerta = 'Proposta Aprovada com Sucesso'
+            else:
+                alerta = 'Proposta com pendências: cadastro ou documentos incompletos'
+
+        if not assincrono:
+            return self._pagina_cadastro(sessao, pagina_aberta, proposta, alerta)
+        viewstate = self._novo_viewstate(pagina_aberta)
+        extras = [('scriptStartupBlock', 'ScriptContentNoTags', f"alert({json.dumps(alerta)});")] if alerta else []
+        self._responder(200, delta(self._paineis_cadastro(proposta), viewstate, extras),
+                        tipo='text/plain; charset=utf-8', sessao=sessao)
+
+
+def iniciar_servidor(porta=0, host='127.0.0.1'):
+    """Sobe o mock numa thread e retorna (servidor, url base); porta 0 escolhe uma porta livre"""
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorMock)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="mock-portal", daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
+
+
+def main():
+    global CAPACIDADE
+    parser = argparse.ArgumentParser(description="Servidor local que imita as páginas do PixCard usadas pelo scraper")
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--atraso', action='append', default=[], metavar='TIPO=SEGUNDOS',
+                        help=f"Atraso do servidor por tipo de requisição ({', '.join(ATRASOS)})")
+    parser.add_argument('--capacidade', type=int, default=CAPACIDADE,
+                        help="Requisições simultâneas sem lentidão; acima disso os atrasos crescem com a carga (0: sem limite)")
+    args = parser.parse_args()
+    CAPACIDADE = args.capacidade
+    for item in args.atraso:
+        tipo, segundos = item.split('=', 1)
+        if tipo not in ATRASOS:
+            parser.error(f"Tipo de atraso desconhecido: {tipo}")
+        ATRASOS[tipo] = float(segundos)
+
+    servidor = ThreadingHTTPServer((args.host, args.porta), ManipuladorMock)
+    print(f"Mock do PixCard em http://{args.host}:{args.porta}{SIMULACAO} (usuário {USUARIO}, atrasos {ATRASOS})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,594 @@
+import os
+import re
+import time
+import threading
+import logging
+from html.parser import HTMLParser
+from urllib.parse import urljoin, unquote
+from html import unescape
+
+
+from formulario_cadastro import CAMPOS_CADASTRO, PREFIXO_CADASTRO
+from scraper import montar_valores_cadastro, notificar_frontend, obter_endereco_cep
+from sessoes import SESSAO_TTL, resumo_senha, mesma_senha
+from metricas import medir
+from cliente_http import AdaptadorHTTP, nova_sessao
+
+logger = logging.getLogger(__name__)
+
+# Configuração do motor HTTP (sem navegador)
+MOTOR_HTTP_TIMEOUT_CONEXAO = float(os.getenv('MOTOR_HTTP_TIMEOUT_CONEXAO', '5'))
+MOTOR_HTTP_TIMEOUT_LEITURA = float(os.getenv('MOTOR_HTTP_TIMEOUT_LEITURA', '30'))
+MOTOR_HTTP_CONEXOES = int(os.getenv('MOTOR_HTTP_CONEXOES', '10'))
+
+# Respostas com que o portal limita uma conta (muitas requisições ou sessões)
+STATUS_LIMITADO = (429, 503)
+
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+# Adaptador compartilhado: cada job tem seus próprios cookies, mas as conexões com o portal são reaproveitadas
+# (sem novas tentativas: um POST de etapa do formulário não pode ser repetido às cegas)
+_adaptador = AdaptadorHTTP(conexoes=MOTOR_HTTP_CONEXOES, tentativas=0)
+
+# Aceita as aspas escapadas do AutoPostBack dos TextBox: setTimeout('__doPostBack(\'alvo\',\'\')', 0)
+_RE_POSTBACK = re.compile(r"""__doPostBack\(\s*\\?['"]([^'"\\]*)\\?['"]\s*,\s*\\?['"]([^'"\\]*)\\?['"]""")
+_RE_POSTBACK_OPCOES = re.compile(r"""WebForm_PostBackOptions\(\s*["']([^"']*)["']\s*,\s*["']([^"']*)["']""")
+_RE_SCRIPT_MANAGER = re.compile(r"""PageRequestManager\._initialize\(\s*['"]([^'"]+)['"]\s*,\s*['"][^'"]*['"]\s*,\s*\[([^\]]*)\]""")
+_RE_ALERTA = re.compile(r"""alert\(\s*(['"])(.*?)(?<!\\)\1\s*\)""", re.S)
+
+_VAZIOS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class ErroPortal(Exception):
+    """O portal respondeu com erro ou com uma página que o motor HTTP não sabe interpretar"""
+
+
+class _LeitorFormulario(HTMLParser):
+    """Extrai os campos do formulário WebForms, as opções dos selects e os alvos de postback dos links"""
+
+    def __init__(self, paineis=()):
+        super().__init__(convert_charrefs=True)
+        self.paineis = set(paineis)
+        self.acao = None
+        self.campos = {}
+        self._pilha = []
+        self._select = None
+        self._textarea = None
+        self._opcao = None
+
+    def _painel_atual(self):
+        for _, id_elemento in reversed(self._pilha):
+            if id_elemento in self.paineis:
+                return id_elemento
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {chave: (valor if valor is not None else '') for chave, valor in attrs}
+        if tag == 'form' and self.acao is None:
+            self.acao = unescape(attrs.get('action', ''))
+
+        campo = None
+        if tag == 'input':
+            tipo = attrs.get('type', 'text').lower()
+            marcado = 'checked' in attrs
+            campo = {'tag': tag, 'tipo': tipo, 'valor': attrs.get('value', 'on' if tipo in ('checkbox', 'radio') else ''),
+                     'marcado': marcado}
+        elif tag == 'select':
+            campo = {'tag': tag, 'tipo': 'select', 'valor': None, 'opcoes': []}
+            self._select = campo
+        elif tag == 'option' and self._select is not None:
+            self._opcao = {'valor': attrs.get('value'), 'texto': '', 'selecionada': 'selected' in attrs}
+            self._select['opcoes'].append(self._opcao)
+        elif tag == 'textarea':
+            campo = {'tag': tag, 'tipo': 'textarea', 'valor': ''}
+            self._textarea = campo
+        elif tag == 'a' and attrs.get('id'):
+            campo = {'tag': tag, 'tipo': 'link', 'valor': None}
+
+        if campo is not None:
+            campo.update({
+                'id': attrs.get('id'),
+                'nome': attrs.get('name'),
+                'desabilitado': 'disabled' in attrs,
+                'onchange': attrs.get('onchange', ''),
+                'href': unescape(attrs.get('href', '')),
+                'onclick': attrs.get('onclick', ''),
+                'painel': self._painel_atual(),
+            })
+            chave = campo['id'] or campo['nome']
+            if chave:
+                self.campos[chave] = campo
+
+        if tag not in _VAZIOS:
+            self._pilha.append((tag, attrs.get('id')))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VAZIOS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'select' and self._select is not None:
+            opcoes = self._select['opcoes']
+            selecionada = next((o for o in opcoes if o['selecionada']), opcoes[0] if opcoes else None)
+            self._select['valor'] = self._valor_opcao(selecionada) if selecionada else None
+            self._select = None
+        elif tag == 'option':
+            self._opcao = None
+        elif tag == 'textarea':
+            self._textarea = None
+        # Fecha até a última tag de mesmo nome (tolera HTML mal formado)
+        for i in range(len(self._pilha) - 1, -1, -1):
+            if self._pilha[i][0] == tag:
+                del self._pilha[i:]
+                break
+
+    def handle_data(self, dados):
+        if self._opcao is not None:
+            self._opcao['texto'] += dados
+        elif self._textarea is not None:
+            self._textarea['valor'] += dados
+
+    def close(self):
+        super().close()
+        for campo in self.campos.values():
+            if campo['tipo'] == 'select':
+                for opcao in campo['opcoes']:
+                    opcao['valor'] = self._valor_opcao(opcao)
+
+    @staticmethod
+    def _valor_opcao(opcao):
+        return opcao['valor'] if opcao['valor'] is not None else opcao['texto'].strip()
+
+
+def ler_delta(texto):
+    """Interpreta a resposta de um postback assíncrono (formato `tamanho|tipo|id|conteúdo|` do UpdatePanel)"""
+    partes = []
+    posicao = 0
+    while posicao < len(texto):
+        fim = texto.index('|', posicao)
+        tamanho = int(texto[posicao:fim])
+        inicio_tipo = fim + 1
+        fim_tipo = texto.index('|', inicio_tipo)
+        fim_id = texto.index('|', fim_tipo + 1)
+        conteudo = texto[fim_id + 1:fim_id + 1 + tamanho]
+        if texto[fim_id + 1 + tamanho:fim_id + 2 + tamanho] != '|':
+            raise ErroPortal("Resposta do UpdatePanel mal formada")
+        partes.append((texto[inicio_tipo:fim_tipo], texto[fim_tipo + 1:fim_id], conteudo))
+        posicao = fim_id + 2 + tamanho
+    return partes
+
+
+class SessaoPortal:
+    """Navega no portal por HTTP puro, mantendo o estado do formulário WebForms entre postbacks.
+
+    Expõe get() e current_url como o WebDriver, para que o pipeline trate os dois motores igualmente.
+    """
+
+    def __init__(self, timeout=(MOTOR_HTTP_TIMEOUT_CONEXAO, MOTOR_HTTP_TIMEOUT_LEITURA)):
+        self.timeout = timeout
+        self.http = nova_sessao(_adaptador)
+        self.http.headers['User-Agent'] = USER_AGENT
+        self.current_url = None
+        self.acao = None
+        self.campos = {}
+        self.alertas = []
+        self.script_manager = None
+        self.paineis = {}
+        # O portal respondeu com limitação da conta (ver STATUS_LIMITADO)
+        self.limitada = False
+
+    # --- Navegação ---
+
+    def get(self, url):
+        """Carrega a página e o estado do seu formulário"""
+        response = self.http.get(url, timeout=self.timeout)
+        self._verificar(response)
+        self._carregar_pagina(response)
+
+    def existe(self, id_elemento):
+        return id_elemento in self.campos
+
+    def opcoes(self, id_elemento):
+        return [opcao['valor'] for opcao in self._campo(id_elemento).get('opcoes', [])]
+
+    def valor(self, id_elemento):
+        return self._campo(id_elemento)['valor']
+
+    def definir(self, id_elemento, valor):
+        """Altera o valor de um campo sem postback; selects só aceitam opções existentes"""
+        campo = self._campo(id_elemento)
+        valor = str(valor)
+        if campo['tipo'] == 'select' and valor not in self.opcoes(id_elemento):
+            raise ErroPortal(f"Opção inexistente em {id_elemento}: {valor}")
+        if campo['tipo'] in ('checkbox', 'radio'):
+            campo['marcado'] = valor not in ('', '0', 'false', 'False')
+        else:
+            campo['valor'] = valor
+
+    def alterar(self, id_elemento, valor):
+        """Altera o campo e, se ele tiver AutoPostBack, envia o postback como o onchange faria"""
+        self.definir(id_elemento, valor)
+        alvo = _alvo_postback(self._campo(id_elemento)['onchange'])
+        if alvo:
+            self.postback(alvo[0], alvo[1], origem=id_elemento)
+            return True
+        return False
+
+    def clicar(self, id_elemento, arquivos=None):
+        """Simula o clique em um botão ou LinkButton; arquivos ({id do input file: caminho}) força postback completo"""
+        campo = self._campo(id_elemento)
+        if campo['tag'] == 'input' and campo['tipo'] in ('submit', 'image', 'button') and not _alvo_postback(campo['onclick']):
+            self.postback(None, '', origem=id_elemento, botao=campo, arquivos=arquivos)
+            return
+        alvo = _alvo_postback(campo['href']) or _alvo_postback(campo['onclick'])
+        if not alvo:
+            raise ErroPortal(f"Elemento {id_elemento} não dispara postback")
+        self.postback(alvo[0], alvo[1], origem=id_elemento, arquivos=arquivos)
+
+    def postback(self, alvo, argumento='', origem=None, botao=None, arquivos=None):
+        """Envia o formulário como o __doPostBack do WebForms (assíncrono quando a página tem UpdatePanels)"""
+        dados = self._dados_formulario()
+        dados['__EVENTTARGET'] = alvo or ''
+        dados['__EVENTARGUMENT'] = argumento
+        if botao is not None:
+            dados[botao['nome']] = botao['valor']
+
+        url = urljoin(self.current_url, self.acao or '')
+        assincrono = self.script_manager is not None and not arquivos
+        headers = {'Referer': self.current_url}
+        if assincrono:
+            controle = alvo or (botao and botao['nome'])
+            painel = self._painel_de(origem)
+            dados[self.script_manager] = f"{painel}|{controle}" if painel else controle
+            dados['__ASYNCPOST'] = 'true'
+            headers.update({'X-MicrosoftAjax': 'Delta=true', 'X-Requested-With': 'XMLHttpRequest'})
+
+        inicio = time.monotonic()
+        if arquivos:
+            abertos = {self._campo(id_campo)['nome']: open(caminho, 'rb') for id_campo, caminho in arquivos.items()}
+            try:
+                envio = {nome: (os.path.basename(f.name), f) for nome, f in abertos.items()}
+                response = self.http.post(url, data=dados, files=envio, headers=headers, timeout=self.timeout)
+            finally:
+                for f in abertos.values():
+                    f.close()
+        else:
+            response = self.http.post(url, data=dados, headers=headers, timeout=self.timeout)
+        self._verificar(response)
+        logger.debug(f"Postback {alvo or origem} em {time.monotonic() - inicio:.3f}s")
+
+        if assincrono and response.headers.get('Content-Type', '').startswith('text/plain'):
+            self._aplicar_delta(response)
+        else:
+            self._carregar_pagina(response)
+
+    # --- Estado do formulário ---
+
+    def _campo(self, id_elemento):
+        campo = self.campos.get(id_elemento)
+        if campo is None:
+            raise ErroPortal(f"Elemento {id_elemento} não encontrado em {self.current_url}")
+        return campo
+
+    def _painel_de(self, id_elemento):
+        campo = self.campos.get(id_elemento) if id_elemento else None
+        if campo and campo['painel']:
+            return self.paineis.get(campo['painel'])
+        return next(iter(self.paineis.values()), None)
+
+    def _dados_formulario(self):
+        dados = {}
+        for campo in self.campos.values():
+            if not campo['nome'] or campo['desabilitado']:
+                continue
+            if campo['tag'] == 'a' or campo['tipo'] in ('submit', 'image', 'button', 'reset', 'file'):
+                continue
+            if campo['tipo'] in ('checkbox', 'radio') and not campo['marcado']:
+                continue
+            if campo['valor'] is not None:
+                dados[campo['nome']] = campo['valor']
+        return dados
+
+    def _ler(self, html):
+        leitor = _LeitorFormulario(self.paineis)
+        leitor.feed(html)
+        leitor.close()
+        return leitor
+
+    def _verificar(self, response):
+        if response.status_code in STATUS_LIMITADO:
+            self.limitada = True
+        response.raise_for_status()
+
+    def _carregar_pagina(self, response):
+        self.current_url = response.url
+        html = response.text
+        gerenciador = _RE_SCRIPT_MANAGER.search(html)
+        if gerenciador:
+            self.script_manager = gerenciador.group(1)
+            # Os ids únicos vêm prefixados com 't' (UpdatePanel com ChildrenAsTriggers) ou 'f'
+            nomes = [nome.strip().strip('\'"') for nome in gerenciador.group(2).split(',') if nome.strip()]
+            self.paineis = {}
+            for nome in nomes:
+                nome = nome[1:] if nome[:1] in ('t', 'f') and '$' in nome else nome
+                self.paineis[nome.replace('$', '_')] = nome
+        else:
+            self.script_manager = None
+            self.paineis = {}
+        leitor = self._ler(html)
+        self.acao = leitor.acao
+        self.campos = leitor.campos
+        self.alertas.extend(_alertas(html))
+
+    def _aplicar_delta(self, response):
+        for tipo, id_parte, conteudo in ler_delta(response.text):
+            if tipo == 'updatePanel':
+                leitor = self._ler(f'<div id="{id_parte}">{conteudo}</div>')
+                # Campos que sumiram do painel deixam de ser enviados
+                self.campos = {chave: campo for chave, campo in self.campos.items() if campo['painel'] != id_parte}
+                self.campos.update(leitor.campos)
+                self.alertas.extend(_alertas(conteudo))
+            elif tipo == 'hiddenField':
+                # __VIEWSTATE, __EVENTVALIDATION e afins
+                campo = next((c for c in self.campos.values() if c['nome'] == id_parte), None)
+                if campo is None:
+                    campo = {'tag': 'input', 'tipo': 'hidden', 'id': id_parte, 'nome': id_parte, 'desabilitado': False,
+                             'onchange': '', 'href': '', 'onclick': '', 'painel': None, 'marcado': False}
+                    self.campos[id_parte] = campo
+                campo['valor'] = conteudo
+            elif tipo == 'formAction':
+                self.acao = unescape(conteudo)
+            elif tipo in ('scriptBlock', 'scriptStartupBlock'):
+                self.alertas.extend(_alertas(conteudo))
+            elif tipo == 'pageRedirect':
+                self.get(urljoin(self.current_url, unquote(conteudo)))
+                return
+            elif tipo == 'error':
+                raise ErroPortal(f"Erro no postback: {conteudo}")
+
+
+def _alvo_postback(script):
+    """Extrai (alvo, argumento) de um __doPostBack ou WebForm_PostBackOptions"""
+    if not script:
+        return None
+    encontrado = _RE_POSTBACK.search(script) or _RE_POSTBACK_OPCOES.search(script)
+    return (encontrado.group(1), encontrado.group(2)) if encontrado else None
+
+
+def _alertas(html):
+    return [unescape(texto).replace("\\'", "'").replace('\\n', '\n') for _, texto in _RE_ALERTA.findall(html)]
+
+
+class SessoesHTTP:
+    """Guarda os cookies pós-login por usuário para o motor HTTP (equivalente ao GerenciadorSessoes)"""
+
+    def __init__(self, ttl=SESSAO_TTL):
+        self.ttl = ttl
+        self._cookies = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def garantir_sessao(self, sessao, url_inicial, contexto):
+        """Deixa a sessão autenticada em url_inicial, reaproveitando os cookies do usuário quando válidos"""
+        salvo = self._obter(contexto.usuario, contexto.senha)
+        if salvo and self._restaurar(sessao, url_inicial, salvo):
+            logger.info(f"Sessão HTTP reaproveitada para o usuário {contexto.usuario}")
+            return True
+
+        with self._lock_usuario(contexto.usuario):
+            # Outro job pode ter feito o login enquanto aguardávamos o lock
+            novo = self._obter(contexto.usuario, contexto.senha)
+            if novo and novo is not salvo and self._restaurar(sessao, url_inicial, novo):
+                logger.info(f"Sessão HTTP renovada por outro job reaproveitada para o usuário {contexto.usuario}")
+                return True
+
+            if not fazer_login(sessao, url_inicial, contexto):
+                return False
+            with self._lock:
+                self._cookies[contexto.usuario] = {'cookies': sessao.http.cookies.copy(), 'criada_em': time.monotonic(),
+                                                   'senha': resumo_senha(contexto.senha)}
+            return True
+
+    def _obter(self, usuario, senha):
+        with self._lock:
+            salvo = self._cookies.get(usuario)
+        if salvo and time.monotonic() - salvo['criada_em'] <= self.ttl and mesma_senha(salvo, senha):
+            return salvo
+        return None
+
+    def _restaurar(self, sessao, url_inicial, salvo):
+        sessao.http.cookies.update(salvo['cookies'])
+        sessao.get(url_inicial)
+        if "ICLogin" not in sessao.current_url:
+            return True
+        sessao.http.cookies.clear()
+        return False
+
+    def _lock_usuario(self, usuario):
+        with self._lock:
+            return self._locks.setdefault(usuario, threading.Lock())
+
+
+# --- Etapas (mesma sequência de scraper.py, sem navegador) ---
+
+@medir('login.autenticar')
+def fazer_login(sessao, url_inicial, contexto):
+    try:
+        sessao.get(url_inicial)
+        if "ICLogin" not in sessao.current_url:
+            print("Já estamos na página principal")
+            return True
+
+        sessao.definir("txtUsuario_CAMPO", contexto.usuario)
+        sessao.definir("txtSenha_CAMPO", contexto.senha)
+        sessao.clicar("bbConfirmar")
+        if "ICLogin" in sessao.current_url:
+            print("Login não aceito pelo portal")
+            return False
+
+        sessao.get(url_inicial)
+        print(f"URL após login: {sessao.current_url}")
+        return "ICLogin" not in sessao.current_url
+
+    except Exception as e:
+        print(f"Erro durante o login: {str(e)}")
+        return False
+
+
+SIMULACAO = "ctl00_Cph_ucSimulacaoCartaoConsignado_"
+
+
+def calcular_simulacao(sessao, contexto):
+    """Etapa simulacao: preenche os dados do cliente, calcula a margem e simula o saque"""
+    try:
+        # Primeiro ponto de venda (índice 0 é o "-")
+        sessao.alterar(SIMULACAO + "cbLoja_CAMPO", sessao.opcoes(SIMULACAO + "cbLoja_CAMPO")[1])
+        sessao.alterar(SIMULACAO + "cbTipoProduto_CAMPO", contexto.tipo_produto)
+        # O CPF dispara o preenchimento de nome e data de nascimento
+        sessao.alterar(SIMULACAO + "txtCPF_CAMPO", contexto.cpf)
+        sessao.definir(SIMULACAO + "txtNumeroBeneficio_CAMPO", contexto.matricula)
+        sessao.alterar(SIMULACAO + "cbEmpregador_CAMPO", contexto.empregador)
+        with medir('simulacao.calcular_margem'):
+            sessao.clicar(SIMULACAO + "bbCalcularMargem")
+
+        sessao.definir(SIMULACAO + "txtValorMargem_CAMPO", contexto.valor_margem)
+        sessao.clicar(SIMULACAO + "lnkMargemOK")
+        sessao.clicar(SIMULACAO + "bbSimularConsignado")
+        sessao.clicar(SIMULACAO + "gridTabelas_ctl02_lnkDetalhes")
+        sessao.clicar(SIMULACAO + "bbSimularSaque")
+
+        print("Simulação realizada com sucesso!")
+        return True
+
+    except Exception as e:
+        print(f"Erro ao executar ações na página de simulação: {str(e)}")
+        return False
+
+
+def solicitar_proposta(sessao, contexto):
+    """Etapa proposta: solicita a proposta e inicia a esteira, abrindo a página de cadastro"""
+    try:
+        sessao.clicar(SIMULACAO + "bbSolicitarProposta")
+        sessao.clicar(SIMULACAO + "bbContinuarSim")
+        sessao.clicar(SIMULACAO + "bbIniciarEsteira")
+        print("Proposta solicitada com sucesso!")
+        return True
+
+    except Exception as e:
+        print(f"Erro ao solicitar proposta: {str(e)}")
+        return False
+
+
+def preencher_dados_cliente(sessao, contexto):
+    """Etapa dados_cliente: preenche a aba do cliente e salva o cadastro"""
+    try:
+        print("\n--- Preenchendo dados do cliente ---")
+        valores = montar_valores_cadastro(contexto)
+        pendentes = [(campo, str(valores[campo.origem])) for campo in CAMPOS_CADASTRO
+                     if valores.get(campo.origem) is not None]
+
+        # Campos com postback primeiro (o CEP recarrega o bloco de endereço), depois os demais
+        pendentes.sort(key=lambda item: not item[0].postback)
+        with medir('dados_cliente.preencher_campos'):
+            for campo, valor in pendentes:
+                try:
+                    if campo.postback:
+                        sessao.alterar(campo.id, valor)
+                    else:
+                        sessao.definir(campo.id, valor)
+                except Exception as e:
+                    mensagem = f"Erro ao preencher {campo.descricao or campo.id}: {str(e)}"
+                    if campo.obrigatorio:
+                        raise Exception(mensagem)
+                    print(mensagem)
+
+        print("\n--- Verificando campos obrigatórios antes de salvar ---")
+        verificar_campos_obrigatorios(sessao, contexto)
+
+        print("\n--- Salvando cadastro ---")
+        with medir('dados_cliente.gravar'):
+            sessao.clicar("ctl00_Cph_Container_AbaCliente_bbGravar")
+        return True
+
+    except Exception as e:
+        print(f"\nErro ao preencher formulário: {str(e)}")
+        return False
+
+
+@medir('dados_cliente.verificar_obrigatorios')
+def verificar_campos_obrigatorios(sessao, contexto):
+    """Mesmas correções de scraper.verificar_campos_obrigatorios aplicadas ao estado do formulário"""
+    endereco = PREFIXO_CADASTRO + "ucEnderecoResidencial_"
+    vazios = [nome for nome, id_campo in (('CEP', endereco + "txtCEP_CAMPO"), ('Conta', PREFIXO_CADASTRO + "txtConta_CAMPO"),
+                                         ('DV', PREFIXO_CADASTRO + "txtContaDV_CAMPO"))
+              if not sessao.existe(id_campo) or not sessao.valor(id_campo)]
+    if vazios:
+        print(f"ERRO: Os seguintes campos obrigatórios estão vazios: {', '.join(vazios)}")
+        return False
+
+    if sessao.existe(endereco + "txtEndereco_CAMPO") and not sessao.valor(endereco + "txtEndereco_CAMPO"):
+        dados_endereco = obter_endereco_cep(contexto.cep)
+        if dados_endereco:
+            sessao.definir(endereco + "txtEndereco_CAMPO", dados_endereco['logradouro'])
+    if sessao.existe(endereco + "txtCidade_CAMPO") and not sessao.valor(endereco + "txtCidade_CAMPO"):
+        sessao.definir(endereco + "txtCidade_CAMPO", "Boa Vista")  # Cidade padrão para RR
+    if sessao.existe(PREFIXO_CADASTRO + "txtDataAdmissao_CAMPO"):
+        sessao.definir(PREFIXO_CADASTRO + "txtDataAdmissao_CAMPO", "20/03/2021")  # Valor fixo
+    if contexto.banco and sessao.existe(PREFIXO_CADASTRO + "cbBanco_CAMPO") and sessao.valor(PREFIXO_CADASTRO + "cbBanco_CAMPO") != contexto.banco:
+        sessao.alterar(PREFIXO_CADASTRO + "cbBanco_CAMPO", contexto.banco)
+    return True
+
+
+DOCUMENTO = "ctl00_Cph_ucAnexarDocumento1_"
+
+# Tipo do documento no portal para cada arquivo do contexto
+DOCUMENTOS = [
+    ("20", 'arquivo_rg_verso', "RG Verso"),
+    ("4", 'arquivo_comprovante_endereco', "Comprovante de Endereço"),
+    ("5", 'arquivo_comprovante_renda', "Comprovante de Renda"),
+]
+
+
+def anexar_documentos(sessao, contexto):
+    """Etapa documentos: anexa RG verso, comprovante de endereço e comprovante de renda.
+
+    Tenta todos os documentos e retorna False se algum não foi enviado, para a etapa não ser
+    registrada como concluída no checkpoint.
+    """
+    print("\n--- Upload de Documentos ---")
+    sucesso = True
+    for tipo, origem, descricao in DOCUMENTOS:
+        try:
+            print(f"Processando {descricao}...")
+            sessao.alterar(DOCUMENTO + "cbTipoDocumento_CAMPO", tipo)
+            with medir('documentos.enviar'):
+                sessao.clicar(DOCUMENTO + "bbEnviar",
+                              arquivos={DOCUMENTO + "fileUpload": os.path.abspath(getattr(contexto, origem))})
+            print(f"{descricao} importado com sucesso")
+        except Exception as e:
+            print(f"Erro ao importar {descricao}: {str(e)}")
+            sucesso = False
+    return sucesso
+
+
+def aprovar_proposta(sessao, contexto):
+    """Etapa aprovacao: clica em Aprovar, confere o alerta do portal e notifica o frontend"""
+    try:
+        print("\n--- Clicando no botão Aprovar ---")
+        sessao.alertas.clear()
+        with medir('aprovacao.aprovar'):
+            sessao.clicar("ctl00_Cph_ucBotoesEsteira1_bbAprovar")
+        for mensagem in sessao.alertas:
+            print(f"Mensagem do sistema: {mensagem}")
+        if not any("Proposta Aprovada com Sucesso" in mensagem for mensagem in sessao.alertas):
+            print("O portal não confirmou a aprovação da proposta")
+            return False
+        print("Proposta aprovada com sucesso!")
+        notificar_frontend(contexto)
+        return True
+
+    except Exception as e:
+        print(f"\nErro ao aprovar proposta: {str(e)}")
+        return False
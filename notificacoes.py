@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+import logging
+
+import requests
+
+from metricas import NOTIFICACOES
+from cliente_http import cliente_http
+
+logger = logging.getLogger(__name__)
+
+# Caixa de saída das notificações de status para o frontend (API_URL), entregues em segundo plano
+NOTIFICACOES_ARQUIVO = os.getenv('NOTIFICACOES_ARQUIVO', 'estado/notificacoes.sqlite3')
+# Endpoint que aceita uma lista JSON de notificações numa só requisição (vazio: uma por vez em API_URL)
+NOTIFICACOES_URL_LOTE = os.getenv('NOTIFICACOES_URL_LOTE', '')
+NOTIFICACOES_LOTE = int(os.getenv('NOTIFICACOES_LOTE', '50'))
+NOTIFICACOES_TENTATIVAS = int(os.getenv('NOTIFICACOES_TENTATIVAS', '20'))
+# Espera antes da 2ª tentativa, dobrada a cada falha até o máximo (segundos)
+NOTIFICACOES_ESPERA_INICIAL = float(os.getenv('NOTIFICACOES_ESPERA_INICIAL', '2'))
+NOTIFICACOES_ESPERA_MAXIMA = float(os.getenv('NOTIFICACOES_ESPERA_MAXIMA', '300'))
+NOTIFICACOES_TIMEOUT_CONEXAO = float(os.getenv('NOTIFICACOES_TIMEOUT_CONEXAO', '2'))
+NOTIFICACOES_TIMEOUT_LEITURA = float(os.getenv('NOTIFICACOES_TIMEOUT_LEITURA', '10'))
+
+API_URL_PADRAO = 'http://localhost:5000/api/status'
+
+PENDENTE = 'pendente'
+FALHOU = 'falhou'
+
+
+class CaixaSaida:
+    """Notificações gravadas em SQLite e entregues por uma thread, sem segurar quem as enfileirou.
+
+    Cada notificação é tentada até ser aceita (2xx) ou esgotar as tentativas, com espera
+    exponencial entre elas; as pendentes continuam na caixa após um reinício. Várias
+    instâncias podem dividir o mesmo arquivo: cada uma reserva as notificações que vai enviar.
+    """
+
+    def __init__(self, arquivo=NOTIFICACOES_ARQUIVO, url_lote=NOTIFICACOES_URL_LOTE, lote=NOTIFICACOES_LOTE,
+                 tentativas=NOTIFICACOES_TENTATIVAS, espera_inicial=NOTIFICACOES_ESPERA_INICIAL,
+                 espera_maxima=NOTIFICACOES_ESPERA_MAXIMA,
+                 timeout=(NOTIFICACOES_TIMEOUT_CONEXAO, NOTIFICACOES_TIMEOUT_LEITURA)):
+        self.url_lote = url_lote
+        self.lote = lote
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+        self._session = cliente_http
+
+        diretorio = os.path.dirname(arquivo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._db = sqlite3.connect(arquivo, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS notificacao (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT, "
+                         "dados TEXT, estado TEXT, tentativas INTEGER, proxima_em REAL, criada_em REAL, erro TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS notificacao_proxima ON notificacao (estado, proxima_em)")
+
+    def enfileirar(self, dados, url=None):
+        """Grava a notificação e retorna imediatamente; a entrega fica com a thread da caixa"""
+        url = url or os.getenv('API_URL', API_URL_PADRAO)
+        agora = time.time()
+        with self._lock:
+            self._db.execute("INSERT INTO notificacao (url, dados, estado, tentativas, proxima_em, criada_em) "
+                             "VALUES (?, ?, ?, 0, ?, ?)", (url, json.dumps(dados, ensure_ascii=False), PENDENTE, agora, agora))
+        self.iniciar()
+        self._acordar.set()
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._despachar, name="notificacoes", daemon=True)
+            self._thread.start()
+
+    def encerrar(self, timeout=5):
+        """Para a thread; o que não foi entregue continua gravado para o próximo início"""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def estatisticas(self):
+        with self._lock:
+            linhas = self._db.execute("SELECT estado, COUNT(*) FROM notificacao GROUP BY estado").fetchall()
+        return {PENDENTE: 0, FALHOU: 0, **dict(linhas)}
+
+    def entregar_pendentes(self):
+        """Envia uma rodada de notificações vencidas; retorna quantas foram tentadas"""
+        reservadas = self._reservar()
+        if not reservadas:
+            return 0
+        por_url = {}
+        for notificacao in reservadas:
+            por_url.setdefault(notificacao[1], []).append(notificacao)
+        for url, notificacoes in por_url.items():
+            if self.url_lote and len(notificacoes) > 1:
+                self._enviar_lote(notificacoes)
+            else:
+                for notificacao in notificacoes:
+                    self._enviar(url, [notificacao], json.loads(notificacao[2]))
+        return len(reservadas)
+
+    def _despachar(self):
+        while not self._parar.is_set():
+            try:
+                if self.entregar_pendentes():
+                    continue
+            except Exception as e:
+                logger.error(f"Erro na entrega de notificações: {str(e)}")
+            self._acordar.wait(timeout=self._proxima_espera())
+            self._acordar.clear()
+
+    def _reservar(self):
+        """Pega as notificações vencidas e adia a próxima_em delas, para outra instância não enviá-las junto"""
+        agora = time.time()
+        reserva = agora + sum(self.timeout) * (self.lote + 1)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                linhas = self._db.execute("SELECT id, url, dados, tentativas FROM notificacao WHERE estado = ? AND proxima_em <= ? "
+                                          "ORDER BY proxima_em LIMIT ?", (PENDENTE, agora, self.lote)).fetchall()
+                self._db.executemany("UPDATE notificacao SET proxima_em = ? WHERE id = ?",
+                                     [(reserva, linha[0]) for linha in linhas])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return linhas
+
+    def _enviar_lote(self, notificacoes):
+        self._enviar(self.url_lote, notificacoes, [json.loads(notificacao[2]) for notificacao in notificacoes])
+
+    def _enviar(self, url, notificacoes, corpo):
+        try:
+            response = self._session.post(url, json=corpo, timeout=self.timeout)
+            if 200 <= response.status_code < 300:
+                self._concluir(notificacoes)
+                return
+            # Erros do cliente (exceto 408/429) não melhoram com novas tentativas
+            definitivo = 400 <= response.status_code < 500 and response.status_code not in (408, 429)
+            self._falhar(notificacoes, f"HTTP {response.status_code}: {response.text[:200]}", definitivo)
+        except requests.exceptions.RequestException as e:
+            self._falhar(notificacoes, str(e), False)
+
+    def _concluir(self, notificacoes):
+        with self._lock:
+            self._db.executemany("DELETE FROM notificacao WHERE id = ?", [(notificacao[0],) for notificacao in notificacoes])
+        NOTIFICACOES.inc(len(notificacoes), resultado='entregue')
+
+    def _falhar(self, notificacoes, erro, definitivo):
+        agora = time.time()
+        atualizacoes = []
+        for id_notificacao, url, _, tentativas in notificacoes:
+            tentativas += 1
+            if definitivo or tentativas >= self.tentativas:
+                logger.error(f"Notificação {id_notificacao} para {url} desistida após {tentativas} tentativas: {erro}")
+                NOTIFICACOES.inc(resultado='falhou')
+                atualizacoes.append((FALHOU, tentativas, agora, erro, id_notificacao))
+            else:
+                espera = min(self.espera_maxima, self.espera_inicial * 2 ** (tentativas - 1))
+                logger.warning(f"Notificação {id_notificacao} para {url} falhou ({erro}), nova tentativa em {espera:.0f}s")
+                NOTIFICACOES.inc(resultado='nova_tentativa')
+                # Variação aleatória para as notificações acumuladas não voltarem todas juntas
+                atualizacoes.append((PENDENTE, tentativas, agora + espera * random.uniform(0.8, 1.2), erro, id_notificacao))
+        with self._lock:
+            self._db.executemany("UPDATE notificacao SET estado = ?, tentativas = ?, proxima_em = ?, erro = ? WHERE id = ?",
+                                 atualizacoes)
+
+    def _proxima_espera(self):
+        with self._lock:
+            linha = self._db.execute("SELECT MIN(proxima_em) FROM notificacao WHERE estado = ?", (PENDENTE,)).fetchone()
+        if not linha or linha[0] is None:
+            return self.espera_maxima
+        return min(self.espera_maxima, max(0.05, linha[0] - time.time()))
+
+
+caixa_saida = CaixaSaida()
@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+from dataclasses import dataclass
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# Perfil usado pelo pool quando nenhum é informado (ver PERFIS)
+NAVEGADOR_PERFIL = os.getenv('NAVEGADOR_PERFIL', 'leve')
+# Padrões extras bloqueados e trechos de URL que nunca devem ser bloqueados, separados por vírgula
+NAVEGADOR_BLOQUEAR = [p.strip() for p in os.getenv('NAVEGADOR_BLOQUEAR', '').split(',') if p.strip()]
+NAVEGADOR_PERMITIR = [p.strip() for p in os.getenv('NAVEGADOR_PERMITIR', '').split(',') if p.strip()]
+NAVEGADOR_TIMEOUT_CARREGAMENTO = float(os.getenv('NAVEGADOR_TIMEOUT_CARREGAMENTO', '30'))
+
+# Recursos que a automação nunca usa (padrões com curinga do Network.setBlockedURLs)
+IMAGENS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp']
+FONTES = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+MIDIA = ['*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav']
+ANALYTICS = ['*google-analytics.com/*', '*googletagmanager.com/*', '*/gtag/js*', '*/analytics/*',
+             '*doubleclick.net/*', '*facebook.net/*', '*hotjar.com/*', '*clarity.ms/*']
+
+# O que os scripts do WebForms precisam (handlers do ASP.NET, scripts, CSS e as próprias páginas);
+# padrões de bloqueio que mencionem algum desses trechos são descartados
+PERMITIDOS = ['.axd', '.js', '.css', '.aspx', '/Pages/']
+
+
+@dataclass(frozen=True)
+class PerfilNavegador:
+    nome: str
+    carregamento: str  # pageLoadStrategy: normal, eager ou none
+    bloquear: tuple = ()
+
+
+PERFIS = {
+    # Comportamento original: espera imagens, fontes e scripts de terceiros
+    'completo': PerfilNavegador('completo', 'normal'),
+    # driver.get retorna no DOMContentLoaded e os recursos inúteis nem são baixados
+    'leve': PerfilNavegador('leve', 'eager', tuple(IMAGENS + FONTES + MIDIA + ANALYTICS)),
+    # driver.get retorna assim que o novo documento existe; as esperas por elemento fazem o resto
+    'minimo': PerfilNavegador('minimo', 'none', tuple(IMAGENS + FONTES + MIDIA + ANALYTICS)),
+}
+
+
+def obter_perfil(nome=None):
+    nome = nome or NAVEGADOR_PERFIL
+    if nome not in PERFIS:
+        raise ValueError(f"Perfil de navegador desconhecido: {nome} (use {', '.join(PERFIS)})")
+    return PERFIS[nome]
+
+
+def padroes_bloqueados(perfil, extras=NAVEGADOR_BLOQUEAR, permitidos=NAVEGADOR_PERMITIR):
+    """Padrões enviados ao Chrome, sem os que poderiam atingir algo permitido"""
+    padroes = []
+    for padrao in list(perfil.bloquear) + ([] if not perfil.bloquear else list(extras)):
+        if any(trecho in padrao for trecho in PERMITIDOS + list(permitidos)):
+            logger.warning(f"Padrão de bloqueio {padrao} ignorado: atinge um recurso permitido")
+            continue
+        if padrao not in padroes:
+            padroes.append(padrao)
+    return padroes
+
+
+def configurar_opcoes(chrome_options, perfil):
+    """Aplica a estratégia de carregamento do perfil às opções do Chrome"""
+    chrome_options.page_load_strategy = perfil.carregamento
+    return chrome_options
+
+
+def aplicar_perfil(driver, perfil):
+    """Ativa o bloqueio de URLs via CDP e, no carregamento 'none', a espera mínima do driver.get"""
+    padroes = padroes_bloqueados(perfil)
+    if padroes:
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': padroes})
+        except WebDriverException as e:
+            logger.warning(f"Bloqueio de recursos indisponível no perfil {perfil.nome}: {str(e)}")
+    if perfil.carregamento == 'none':
+        _aguardar_documento_no_get(driver)
+    driver.perfil = perfil.nome
+    return driver
+
+
+def _aguardar_documento_no_get(driver):
+    # Sem espera nenhuma, current_url ainda seria a página anterior logo após o get;
+    # aguarda só o novo documento começar a ser montado
+    carregar = driver.get
+
+    def get(url):
+        anterior = _documento(driver)
+        carregar(url)
+        limite = time.monotonic() + NAVEGADOR_TIMEOUT_CARREGAMENTO
+        while time.monotonic() < limite:
+            atual = _documento(driver)
+            if atual and atual != anterior and atual[1] != 'loading':
+                return
+            time.sleep(0.05)
+        logger.warning(f"Documento de {url} não carregou em {NAVEGADOR_TIMEOUT_CARREGAMENTO}s")
+
+    driver.get = get
+
+
+def _documento(driver):
+    # Identifica o documento atual pelo marcador gravado nele (some quando o documento é trocado)
+    try:
+        return tuple(driver.execute_script(
+            "if (!window.__documento) { window.__documento = Math.random().toString(36).slice(2); }"
+            "return [window.__documento, document.readyState];"))
+    except WebDriverException:
+        return None
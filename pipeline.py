@@ -0,0 +1,160 @@
+import time
+import logging
+from urllib.parse import urlparse, parse_qs
+
+from scraper import (calcular_simulacao, solicitar_proposta, preencher_dados_cliente, anexar_documentos,
+                     aprovar_proposta, montar_valores_cadastro)
+import motor_http
+import esperas
+from metricas import ETAPA_DURACAO, ETAPA_FALHAS
+
+logger = logging.getLogger(__name__)
+
+URL_INICIAL = "https://pixcard.banksofttecnologia.com.br/AppCartao/Pages/Simulacao/ICSimulacao"
+
+# Ordem em que as etapas acontecem no portal
+LOGIN = 'login'
+SIMULACAO = 'simulacao'
+PROPOSTA = 'proposta'
+DADOS_CLIENTE = 'dados_cliente'
+DOCUMENTOS = 'documentos'
+APROVACAO = 'aprovacao'
+ORDEM_ETAPAS = [LOGIN, SIMULACAO, PROPOSTA, DADOS_CLIENTE, DOCUMENTOS, APROVACAO]
+# Etapas que não alteram nada no portal: podem ser repetidas por outro motor depois de falharem no meio
+ETAPAS_REPETIVEIS = {LOGIN, SIMULACAO}
+
+# Motores capazes de executar as etapas
+SELENIUM = 'selenium'
+HTTP = 'http'
+MOTORES = [SELENIUM, HTTP]
+
+
+class ErroEtapa(Exception):
+    """Uma etapa do pipeline falhou; resultados traz o que foi executado até ela.
+
+    limitada: o portal recusou as requisições por limite da conta (só detectado no motor HTTP).
+    """
+
+    def __init__(self, etapa, resultados, limitada=False):
+        super().__init__(f"Erro na etapa {etapa}")
+        self.etapa = etapa
+        self.resultados = resultados
+        self.limitada = limitada
+
+
+class Pipeline:
+    """Executa as etapas escolhidas do fluxo do portal, cada uma no máximo uma vez por job"""
+
+    motor = SELENIUM
+
+    def __init__(self, gerenciador_sessoes, url_inicial=URL_INICIAL, observar=None):
+        # observar: função(etapa, duração, sucesso) chamada ao fim de cada etapa (ex.: controle de concorrência)
+        self.observar = observar
+        self.etapas = {
+            LOGIN: lambda driver, contexto: gerenciador_sessoes.garantir_sessao(driver, url_inicial, contexto),
+            SIMULACAO: calcular_simulacao,
+            PROPOSTA: solicitar_proposta,
+            DADOS_CLIENTE: preencher_dados_cliente,
+            DOCUMENTOS: anexar_documentos,
+            APROVACAO: aprovar_proposta,
+        }
+
+    def executar(self, driver, contexto, etapas, ao_mudar_etapa=lambda etapa: None, checkpoint=None, preparar=None):
+        """Executa as etapas na ordem do portal e retorna o resultado de cada uma.
+
+        Com um checkpoint, etapas já concluídas numa execução anterior do mesmo job são
+        puladas e a proposta existente é reaberta antes da primeira etapa pendente.
+        preparar: {etapa: função(contexto) -> contexto} chamada antes da etapa, para completar
+        o contexto com dados obtidos em paralelo (ex.: documentos sendo baixados).
+        Levanta ErroEtapa na primeira etapa que falhar.
+        """
+        desconhecidas = set(etapas) - set(ORDEM_ETAPAS)
+        if desconhecidas:
+            raise ValueError(f"Etapas desconhecidas: {', '.join(sorted(desconhecidas))}")
+
+        resultados = []
+        proposta_aberta = False
+        for etapa in [e for e in ORDEM_ETAPAS if e in etapas]:
+            # O login é sempre refeito; as demais etapas concluídas não se repetem
+            if checkpoint and etapa != LOGIN and checkpoint.concluiu(etapa):
+                logger.info(f"Etapa {etapa} já concluída no job {checkpoint.job_id}, pulando")
+                resultados.append({'etapa': etapa, 'sucesso': True, 'duracao': 0, 'retomada': True})
+                continue
+
+            if (checkpoint and checkpoint.proposta and not proposta_aberta
+                    and ORDEM_ETAPAS.index(etapa) > ORDEM_ETAPAS.index(PROPOSTA)):
+                logger.info(f"Reabrindo proposta do job {checkpoint.job_id}: {checkpoint.proposta['url']}")
+                driver.get(checkpoint.proposta['url'])
+                proposta_aberta = True
+
+            if preparar and etapa in preparar:
+                contexto = preparar[etapa](contexto)
+
+            ao_mudar_etapa(etapa)
+            logger.info(f"Iniciando etapa {etapa}")
+            timeouts = esperas.timeouts()
+            inicio = time.monotonic()
+            try:
+                sucesso = self.etapas[etapa](driver, contexto)
+            except Exception:
+                ETAPA_FALHAS.inc(etapa=etapa, motor=self.motor)
+                if self.observar:
+                    self.observar(etapa, time.monotonic() - inicio, False)
+                raise
+            duracao = time.monotonic() - inicio
+            ETAPA_DURACAO.observar(duracao, etapa=etapa, motor=self.motor)
+            if self.observar:
+                # Timeouts que a etapa tratou e ignorou também são sinal de portal sobrecarregado
+                self.observar(etapa, duracao, bool(sucesso) and esperas.timeouts() == timeouts)
+            resultados.append({
+                'etapa': etapa,
+                'sucesso': bool(sucesso),
+                'duracao': round(duracao, 3),
+                'motor': self.motor,
+            })
+            if not sucesso:
+                ETAPA_FALHAS.inc(etapa=etapa, motor=self.motor)
+                logger.error(f"Erro na etapa {etapa}")
+                raise ErroEtapa(etapa, resultados, limitada=getattr(driver, 'limitada', False))
+            logger.info(f"Etapa {etapa} concluída")
+
+            if etapa == PROPOSTA:
+                proposta_aberta = True
+            if checkpoint and etapa != LOGIN:
+                checkpoint.registrar(etapa, **self._capturar(etapa, driver, contexto))
+        return resultados
+
+    def _capturar(self, etapa, driver, contexto):
+        """Dados guardados no checkpoint para permitir retomar o job a partir desta etapa"""
+        if etapa == PROPOSTA:
+            # A conta que criou a proposta é a usada para retomar o job
+            return {'proposta': dict(identificar_proposta(driver.current_url), usuario=contexto.usuario)}
+        if etapa == DADOS_CLIENTE:
+            return {'campos': [chave for chave, valor in montar_valores_cadastro(contexto).items() if valor is not None]}
+        return {}
+
+
+def identificar_proposta(url):
+    """Extrai os identificadores da proposta da URL da página de cadastro aberta pela esteira"""
+    parametros = parse_qs(urlparse(url).query)
+    return {'url': url, 'identificadores': {chave: valores[0] for chave, valores in parametros.items()}}
+
+
+class PipelineHTTP(Pipeline):
+    """Mesmo fluxo executado pelo motor HTTP, que reproduz os postbacks do portal sem navegador.
+
+    Recebe uma motor_http.SessaoPortal no lugar do driver.
+    """
+
+    motor = HTTP
+
+    def __init__(self, sessoes_http, url_inicial=URL_INICIAL, observar=None):
+        self.observar = observar
+        self.etapas = {
+            LOGIN: lambda sessao, contexto: sessoes_http.garantir_sessao(sessao, url_inicial, contexto),
+            SIMULACAO: motor_http.calcular_simulacao,
+            PROPOSTA: motor_http.solicitar_proposta,
+            DADOS_CLIENTE: motor_http.preencher_dados_cliente,
+            DOCUMENTOS: motor_http.anexar_documentos,
+            APROVACAO: motor_http.aprovar_proposta,
+        }
@@ -0,0 +1,209 @@
+import os
+import queue
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from scraper import iniciar_navegador
+from abas_navegador import FabricaAbas, POOL_ABAS_POR_NAVEGADOR
+
+logger = logging.getLogger(__name__)
+
+# Configuração do pool
+POOL_TAMANHO = int(os.getenv('POOL_NAVEGADORES_TAMANHO', '2'))
+POOL_MAX_JOBS_POR_NAVEGADOR = int(os.getenv('POOL_MAX_JOBS_POR_NAVEGADOR', '20'))
+POOL_TIMEOUT_EMPRESTIMO = float(os.getenv('POOL_TIMEOUT_EMPRESTIMO', '120'))
+POOL_INTERVALO_VERIFICACAO = float(os.getenv('POOL_INTERVALO_VERIFICACAO', '30'))
+
+
+def fabrica_padrao():
+    """Um Chrome por job ou, com POOL_ABAS_POR_NAVEGADOR > 1, abas isoladas de Chromes compartilhados"""
+    return FabricaAbas() if POOL_ABAS_POR_NAVEGADOR > 1 else iniciar_navegador
+
+
+class NavegadorPool:
+    """Mantém N navegadores Chrome (ou abas de um Chrome compartilhado) pré-iniciados para serem emprestados por job"""
+
+    def __init__(self, tamanho=POOL_TAMANHO, max_jobs=POOL_MAX_JOBS_POR_NAVEGADOR,
+                 fabrica=None, intervalo_verificacao=POOL_INTERVALO_VERIFICACAO):
+        self.tamanho = tamanho
+        self.max_jobs = max_jobs
+        self.fabrica = fabrica or fabrica_padrao()
+        self.intervalo_verificacao = intervalo_verificacao
+        self._livres = queue.Queue()
+        self._jobs_por_driver = {}
+        self._emprestados = set()
+        self._encerrado = False
+        self._lock = threading.Lock()
+        self._total = 0
+        self._parar = threading.Event()
+        self._repor = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        """Lança os navegadores iniciais e a thread de manutenção"""
+        for _ in range(self.tamanho):
+            self._criar_navegador()
+        self._thread = threading.Thread(target=self._manutencao, name="pool-navegadores", daemon=True)
+        self._thread.start()
+        logger.info(f"Pool de navegadores iniciado com {self._total} navegadores")
+
+    def encerrar(self):
+        """Para a thread de manutenção e fecha todos os navegadores, livres e emprestados.
+
+        Um navegador emprestado que ainda voltar depois disso é só descartado.
+        """
+        self._parar.set()
+        self._repor.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self._lock:
+            self._encerrado = True
+            emprestados = list(self._emprestados)
+            self._emprestados.clear()
+        while True:
+            try:
+                driver = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(driver)
+        for driver in emprestados:
+            logger.warning("Encerrando navegador ainda emprestado a um job")
+            self._descartar(driver)
+
+    @contextmanager
+    def emprestar(self, timeout=POOL_TIMEOUT_EMPRESTIMO):
+        """Empresta um navegador do pool e o devolve (ou recicla) ao final do job"""
+        driver = self._obter(timeout)
+        saudavel = True
+        try:
+            yield driver
+        except Exception:
+            saudavel = self._esta_saudavel(driver)
+            raise
+        finally:
+            self._devolver(driver, saudavel)
+
+    def estatisticas(self):
+        with self._lock:
+            total = self._total
+        livres = self._livres.qsize()
+        # Com abas, vários navegadores do pool dividem o mesmo processo Chrome
+        processos = self.fabrica.estatisticas()['processos'] if isinstance(self.fabrica, FabricaAbas) else total
+        return {"tamanho": self.tamanho, "total": total, "livres": livres, "em_uso": total - livres,
+                "processos": processos}
+
+    def _obter(self, timeout):
+        # Se ainda não há navegador livre e o pool está abaixo do tamanho, cria sob demanda
+        try:
+            driver = self._livres.get_nowait()
+        except queue.Empty:
+            self._repor.set()
+            try:
+                driver = self._livres.get(timeout=timeout)
+            except queue.Empty:
+                raise RuntimeError("Nenhum navegador disponível no pool dentro do tempo limite")
+        with self._lock:
+            if not self._encerrado:
+                self._emprestados.add(driver)
+                return driver
+        self._descartar(driver)
+        raise RuntimeError("Pool de navegadores encerrado")
+
+    def _devolver(self, driver, saudavel):
+        with self._lock:
+            if driver not in self._emprestados:
+                # Já fechado por encerrar()
+                return
+            self._emprestados.discard(driver)
+            self._jobs_por_driver[id(driver)] = self._jobs_por_driver.get(id(driver), 0) + 1
+            jobs = self._jobs_por_driver[id(driver)]
+
+        if not saudavel or jobs >= self.max_jobs:
+            logger.info(f"Reciclando navegador após {jobs} jobs (saudável={saudavel})")
+            self._descartar(driver)
+            self._repor.set()
+            return
+
+        if self._limpar(driver):
+            with self._lock:
+                if not self._encerrado:
+                    self._livres.put(driver)
+                    return
+            self._descartar(driver)
+        else:
+            self._descartar(driver)
+            self._repor.set()
+
+    def _limpar(self, driver):
+        """Remove cookies e storage deixados pelo job anterior"""
+        try:
+            driver.delete_all_cookies()
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"Erro ao limpar navegador, será descartado: {str(e)}")
+            return False
+
+    def _esta_saudavel(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _criar_navegador(self):
+        try:
+            driver = self.fabrica()
+        except Exception as e:
+            logger.error(f"Erro ao iniciar navegador para o pool: {str(e)}")
+            return False
+        with self._lock:
+            self._total += 1
+            self._jobs_por_driver[id(driver)] = 0
+            # Sob o lock: encerrar() esvazia a fila depois de marcar o pool como encerrado
+            if not self._encerrado:
+                self._livres.put(driver)
+                return True
+        self._descartar(driver)
+        return False
+
+    def _descartar(self, driver):
+        with self._lock:
+            self._total -= 1
+            self._jobs_por_driver.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar navegador: {str(e)}")
+
+    def _verificar_livres(self):
+        """Verifica a saúde dos navegadores ociosos e descarta os que não respondem"""
+        for _ in range(self._livres.qsize()):
+            try:
+                driver = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            if self._esta_saudavel(driver):
+                self._livres.put(driver)
+            else:
+                logger.warning("Navegador ocioso não respondeu à verificação, substituindo")
+                self._descartar(driver)
+
+    def _manutencao(self):
+        while not self._parar.is_set():
+            self._repor.wait(timeout=self.intervalo_verificacao)
+            self._repor.clear()
+            if self._parar.is_set():
+                break
+            self._verificar_livres()
+            while not self._parar.is_set():
+                with self._lock:
+                    faltando = self.tamanho - self._total
+                if faltando <= 0:
+                    break
+                if not self._criar_navegador():
+                    time.sleep(1)
+                    break
@@ -0,0 +1,194 @@
+import io
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # Sem Pillow os documentos são enviados como estão
+    Image = None
+
+from metricas import medir, DOCUMENTOS_PREPROCESSADOS, DOCUMENTOS_BYTES_ECONOMIZADOS
+
+logger = logging.getLogger(__name__)
+
+# Processos que recomprimem as imagens (0 desativa o pré-processamento)
+PREPROCESSAMENTO_PROCESSOS = int(os.getenv('PREPROCESSAMENTO_PROCESSOS', '2'))
+# Maior lado da imagem em pixels e tamanho buscado para cada documento
+PREPROCESSAMENTO_RESOLUCAO = int(os.getenv('PREPROCESSAMENTO_RESOLUCAO', '2000'))
+PREPROCESSAMENTO_TAMANHO_ALVO = int(os.getenv('PREPROCESSAMENTO_TAMANHO_ALVO', str(300 * 1024)))
+# Faixa de qualidade JPEG usada na busca pelo tamanho alvo
+PREPROCESSAMENTO_QUALIDADE = int(os.getenv('PREPROCESSAMENTO_QUALIDADE', '85'))
+PREPROCESSAMENTO_QUALIDADE_MINIMA = int(os.getenv('PREPROCESSAMENTO_QUALIDADE_MINIMA', '50'))
+# PNG vira JPEG (transparência sobre fundo branco); com 0 continua PNG, só reduzido
+PREPROCESSAMENTO_PNG_PARA_JPEG = os.getenv('PREPROCESSAMENTO_PNG_PARA_JPEG', '1') == '1'
+
+# Formatos lidos; PDFs e o resto seguem sem alteração
+FORMATOS = {'JPEG', 'MPO', 'PNG', 'WEBP', 'BMP', 'TIFF'}
+# Reduções extras da resolução quando nem a qualidade mínima atinge o tamanho alvo
+REDUCOES = 3
+
+# Os processos são iniciados do zero (spawn): um fork da API copiaria as threads do pool de
+# navegadores e do servidor com os locks que elas estivessem segurando naquele momento
+CONTEXTO_PROCESSOS = multiprocessing.get_context('spawn')
+
+
+def otimizar_imagem(caminho, resolucao=PREPROCESSAMENTO_RESOLUCAO, tamanho_alvo=PREPROCESSAMENTO_TAMANHO_ALVO,
+                    qualidade=PREPROCESSAMENTO_QUALIDADE, qualidade_minima=PREPROCESSAMENTO_QUALIDADE_MINIMA,
+                    png_para_jpeg=PREPROCESSAMENTO_PNG_PARA_JPEG):
+    """Corrige a orientação, reduz e recomprime uma imagem (executada nos processos do pool).
+
+    Retorna (conteúdo, extensão) ou None se o arquivo deve ser enviado como está:
+    não é imagem, ou o resultado não ficaria menor e a orientação já estava certa.
+    """
+    original = os.path.getsize(caminho)
+    try:
+        imagem = Image.open(caminho)
+    except UnidentifiedImageError:
+        return None
+    with imagem:
+        if imagem.format not in FORMATOS:
+            return None
+        girada = imagem.getexif().get(0x0112, 1) not in (1, None)  # tag Orientation
+        png = imagem.format == 'PNG' and not png_para_jpeg
+        if (imagem.format == 'JPEG' and not girada and original <= tamanho_alvo
+                and max(imagem.size) <= resolucao):
+            return None  # já está pronta para o envio
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((resolucao, resolucao), Image.LANCZOS)
+
+        if png:
+            conteudo = _salvar(imagem, 'PNG', optimize=True)
+            extensao = '.png'
+        else:
+            imagem = _para_rgb(imagem)
+            conteudo = _comprimir(imagem, tamanho_alvo, qualidade, qualidade_minima)
+            for _ in range(REDUCOES):
+                if len(conteudo) <= tamanho_alvo:
+                    break
+                imagem = imagem.resize((max(1, imagem.width * 3 // 4), max(1, imagem.height * 3 // 4)), Image.LANCZOS)
+                conteudo = _comprimir(imagem, tamanho_alvo, qualidade, qualidade_minima)
+            extensao = '.jpg'
+
+    if len(conteudo) >= original and not girada:
+        return None
+    return conteudo, extensao
+
+
+def _para_rgb(imagem):
+    if imagem.mode in ('RGB', 'L'):
+        return imagem
+    if imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info):
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+
+def _comprimir(imagem, tamanho_alvo, qualidade, qualidade_minima):
+    """Maior qualidade JPEG que cabe no tamanho alvo (busca binária); a mínima se nenhuma couber"""
+    melhor = None
+    menor, maior = qualidade_minima, qualidade
+    while menor <= maior:
+        meio = (menor + maior) // 2
+        conteudo = _salvar(imagem, 'JPEG', quality=meio, optimize=True, progressive=True)
+        if len(conteudo) <= tamanho_alvo:
+            melhor = conteudo
+            menor = meio + 1
+        else:
+            maior = meio - 1
+    return melhor or _salvar(imagem, 'JPEG', quality=qualidade_minima, optimize=True, progressive=True)
+
+
+def _salvar(imagem, formato, **opcoes):
+    saida = io.BytesIO()
+    imagem.save(saida, formato, **opcoes)
+    return saida.getvalue()
+
+
+class PreprocessadorDocumentos:
+    """Prepara os documentos de um job para o upload no portal num pool de processos.
+
+    Cada documento é processado assim que está disponível (caminho local ou Future de um
+    download), enquanto o login e a simulação acontecem; o resultado é gravado na área do
+    job. Qualquer falha no processamento mantém o documento original.
+    """
+
+    def __init__(self, processos=PREPROCESSAMENTO_PROCESSOS):
+        self.processos = processos if Image else 0
+        self._processos = None
+        self._threads = None
+        self._lock = threading.Lock()
+        if processos and not Image:
+            logger.warning("Pillow não instalado: documentos serão enviados sem pré-processamento")
+
+    def iniciar(self, documentos, area):
+        """{campo: caminho ou Future com o caminho} -> {campo: Future com o caminho do documento preparado}"""
+        futuros = {}
+        for campo, origem in documentos.items():
+            if not self.processos:
+                futuros[campo] = origem if isinstance(origem, Future) else self._pronto(origem)
+            else:
+                futuros[campo] = self._executores()[1].submit(self.preparar, origem, area)
+        return futuros
+
+    def preparar(self, origem, area):
+        """Aguarda o documento de origem e retorna o caminho da versão otimizada (ou o original)"""
+        caminho = origem.result() if isinstance(origem, Future) else origem
+        processos = self._executores()[0]
+        try:
+            with medir('documentos.preprocessar'):
+                resultado = processos.submit(otimizar_imagem, caminho).result()
+        except BrokenProcessPool as e:
+            # Um processo morreu (ex.: imagem que estourou a memória); o pool é recriado para os próximos
+            self._recriar_processos(processos, e)
+            DOCUMENTOS_PREPROCESSADOS.inc(resultado='erro')
+            return caminho
+        except Exception as e:
+            logger.warning(f"Erro ao pré-processar {caminho}, enviando o original: {str(e)}")
+            DOCUMENTOS_PREPROCESSADOS.inc(resultado='erro')
+            return caminho
+        if resultado is None:
+            DOCUMENTOS_PREPROCESSADOS.inc(resultado='original')
+            return caminho
+
+        conteudo, extensao = resultado
+        original = os.path.getsize(caminho)
+        nome = os.path.splitext(os.path.basename(caminho))[0] + extensao
+        novo = area.gravar(nome, [conteudo])
+        DOCUMENTOS_PREPROCESSADOS.inc(resultado='otimizado')
+        DOCUMENTOS_BYTES_ECONOMIZADOS.inc(max(0, original - len(conteudo)))
+        logger.info(f"Documento {os.path.basename(caminho)} otimizado: {original // 1024}KB -> {len(conteudo) // 1024}KB")
+        return novo
+
+    def encerrar(self):
+        with self._lock:
+            if self._threads:
+                self._threads.shutdown(wait=False, cancel_futures=True)
+            if self._processos:
+                self._processos.shutdown(wait=False, cancel_futures=True)
+            self._processos = self._threads = None
+
+    def _executores(self):
+        # Criados no primeiro uso; as threads só aguardam os downloads e os processos
+        with self._lock:
+            if not self._processos:
+                self._processos = ProcessPoolExecutor(max_workers=self.processos, mp_context=CONTEXTO_PROCESSOS)
+                self._threads = ThreadPoolExecutor(max_workers=self.processos * 3, thread_name_prefix="preprocessamento")
+            return self._processos, self._threads
+
+    def _recriar_processos(self, quebrado, erro):
+        with self._lock:
+            if self._processos is quebrado:
+                logger.warning(f"Pool de pré-processamento quebrado ({str(erro)}), recriando")
+                self._processos.shutdown(wait=False)
+                self._processos = ProcessPoolExecutor(max_workers=self.processos, mp_context=CONTEXTO_PROCESSOS)
+
+    def _pronto(self, caminho):
+        futuro = Future()
+        futuro.set_result(caminho)
+        return futuro
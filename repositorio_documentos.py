@@ -0,0 +1,203 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from area_trabalho import ArquivoMuitoGrande, CotaExcedida, ARQUIVO_TAMANHO_MAXIMO, BLOCO, nome_seguro
+from metricas import DOCUMENTOS_RECEBIDOS
+
+logger = logging.getLogger(__name__)
+
+# Documentos guardados uma única vez por conteúdo (SHA-256), compartilhados entre jobs.
+# Fica fora da cota e do diretório (tmpfs) das áreas de trabalho; vazio desativa
+DOCUMENTOS_DIR = os.getenv('DOCUMENTOS_DIR', 'cache/documentos')
+DOCUMENTOS_LIMITE = int(os.getenv('DOCUMENTOS_LIMITE', str(1024 * 1024 * 1024)))
+DOCUMENTOS_TTL = float(os.getenv('DOCUMENTOS_TTL', str(24 * 3600)))
+
+_TEMPORARIOS = 'tmp'
+
+
+class RepositorioDocumentos:
+    """Guarda cada documento distinto uma vez, endereçado pelo SHA-256 do conteúdo.
+
+    Cada job pega uma referência ao documento e a devolve ao terminar; documentos sem
+    referências são removidos por LRU quando o limite de bytes é atingido ou após o TTL.
+    O limite vale também para as gravações em andamento: cada bloco é reservado antes de ser escrito.
+    O caminho de um documento não muda enquanto ele existir.
+    """
+
+    def __init__(self, diretorio=DOCUMENTOS_DIR, limite=DOCUMENTOS_LIMITE, ttl=DOCUMENTOS_TTL):
+        self.diretorio = diretorio
+        self.limite = limite
+        self.ttl = ttl
+        self._documentos = OrderedDict()  # hash -> {'caminho', 'tamanho', 'referencias', 'acesso'}, do menos recente ao mais
+        self._bytes = 0
+        self._pendentes = 0  # bytes reservados por gravações em andamento
+        self._lock = threading.Lock()
+        self._carregar()
+
+    def guardar(self, nome, blocos, tamanho_maximo=ARQUIVO_TAMANHO_MAXIMO):
+        """Grava os blocos calculando o hash durante a escrita; se o conteúdo já existe, descarta a cópia.
+
+        Retorna (hash, caminho) com uma referência já contada.
+        """
+        temporario = os.path.join(self.diretorio, _TEMPORARIOS, uuid.uuid4().hex)
+        sha256 = hashlib.sha256()
+        tamanho = 0
+        try:
+            try:
+                with open(temporario, 'wb') as f:
+                    for bloco in blocos:
+                        if not bloco:
+                            continue
+                        if tamanho + len(bloco) > tamanho_maximo:
+                            raise ArquivoMuitoGrande(
+                                f"{nome} excede o tamanho máximo de {tamanho_maximo // (1024 * 1024)}MB")
+                        self._reservar(len(bloco))
+                        tamanho += len(bloco)
+                        sha256.update(bloco)
+                        f.write(bloco)
+            except BaseException:
+                self._liberar_reserva(tamanho)
+                raise
+            return self._registrar(sha256.hexdigest(), nome, tamanho, temporario)
+        finally:
+            if os.path.exists(temporario):
+                os.unlink(temporario)
+
+    def guardar_arquivo(self, nome, arquivo, tamanho_maximo=ARQUIVO_TAMANHO_MAXIMO):
+        """Como guardar, para um arquivo que pode ser relido (ex.: UploadFile.file).
+
+        O hash é calculado numa primeira leitura; um documento repetido não é gravado de novo.
+        """
+        sha256 = hashlib.sha256()
+        tamanho = 0
+        for bloco in iter(lambda: arquivo.read(BLOCO), b''):
+            tamanho += len(bloco)
+            if tamanho > tamanho_maximo:
+                raise ArquivoMuitoGrande(f"{nome} excede o tamanho máximo de {tamanho_maximo // (1024 * 1024)}MB")
+            sha256.update(bloco)
+        documento = self.referenciar(sha256.hexdigest())
+        if documento:
+            return documento
+        arquivo.seek(0)
+        return self.guardar(nome, iter(lambda: arquivo.read(BLOCO), b''), tamanho_maximo)
+
+    def referenciar(self, hash_documento):
+        """Conta uma referência a um documento já guardado; retorna (hash, caminho) ou None"""
+        with self._lock:
+            documento = self._documentos.get(hash_documento)
+            if not documento or not os.path.exists(documento['caminho']):
+                return None
+            self._usar(hash_documento, documento)
+        DOCUMENTOS_RECEBIDOS.inc(resultado='repetido')
+        return hash_documento, documento['caminho']
+
+    def liberar(self, hash_documento):
+        """Devolve uma referência; o documento continua guardado até ser removido por LRU ou TTL"""
+        with self._lock:
+            documento = self._documentos.get(hash_documento)
+            if documento and documento['referencias'] > 0:
+                documento['referencias'] -= 1
+                documento['acesso'] = time.time()
+            self._remover_excedentes()
+
+    def estatisticas(self):
+        with self._lock:
+            return {"documentos": len(self._documentos), "bytes": self._bytes, "pendentes": self._pendentes,
+                    "limite": self.limite,
+                    "em_uso": sum(1 for documento in self._documentos.values() if documento['referencias'])}
+
+    def _reservar(self, tamanho):
+        with self._lock:
+            self._pendentes += tamanho
+            self._remover_excedentes()
+            if self._bytes + self._pendentes > self.limite:
+                # Tudo o que sobrou está em uso por outros jobs
+                self._pendentes -= tamanho
+                raise CotaExcedida("Repositório de documentos cheio; tente novamente em instantes")
+
+    def _liberar_reserva(self, tamanho):
+        with self._lock:
+            self._pendentes -= tamanho
+
+    def _registrar(self, hash_documento, nome, tamanho, temporario):
+        # A reserva feita durante a gravação vira bytes guardados (ou é devolvida se o conteúdo já existia)
+        with self._lock:
+            self._pendentes -= tamanho
+            documento = self._documentos.get(hash_documento)
+            if documento and os.path.exists(documento['caminho']):
+                self._usar(hash_documento, documento)
+                repetido = True
+            else:
+                extensao = os.path.splitext(nome_seguro(nome))[1].lower()
+                caminho = os.path.join(self.diretorio, hash_documento[:2], hash_documento + extensao)
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                os.replace(temporario, caminho)
+                if documento:
+                    self._bytes -= documento['tamanho']
+                documento = {'caminho': caminho, 'tamanho': tamanho, 'referencias': 0, 'acesso': 0}
+                self._documentos[hash_documento] = documento
+                self._bytes += tamanho
+                self._usar(hash_documento, documento)
+                self._remover_excedentes()
+                if self._bytes > self.limite:
+                    # Tudo o que sobrou está em uso por outros jobs
+                    self._remover(hash_documento)
+                    raise CotaExcedida("Repositório de documentos cheio; tente novamente em instantes")
+                repetido = False
+        DOCUMENTOS_RECEBIDOS.inc(resultado='repetido' if repetido else 'novo')
+        return hash_documento, documento['caminho']
+
+    def _usar(self, hash_documento, documento):
+        documento['referencias'] += 1
+        documento['acesso'] = time.time()
+        self._documentos.move_to_end(hash_documento)
+        try:
+            # A data de modificação guarda a ordem de uso para quando o índice for reconstruído
+            os.utime(documento['caminho'])
+        except OSError:
+            pass
+
+    def _remover_excedentes(self):
+        # Chamado com o lock: primeiro os vencidos, depois os menos usados até caber no limite
+        vencimento = time.time() - self.ttl
+        for hash_documento, documento in list(self._documentos.items()):
+            if documento['referencias']:
+                continue
+            if documento['acesso'] < vencimento or self._bytes + self._pendentes > self.limite:
+                self._remover(hash_documento)
+
+    def _remover(self, hash_documento):
+        documento = self._documentos.pop(hash_documento)
+        self._bytes -= documento['tamanho']
+        try:
+            os.unlink(documento['caminho'])
+        except OSError:
+            pass
+
+    def _carregar(self):
+        """Reconstrói o índice a partir dos arquivos já guardados (sem referências)"""
+        os.makedirs(os.path.join(self.diretorio, _TEMPORARIOS), exist_ok=True)
+        for nome in os.listdir(os.path.join(self.diretorio, _TEMPORARIOS)):
+            # Cópias interrompidas por uma queda do processo
+            os.unlink(os.path.join(self.diretorio, _TEMPORARIOS, nome))
+        encontrados = []
+        for prefixo in os.listdir(self.diretorio):
+            pasta = os.path.join(self.diretorio, prefixo)
+            if prefixo == _TEMPORARIOS or not os.path.isdir(pasta):
+                continue
+            for nome in os.listdir(pasta):
+                caminho = os.path.join(pasta, nome)
+                estado = os.stat(caminho)
+                encontrados.append((estado.st_mtime, os.path.splitext(nome)[0], caminho, estado.st_size))
+        for acesso, hash_documento, caminho, tamanho in sorted(encontrados):
+            self._documentos[hash_documento] = {'caminho': caminho, 'tamanho': tamanho, 'referencias': 0, 'acesso': acesso}
+            self._bytes += tamanho
+        if encontrados:
+            logger.info(f"{len(encontrados)} documentos carregados de {self.diretorio}")
+        with self._lock:
+            self._remover_excedentes()
@@ -2,7 +2,6 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from webdriver_manager.chrome import ChromeDriverManager
@@ -10,35 +9,31 @@ from dotenv import load_dotenv
 import os
 import time
 from selenium.webdriver.common.action_chains import ActionChains
-import requests
-from selenium.common.exceptions import UnexpectedAlertPresentException
+from selenium.common.exceptions import UnexpectedAlertPresentException, NoAlertPresentException
+from esperas import postback, Espera
+from formulario_cadastro import CAMPOS_CADASTRO, preencher_campos
+from contexto import ContextoCadastro
+from cep import resolvedor_cep
+from notificacoes import caixa_saida
+from metricas import medir
+from perfis_navegador import obter_perfil, configurar_opcoes, aplicar_perfil
 
 # Carrega as variáveis de ambiente
 load_dotenv()
 
+@medir('cep.consultar')
 def obter_endereco_cep(cep):
-    try:
-        # Remove caracteres não numéricos do CEP
-        cep = ''.join(filter(str.isdigit, cep))
-        
-        # Consulta a API ViaCEP
-        url = f'https://viacep.com.br/ws/{cep}/json/'
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            dados = response.json()
-            if not dados.get('erro'):
-                return {
-                    'logradouro': dados.get('logradouro', ''),
-                    'bairro': dados.get('bairro', ''),
-                    'uf': 'RR'  # Sempre RR
-                }
-        return None
-    except Exception as e:
-        print(f"Erro ao consultar CEP: {str(e)}")
-        return None
+    # Consulta a API ViaCEP (com cache e sessão HTTP compartilhada, ver cep.py)
+    dados = resolvedor_cep.consultar(cep)
+    if dados:
+        return {
+            'logradouro': dados.get('logradouro', ''),
+            'bairro': dados.get('bairro', ''),
+            'uf': 'RR'  # Sempre RR
+        }
+    return None
 
-def iniciar_navegador():
+def opcoes_navegador(perfil):
     # Configura as opções do Chrome
     chrome_options = Options()
     chrome_options.add_argument('--start-maximized')
@@ -47,19 +42,25 @@ def iniciar_navegador():
     chrome_options.add_argument('--headless=new')  # Ativa o modo headless
     chrome_options.add_argument('--disable-gpu')  # Necessário para alguns sistemas
     chrome_options.add_argument('--window-size=1920,1080')  # Define uma resolução padrão
-    
+    return configurar_opcoes(chrome_options, perfil)
+
+def iniciar_navegador(perfil=None):
+    # Perfil de carregamento e bloqueio de recursos (NAVEGADOR_PERFIL, ver perfis_navegador.py)
+    perfil = obter_perfil(perfil)
+
     # Inicializa o driver do Chrome
     service = Service()
-    driver = webdriver.Chrome(options=chrome_options)
-    return driver
+    driver = webdriver.Chrome(options=opcoes_navegador(perfil))
+    return aplicar_perfil(driver, perfil)
 
-def fazer_login(driver, url_inicial):
+@medir('login.autenticar')
+def fazer_login(driver, url_inicial, contexto):
     try:
         # Acessa a URL inicial
         driver.get(url_inicial)
         
         # Aguarda até que a página de login seja carregada (caso seja redirecionado)
-        wait = WebDriverWait(driver, 10)
+        wait = Espera(driver, 10)
         
         # Verifica se estamos na página de login
         if "ICLogin" in driver.current_url:
@@ -74,8 +75,8 @@ def fazer_login(driver, url_inicial):
             )
             
             # Preenche os campos
-            campo_usuario.send_keys(os.getenv('USUARIO'))
-            campo_senha.send_keys(os.getenv('SENHA'))
+            campo_usuario.send_keys(contexto.usuario)
+            campo_senha.send_keys(contexto.senha)
             
             # Clica no botão de login
             botao_login = wait.until(
@@ -83,8 +84,8 @@ def fazer_login(driver, url_inicial):
             )
             botao_login.click()
             
-            # Aguarda um momento para o login ser processado
-            time.sleep(3)
+            # Aguarda o portal sair da página de login (o redirecionamento indica sessão criada)
+            wait.until(lambda d: "ICLogin" not in d.current_url)
             
             # Diagnóstico: print da URL e screenshot
             print(f"URL após login: {driver.current_url}")
@@ -99,9 +100,10 @@ def fazer_login(driver, url_inicial):
         print(f"Erro durante o login: {str(e)}")
         return False
 
-def verificar_campos_obrigatorios(driver):
+@medir('dados_cliente.verificar_obrigatorios')
+def verificar_campos_obrigatorios(driver, contexto):
     try:
-        wait = WebDriverWait(driver, 10)
+        wait = Espera(driver, 10)
         print("\n--- Verificando campos obrigatórios ---")
         
         # Verifica primeiro se os campos críticos estão preenchidos
@@ -136,12 +138,11 @@ def verificar_campos_obrigatorios(driver):
         )
         if not campo_endereco.get_attribute('value'):
             print("Campo Endereço está vazio, preenchendo...")
-            dados_endereco = obter_endereco_cep(os.getenv('CEP'))
+            dados_endereco = obter_endereco_cep(contexto.cep)
             if dados_endereco:
                 campo_endereco.clear()
                 campo_endereco.send_keys(dados_endereco['logradouro'])
                 print("Endereço preenchido")
-            time.sleep(1)
 
         # Verifica e preenche Cidade
         campo_cidade = wait.until(
@@ -152,7 +153,6 @@ def verificar_campos_obrigatorios(driver):
             campo_cidade.clear()
             campo_cidade.send_keys("Boa Vista")  # Cidade padrão para RR
             print("Cidade preenchida")
-            time.sleep(1)
 
         # Verifica e preenche Data Admissão (valor fixo)
         campo_data_admissao = wait.until(
@@ -166,18 +166,18 @@ def verificar_campos_obrigatorios(driver):
             # Força o evento blur para aplicar a máscara
             driver.execute_script("arguments[0].blur();", campo_data_admissao)
             print(f"Data Admissão preenchida: {data_admissao}")
-            time.sleep(1)
 
         # Verifica e preenche Banco
-        select_banco = Select(wait.until(
+        campo_banco = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbBanco_CAMPO"))
-        ))
-        banco = os.getenv('BANCO')
+        )
+        select_banco = Select(campo_banco)
+        banco = contexto.banco
         if not select_banco.first_selected_option.get_attribute('value') or select_banco.first_selected_option.get_attribute('value') != banco:
             print("Campo Banco está vazio ou incorreto, preenchendo...")
-            select_banco.select_by_value(banco)
+            with postback(driver, elemento=campo_banco):
+                select_banco.select_by_value(banco)
             print(f"Banco preenchido: {banco}")
-            time.sleep(1)
 
         print("Verificação de campos obrigatórios concluída")
         return True
@@ -186,357 +186,74 @@ def verificar_campos_obrigatorios(driver):
         print(f"Erro ao verificar campos obrigatórios: {str(e)}")
         return False
 
-def notificar_frontend(cpf, status="success", message="Proposta aprovada com sucesso"):
-    max_retries = 3
-    retry_delay = 2  # segundos
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"\nTentativa {attempt + 1} de notificar o frontend...")
-            
-            # Usa a URL da API do .env ou fallback para localhost
-            api_url = os.getenv('API_URL', 'http://localhost:5000/api/status')
-            
-            response = requests.post(
-                api_url,
-                json={
-                    "status": status,
-                    "message": message,
-                    "cpf": cpf,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                },
-                timeout=10  # timeout de 10 segundos
-            )
-            
-            if response.status_code == 200:
-                print("✅ Status enviado com sucesso para o frontend")
-                return True
-            else:
-                print(f"❌ Erro ao enviar status para o frontend: {response.status_code}")
-                print(f"Resposta: {response.text}")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Erro na requisição: {str(e)}")
-        
-        if attempt < max_retries - 1:
-            print(f"Aguardando {retry_delay} segundos antes da próxima tentativa...")
-            time.sleep(retry_delay)
-    
-    print("❌ Todas as tentativas de notificar o frontend falharam")
-    return False
-
-def preencher_formulario_cadastro(driver):
+@medir('aprovacao.notificar_frontend')
+def notificar_frontend(contexto, status="success", message="Proposta aprovada com sucesso"):
+    # Só grava na caixa de saída: a entrega (com novas tentativas) é feita em segundo plano
+    # por notificacoes.CaixaSaida, sem segurar o navegador
+    try:
+        caixa_saida.enfileirar({
+            "status": status,
+            "message": message,
+            "cpf": contexto.cpf,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+        print("✅ Notificação para o frontend enfileirada")
+        return True
+    except Exception as e:
+        print(f"❌ Erro ao enfileirar notificação para o frontend: {str(e)}")
+        return False
+
+def montar_valores_cadastro(contexto):
+    """Resolve o valor de cada campo do formulário de cadastro (ver formulario_cadastro.CAMPOS_CADASTRO)"""
+    valores = {chave: getattr(contexto, chave) for chave in (
+        'rg', 'data_emissao_rg', 'orgao_emissor', 'uf_emissao', 'naturalidade', 'uf_naturalidade',
+        'nome_mae', 'cep', 'data_admissao', 'profissao', 'descricao_profissao', 'cargo', 'renda',
+        'tipo_conta', 'banco', 'agencia', 'conta', 'digito', 'ddd', 'telefone', 'email'
+    )}
+
+    # Mapeando o valor do sexo para o formato correto
+    sexo = contexto.sexo
+    valores['sexo'] = ('M' if sexo.upper() == 'MASCULINO' else 'F') if sexo else None
+
+    # Valores válidos: 1 (Casado), 2 (Solteiro), 3 (Divorciado), 4 (Viuvo), 5 (Desquitado)
+    estado_civil = contexto.estado_civil
+    if estado_civil and estado_civil not in ['1', '2', '3', '4', '5']:
+        print(f"Valor inválido para estado civil: {estado_civil}. Usando valor padrão '2' (Solteiro)")
+        estado_civil = '2'
+    valores['estado_civil'] = estado_civil or None
+
+    # Obtém dados do endereço via API; sem eles os campos de endereço não são preenchidos
+    dados_endereco = obter_endereco_cep(valores['cep'])
+    if dados_endereco:
+        valores['endereco'] = dados_endereco['logradouro']
+        valores['bairro'] = dados_endereco['bairro']
+        valores['uf'] = 'RR'  # Sempre RR
+        valores['numero'] = contexto.numero
+        valores['complemento'] = contexto.complemento
+    else:
+        print("Erro ao obter dados do endereço via CEP")
+    return valores
+
+def preencher_dados_cliente(driver, contexto):
+    """Etapa dados_cliente: preenche a aba do cliente e salva o cadastro"""
     try:
-        wait = WebDriverWait(driver, 10)
+        wait = Espera(driver, 10)
         print("\n=== Iniciando preenchimento do formulário ===")
         
-        # Dados de Documentação
-        print("\n--- Preenchendo Dados de Documentação ---")
-        campo_rg = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtRG_CAMPO"))
-        )
-        campo_rg.clear()
-        campo_rg.send_keys(os.getenv('RG'))
-        print("RG preenchido")
-        time.sleep(1)
-
-        campo_data_emissao = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtDtEmissao_CAMPO"))
-        )
-        campo_data_emissao.clear()
-        campo_data_emissao.send_keys(os.getenv('DATA_EMISSAO_RG'))
-        print("Data de emissão preenchida")
-        time.sleep(1)
-
-        campo_orgao_emissor = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtLocalEmissao_CAMPO"))
-        )
-        campo_orgao_emissor.clear()
-        campo_orgao_emissor.send_keys(os.getenv('ORGAO_EMISSOR'))
-        print("Órgão emissor preenchido")
-        time.sleep(1)
-
-        # UF de Emissão do Documento
-        select_uf_emissao = Select(wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbUFEmissao_CAMPO"))
-        ))
-        select_uf_emissao.select_by_value(os.getenv('UF_EMISSAO'))
-        print("UF de emissão selecionada")
-        time.sleep(1)
-
-        # Dados Pessoais
-        print("\n--- Preenchendo Dados Pessoais ---")
-        campo_naturalidade = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtCidadeNatal_CAMPO"))
-        )
-        campo_naturalidade.clear()
-        campo_naturalidade.send_keys(os.getenv('NATURALIDADE'))
-        print("Naturalidade preenchida")
-        time.sleep(1)
-
-        # UF de Naturalidade
-        select_uf_naturalidade = Select(wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbUFNatal_CAMPO"))
-        ))
-        select_uf_naturalidade.select_by_value(os.getenv('UF_NATURALIDADE'))
-        print("UF de naturalidade selecionada")
-        time.sleep(1)
-
-        # Sexo
-        sexo = os.getenv('SEXO')
-        if sexo:
-            select_sexo = Select(driver.find_element(By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbSexo_CAMPO"))
-            # Mapeando o valor do sexo para o formato correto
-            sexo_value = 'M' if sexo.upper() == 'MASCULINO' else 'F'
-            select_sexo.select_by_value(sexo_value)
-            print("Sexo selecionado")
-        time.sleep(1)
-
-        # Estado Civil
-        estado_civil = os.getenv('ESTADO_CIVIL')
-        if estado_civil:
-            # Valores válidos: 1 (Casado), 2 (Solteiro), 3 (Divorciado), 4 (Viuvo), 5 (Desquitado)
-            if estado_civil in ['1', '2', '3', '4', '5']:
-                select_estado_civil = Select(wait.until(
-                    EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbEstadoCivil_CAMPO"))
-                ))
-                select_estado_civil.select_by_value(estado_civil)
-                print("Estado civil selecionado")
-            else:
-                print(f"Valor inválido para estado civil: {estado_civil}. Usando valor padrão '2' (Solteiro)")
-                select_estado_civil = Select(wait.until(
-                    EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbEstadoCivil_CAMPO"))
-                ))
-                select_estado_civil.select_by_value('2')
-        time.sleep(1)
-
-        # Filiação
-        print("\n--- Preenchendo Filiação ---")
-        campo_nome_mae = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtNomeMae_CAMPO"))
-        )
-        campo_nome_mae.clear()
-        campo_nome_mae.send_keys(os.getenv('NOME_MAE'))
-        print("Nome da mãe preenchido")
-        time.sleep(1)
-
-        # Endereço
-        print("\n--- Preenchendo Endereço ---")
-        # Preenche CEP
-        cep = os.getenv('CEP')
-        campo_cep = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucEnderecoResidencial_txtCEP_CAMPO"))
-        )
-        campo_cep.clear()
-        campo_cep.send_keys(cep)
-        print("CEP preenchido")
-        time.sleep(2)  # Aguarda o preenchimento automático
-
-        # Obtém dados do endereço via API
-        dados_endereco = obter_endereco_cep(cep)
-        if dados_endereco:
-            # Preenche endereço
-            campo_endereco = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucEnderecoResidencial_txtEndereco_CAMPO"))
-            )
-            campo_endereco.clear()
-            campo_endereco.send_keys(dados_endereco['logradouro'])
-            print("Endereço preenchido")
-            time.sleep(1)
-
-            # Preenche número
-            campo_numero = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucEnderecoResidencial_txtEnderecoNR_CAMPO"))
-            )
-            campo_numero.clear()
-            campo_numero.send_keys(os.getenv('NUMERO'))
-            print("Número preenchido")
-            time.sleep(1)
-
-            # Preenche bairro
-            campo_bairro = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucEnderecoResidencial_txtBairro_CAMPO"))
-            )
-            campo_bairro.clear()
-            campo_bairro.send_keys(dados_endereco['bairro'])
-            print("Bairro preenchido")
-            time.sleep(1)
-
-            # Preenche UF (sempre RR)
-            select_uf = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucEnderecoResidencial_cbUF_CAMPO"))
-            ))
-            select_uf.select_by_value('RR')
-            print("UF preenchida (RR)")
-            time.sleep(1)
-
-            # Preenche complemento
-            campo_complemento = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucEnderecoResidencial_txtComplemento_CAMPO"))
-            )
-            campo_complemento.clear()
-            campo_complemento.send_keys(os.getenv('COMPLEMENTO'))
-            print("Complemento preenchido")
-            time.sleep(1)
-        else:
-            print("Erro ao obter dados do endereço via CEP")
-
-        # Dados Profissionais
-        print("\n--- Preenchendo Dados Profissionais ---")
-        campo_data_admissao = wait.until(
-            EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtDataAdmissao_CAMPO"))
+        # Aguarda a aba do cliente estar carregada antes de preencher em lote
+        wait.until(
+            EC.presence_of_element_located((By.ID, CAMPOS_CADASTRO[0].id))
         )
-        campo_data_admissao.clear()
-        campo_data_admissao.send_keys(os.getenv('DATA_ADMISSAO'))
-        print("Data de admissão preenchida")
-        time.sleep(1)
-
-        try:
-            print("Tentando preencher profissão...")
-            select_profissao = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbProfissao_CAMPO"))
-            ))
-            profissao = os.getenv('PROFISSAO')
-            print(f"Valor da profissão: {profissao}")
-            select_profissao.select_by_value(profissao)
-            print("Profissão selecionada")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher profissão: {str(e)}")
-
-        try:
-            print("Tentando preencher descrição da profissão...")
-            campo_descricao_profissao = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtProfissao_CAMPO"))
-            )
-            campo_descricao_profissao.clear()
-            campo_descricao_profissao.send_keys(os.getenv('DESCRICAO_PROFISSAO'))
-            print("Descrição da profissão preenchida")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher descrição da profissão: {str(e)}")
-
-        try:
-            print("Tentando preencher cargo...")
-            campo_cargo = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtCargo_CAMPO"))
-            )
-            campo_cargo.clear()
-            campo_cargo.send_keys(os.getenv('CARGO'))
-            print("Cargo preenchido")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher cargo: {str(e)}")
-
-        # Rendas
-        print("\n--- Preenchendo Rendas ---")
-        try:
-            campo_renda = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtRenda_CAMPO"))
-            )
-            campo_renda.clear()
-            campo_renda.send_keys(os.getenv('RENDA'))
-            print("Renda preenchida")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher renda: {str(e)}")
-
-        # Nº Benefício/Matrícula será preenchido automaticamente
-        print("Número de benefício/matrícula será preenchido automaticamente")
-
-        # Dados Bancários
-        print("\n--- Preenchendo Dados Bancários ---")
-        try:
-            select_tipo_conta = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbTipoConta_CAMPO"))
-            ))
-            select_tipo_conta.select_by_value(os.getenv('TIPO_CONTA'))
-            print("Tipo de conta selecionado")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao selecionar tipo de conta: {str(e)}")
-
-        try:
-            select_banco = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_cbBanco_CAMPO"))
-            ))
-            select_banco.select_by_value(os.getenv('BANCO'))
-            print("Banco selecionado")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao selecionar banco: {str(e)}")
-
-        try:
-            campo_agencia = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtAgencia_CAMPO"))
-            )
-            campo_agencia.clear()
-            campo_agencia.send_keys(os.getenv('AGENCIA'))
-            print("Agência preenchida")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher agência: {str(e)}")
-
-        try:
-            campo_conta = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtConta_CAMPO"))
-            )
-            campo_conta.clear()
-            campo_conta.send_keys(os.getenv('CONTA'))
-            print("Conta preenchida")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher conta: {str(e)}")
-
-        try:
-            campo_digito = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtContaDV_CAMPO"))
-            )
-            campo_digito.clear()
-            campo_digito.send_keys(os.getenv('DIGITO'))
-            print("Dígito preenchido")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher dígito: {str(e)}")
-
-        # Contato
-        print("\n--- Preenchendo Contato ---")
-        try:
-            campo_ddd = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucTelefoneCelular_txtDDD_CAMPO"))
-            )
-            campo_ddd.clear()
-            campo_ddd.send_keys(os.getenv('DDD'))
-            print("DDD preenchido")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher DDD: {str(e)}")
-
-        try:
-            campo_telefone = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_ucTelefoneCelular_txtFone_CAMPO"))
-            )
-            campo_telefone.clear()
-            campo_telefone.send_keys(os.getenv('TELEFONE'))
-            print("Telefone preenchido")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher telefone: {str(e)}")
 
-        try:
-            campo_email = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_Container_AbaCliente_ucCadastroCliente_txtEmail_CAMPO"))
-            )
-            campo_email.clear()
-            campo_email.send_keys(os.getenv('EMAIL'))
-            print("Email preenchido")
-            time.sleep(1)
-        except Exception as e:
-            print(f"Erro ao preencher email: {str(e)}")
+        # Monta os valores de cada campo a partir dos dados do cliente
+        print("\n--- Preenchendo dados do cliente ---")
+        valores = montar_valores_cadastro(contexto)
+        with medir('dados_cliente.preencher_campos'):
+            preencher_campos(driver, CAMPOS_CADASTRO, valores)
 
         # Antes de clicar no botão Atualizar Cliente, verifica os campos obrigatórios
         print("\n--- Verificando campos obrigatórios antes de salvar ---")
-        verificar_campos_obrigatorios(driver)
+        verificar_campos_obrigatorios(driver, contexto)
 
         # Clica no botão "Atualizar Cliente"
         print("\n--- Salvando cadastro ---")
@@ -544,85 +261,106 @@ def preencher_formulario_cadastro(driver):
             botao_atualizar = wait.until(
                 EC.element_to_be_clickable((By.ID, "ctl00_Cph_Container_AbaCliente_bbGravar"))
             )
-            botao_atualizar.click()
+            with medir('dados_cliente.gravar'), postback(driver, fallback=2):
+                botao_atualizar.click()
             print("Botão Atualizar Cliente clicado")
-            time.sleep(2)  # Aguarda o processamento
         except Exception as e:
             print(f"Erro ao clicar no botão Atualizar Cliente: {str(e)}")
 
-        # Upload de Documentos
-        print("\n--- Upload de Documentos ---")
-        try:
-            # RG Verso
-            print("Processando RG Verso...")
-            select_tipo_doc_rg = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_cbTipoDocumento_CAMPO"))
-            ))
-            select_tipo_doc_rg.select_by_value("20")  # RG - Verso
-            time.sleep(1)
-
-            campo_arquivo_rg = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_fileUpload"))
-            )
-            campo_arquivo_rg.send_keys(os.path.abspath(os.getenv('ARQUIVO_RG_VERSO')))
-            time.sleep(1)
+        return True
 
-            botao_importar_rg = wait.until(
-                EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucAnexarDocumento1_bbEnviar"))
-            )
+    except Exception as e:
+        print(f"\nErro ao preencher formulário: {str(e)}")
+        return False
+
+def anexar_documentos(driver, contexto):
+    """Etapa documentos: anexa RG verso, comprovante de endereço e comprovante de renda.
+
+    Tenta todos os documentos e retorna False se algum não foi enviado.
+    """
+    wait = Espera(driver, 10)
+    sucesso = True
+
+    # Upload de Documentos
+    print("\n--- Upload de Documentos ---")
+    try:
+        # RG Verso
+        print("Processando RG Verso...")
+        campo_tipo_doc_rg = wait.until(
+            EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_cbTipoDocumento_CAMPO"))
+        )
+        with postback(driver, elemento=campo_tipo_doc_rg):
+            Select(campo_tipo_doc_rg).select_by_value("20")  # RG - Verso
+
+        campo_arquivo_rg = wait.until(
+            EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_fileUpload"))
+        )
+        campo_arquivo_rg.send_keys(os.path.abspath(contexto.arquivo_rg_verso))
+
+        botao_importar_rg = wait.until(
+            EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucAnexarDocumento1_bbEnviar"))
+        )
+        with medir('documentos.enviar'), postback(driver, fallback=2):
             botao_importar_rg.click()
-            print("RG Verso importado com sucesso")
-            time.sleep(2)
-        except Exception as e:
-            print(f"Erro ao importar RG Verso: {str(e)}")
+        print("RG Verso importado com sucesso")
+    except Exception as e:
+        print(f"Erro ao importar RG Verso: {str(e)}")
+        sucesso = False
 
-        try:
-            # Comprovante de Endereço
-            print("Processando Comprovante de Endereço...")
-            select_tipo_doc_endereco = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_cbTipoDocumento_CAMPO"))
-            ))
-            select_tipo_doc_endereco.select_by_value("4")  # Comprovante de Endereço
-            time.sleep(1)
-
-            campo_arquivo_endereco = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_fileUpload"))
-            )
-            campo_arquivo_endereco.send_keys(os.path.abspath(os.getenv('ARQUIVO_COMPROVANTE_ENDERECO')))
-            time.sleep(1)
+    try:
+        # Comprovante de Endereço
+        print("Processando Comprovante de Endereço...")
+        campo_tipo_doc_endereco = wait.until(
+            EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_cbTipoDocumento_CAMPO"))
+        )
+        with postback(driver, elemento=campo_tipo_doc_endereco):
+            Select(campo_tipo_doc_endereco).select_by_value("4")  # Comprovante de Endereço
 
-            botao_importar_endereco = wait.until(
-                EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucAnexarDocumento1_bbEnviar"))
-            )
+        campo_arquivo_endereco = wait.until(
+            EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_fileUpload"))
+        )
+        campo_arquivo_endereco.send_keys(os.path.abspath(contexto.arquivo_comprovante_endereco))
+
+        botao_importar_endereco = wait.until(
+            EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucAnexarDocumento1_bbEnviar"))
+        )
+        with medir('documentos.enviar'), postback(driver, fallback=2):
             botao_importar_endereco.click()
-            print("Comprovante de Endereço importado com sucesso")
-            time.sleep(2)
-        except Exception as e:
-            print(f"Erro ao importar Comprovante de Endereço: {str(e)}")
+        print("Comprovante de Endereço importado com sucesso")
+    except Exception as e:
+        print(f"Erro ao importar Comprovante de Endereço: {str(e)}")
+        sucesso = False
 
-        try:
-            # Comprovante de Renda
-            print("Processando Comprovante de Renda...")
-            select_tipo_doc_renda = Select(wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_cbTipoDocumento_CAMPO"))
-            ))
-            select_tipo_doc_renda.select_by_value("5")  # Comprovante de Renda
-            time.sleep(1)
-
-            campo_arquivo_renda = wait.until(
-                EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_fileUpload"))
-            )
-            campo_arquivo_renda.send_keys(os.path.abspath(os.getenv('ARQUIVO_COMPROVANTE_RENDA')))
-            time.sleep(1)
+    try:
+        # Comprovante de Renda
+        print("Processando Comprovante de Renda...")
+        campo_tipo_doc_renda = wait.until(
+            EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_cbTipoDocumento_CAMPO"))
+        )
+        with postback(driver, elemento=campo_tipo_doc_renda):
+            Select(campo_tipo_doc_renda).select_by_value("5")  # Comprovante de Renda
 
-            botao_importar_renda = wait.until(
-                EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucAnexarDocumento1_bbEnviar"))
-            )
+        campo_arquivo_renda = wait.until(
+            EC.presence_of_element_located((By.ID, "ctl00_Cph_ucAnexarDocumento1_fileUpload"))
+        )
+        campo_arquivo_renda.send_keys(os.path.abspath(contexto.arquivo_comprovante_renda))
+
+        botao_importar_renda = wait.until(
+            EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucAnexarDocumento1_bbEnviar"))
+        )
+        with medir('documentos.enviar'), postback(driver, fallback=2):
             botao_importar_renda.click()
-            print("Comprovante de Renda importado com sucesso")
-            time.sleep(2)
-        except Exception as e:
-            print(f"Erro ao importar Comprovante de Renda: {str(e)}")
+        print("Comprovante de Renda importado com sucesso")
+    except Exception as e:
+        print(f"Erro ao importar Comprovante de Renda: {str(e)}")
+        sucesso = False
+
+    return sucesso
+
+def aprovar_proposta(driver, contexto):
+    """Etapa aprovacao: clica em Aprovar, trata o alerta do portal e notifica o frontend"""
+    try:
+        wait = Espera(driver, 10)
 
         # Clica no botão Aprovar
         print("\n--- Clicando no botão Aprovar ---")
@@ -630,145 +368,169 @@ def preencher_formulario_cadastro(driver):
             botao_aprovar = wait.until(
                 EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucBotoesEsteira1_bbAprovar"))
             )
-            botao_aprovar.click()
+            with medir('aprovacao.aprovar'), postback(driver, fallback=2):
+                botao_aprovar.click()
             print("Botão Aprovar clicado com sucesso!")
-            time.sleep(2)
         except Exception as e:
             print(f"Erro ao clicar no botão Aprovar: {str(e)}")
             driver.save_screenshot("erro_botao_aprovar.png")
+            return False
 
-        # Tratamento do alerta de sucesso
+        # Tratamento do alerta de sucesso: sem ele a proposta não foi aprovada
         try:
             alert = driver.switch_to.alert
             mensagem_alerta = alert.text
-            print(f"Mensagem do sistema: {mensagem_alerta}")
-            if "Proposta Aprovada com Sucesso" in mensagem_alerta:
-                alert.accept()
-                print("Proposta aprovada com sucesso!")
-                
-                # Notifica o frontend sobre o sucesso
-                notificar_frontend(os.getenv('CPF'))
-                
-        except Exception:
-            pass
+        except NoAlertPresentException:
+            print("O portal não confirmou a aprovação da proposta")
+            return False
+        print(f"Mensagem do sistema: {mensagem_alerta}")
+        if "Proposta Aprovada com Sucesso" not in mensagem_alerta:
+            return False
+        alert.accept()
+        print("Proposta aprovada com sucesso!")
 
-        print("\n=== Formulário preenchido com sucesso! ===")
+        # Notifica o frontend sobre o sucesso
+        notificar_frontend(contexto)
         return True
 
     except UnexpectedAlertPresentException:
         alert = driver.switch_to.alert
-        print(f"Mensagem do sistema: {alert.text}")
+        mensagem_alerta = alert.text
+        print(f"Mensagem do sistema: {mensagem_alerta}")
         alert.accept()
+        if "Proposta Aprovada com Sucesso" not in mensagem_alerta:
+            return False
         print("Proposta aprovada com sucesso!")
-        
+
         # Notifica o frontend sobre o sucesso mesmo em caso de exceção
-        notificar_frontend(os.getenv('CPF'))
-            
+        notificar_frontend(contexto)
         return True
     except Exception as e:
-        print(f"\nErro ao preencher formulário: {str(e)}")
+        print(f"\nErro ao aprovar proposta: {str(e)}")
         return False
 
-def executar_acoes_simulacao(driver):
+def preencher_formulario_cadastro(driver, contexto):
+    """Executa em sequência as etapas dados_cliente, documentos e aprovacao"""
+    if not preencher_dados_cliente(driver, contexto):
+        return False
+    if not anexar_documentos(driver, contexto):
+        return False
+    if not aprovar_proposta(driver, contexto):
+        return False
+    print("\n=== Formulário preenchido com sucesso! ===")
+    return True
+
+def calcular_simulacao(driver, contexto):
+    """Etapa simulacao: preenche os dados do cliente, calcula a margem e simula o saque"""
     try:
-        wait = WebDriverWait(driver, 10)
+        wait = Espera(driver, 10)
         
         # Seleciona o primeiro ponto de venda
-        select_pdv = Select(wait.until(
+        campo_pdv = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_cbLoja_CAMPO"))
-        ))
-        select_pdv.select_by_index(1)  # Seleciona a primeira opção (índice 1, pois 0 é o "-")
-        time.sleep(1)
+        )
+        with postback(driver, elemento=campo_pdv):
+            Select(campo_pdv).select_by_index(1)  # Seleciona a primeira opção (índice 1, pois 0 é o "-")
         
         # Seleciona o tipo de produto (Cartão Consignado ou Cartão Benefício)
-        select_produto = Select(wait.until(
+        campo_produto = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_cbTipoProduto_CAMPO"))
-        ))
-        tipo_produto = os.getenv('TIPO_PRODUTO', '1')  # 1 para Consignado, 4 para Benefício
-        select_produto.select_by_value(tipo_produto)
-        time.sleep(1)
+        )
+        tipo_produto = contexto.tipo_produto  # 1 para Consignado, 4 para Benefício
+        with postback(driver, elemento=campo_produto):
+            Select(campo_produto).select_by_value(tipo_produto)
         
         # Preenche o CPF (nome e data de nascimento serão preenchidos automaticamente)
         campo_cpf = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_txtCPF_CAMPO"))
         )
         campo_cpf.clear()
-        campo_cpf.send_keys(os.getenv('CPF'))
-        time.sleep(2)  # Aguarda um pouco mais para garantir que os campos sejam preenchidos automaticamente
+        with postback(driver, inicio=2, fallback=2):
+            campo_cpf.send_keys(contexto.cpf)
         
         # Preenche a matrícula
         campo_matricula = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_txtNumeroBeneficio_CAMPO"))
         )
         campo_matricula.clear()
-        campo_matricula.send_keys(os.getenv('MATRICULA'))
-        time.sleep(1)
+        campo_matricula.send_keys(contexto.matricula)
         
         # Seleciona o empregador
-        select_empregador = Select(wait.until(
+        campo_empregador = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_cbEmpregador_CAMPO"))
-        ))
-        empregador = os.getenv('EMPREGADOR', '51')
-        select_empregador.select_by_value(empregador)
-        time.sleep(1)
+        )
+        empregador = contexto.empregador
+        with postback(driver, elemento=campo_empregador):
+            Select(campo_empregador).select_by_value(empregador)
         
         # Clica no botão de calcular margem
         botao_calcular = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_bbCalcularMargem"))
         )
-        botao_calcular.click()
-        time.sleep(2)  # Aguarda o cálculo da margem
+        with medir('simulacao.calcular_margem'), postback(driver, fallback=2):
+            botao_calcular.click()
         
         # Preenche o valor da margem
         campo_valor_margem = wait.until(
             EC.presence_of_element_located((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_txtValorMargem_CAMPO"))
         )
         campo_valor_margem.clear()
-        campo_valor_margem.send_keys(os.getenv('VALOR_MARGEM'))
-        time.sleep(1)
+        campo_valor_margem.send_keys(contexto.valor_margem)
         
         # Clica no botão OK (Atualizar Cálculo)
         botao_ok = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_lnkMargemOK"))
         )
-        botao_ok.click()
-        time.sleep(2)
+        with postback(driver, fallback=2):
+            botao_ok.click()
 
         # Clica no botão "Exibir Tabelas"
         botao_exibir_tabelas = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_bbSimularConsignado"))
         )
-        botao_exibir_tabelas.click()
-        time.sleep(2)
+        with postback(driver, fallback=2):
+            botao_exibir_tabelas.click()
 
         # Clica no botão de selecionar tabela (primeira opção)
         botao_selecionar_tabela = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_gridTabelas_ctl02_lnkDetalhes"))
         )
-        botao_selecionar_tabela.click()
-        time.sleep(2)
+        with postback(driver, fallback=2):
+            botao_selecionar_tabela.click()
 
         # Clica no botão "Simular Saque"
         botao_simular_saque = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_bbSimularSaque"))
         )
-        botao_simular_saque.click()
-        time.sleep(2)
+        with postback(driver, fallback=2):
+            botao_simular_saque.click()
+
+        print("Simulação realizada com sucesso!")
+        return True
+
+    except Exception as e:
+        print(f"Erro ao executar ações na página de simulação: {str(e)}")
+        return False
+
+def solicitar_proposta(driver, contexto):
+    """Etapa proposta: solicita a proposta e inicia a esteira, abrindo a página de cadastro"""
+    try:
+        wait = Espera(driver, 10)
 
         # Clica no botão "Solicitar Proposta"
         botao_solicitar_proposta = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_bbSolicitarProposta"))
         )
-        botao_solicitar_proposta.click()
-        time.sleep(2)
+        with postback(driver, fallback=2):
+            botao_solicitar_proposta.click()
 
         # Clica no botão "Sim"
         botao_sim = wait.until(
             EC.element_to_be_clickable((By.ID, "ctl00_Cph_ucSimulacaoCartaoConsignado_bbContinuarSim"))
         )
-        botao_sim.click()
+        with postback(driver, fallback=3):
+            botao_sim.click()
         print("Botão Sim clicado")
-        time.sleep(3)  # Aumenta o tempo de espera após clicar em Sim
 
         # Clica no botão "OK"
         print("Tentando clicar no botão OK...")
@@ -787,17 +549,17 @@ def executar_acoes_simulacao(driver):
 
             if botao_ok:
                 # Tenta clicar de diferentes formas
-                try:
-                    botao_ok.click()
-                except:
+                with postback(driver, fallback=3):
                     try:
-                        driver.execute_script("arguments[0].click();", botao_ok)
+                        botao_ok.click()
                     except:
-                        actions = ActionChains(driver)
-                        actions.move_to_element(botao_ok).click().perform()
+                        try:
+                            driver.execute_script("arguments[0].click();", botao_ok)
+                        except:
+                            actions = ActionChains(driver)
+                            actions.move_to_element(botao_ok).click().perform()
                 
                 print("Botão OK clicado com sucesso")
-                time.sleep(3)  # Aguarda após o clique
             else:
                 print("Botão OK não encontrado")
                 driver.save_screenshot("erro_botao_ok.png")
@@ -805,33 +567,41 @@ def executar_acoes_simulacao(driver):
             print(f"Erro ao clicar no botão OK: {str(e)}")
             driver.save_screenshot("erro_botao_ok.png")
 
-        # Prossegue com o preenchimento do formulário
-        print("\n--- Iniciando preenchimento do formulário ---")
-        preencher_formulario_cadastro(driver)
-        
-        print("Ações na página de simulação executadas com sucesso!")
+        print("Proposta solicitada com sucesso!")
         return True
         
     except Exception as e:
-        print(f"Erro ao executar ações na página de simulação: {str(e)}")
+        print(f"Erro ao solicitar proposta: {str(e)}")
+        return False
+
+def executar_acoes_simulacao(driver, contexto):
+    """Executa em sequência as etapas simulacao e proposta"""
+    if not calcular_simulacao(driver, contexto):
+        return False
+    if not solicitar_proposta(driver, contexto):
         return False
+    print("Ações na página de simulação executadas com sucesso!")
+    return True
 
 def main():
     url_inicial = "https://pixcard.banksofttecnologia.com.br/AppCartao/Pages/Simulacao/ICSimulacao"
     url_destino = "https://pixcard.banksofttecnologia.com.br/AppCartao/Pages/Simulacao/ICSimulacao"
+    contexto = ContextoCadastro.do_ambiente()
     driver = iniciar_navegador()
     try:
-        if fazer_login(driver, url_inicial):
+        if fazer_login(driver, url_inicial, contexto):
             # Após login, acessar diretamente a página de simulação
             driver.get(url_destino)
             # Aguarda até estar na página correta ou timeout
-            WebDriverWait(driver, 10).until(
+            Espera(driver, 10).until(
                 lambda d: d.current_url.startswith(url_destino)
             )
             if driver.current_url.startswith(url_destino):
                 print("Acesso à página de simulação realizado com sucesso!")
-                # Executa as ações na página de simulação
-                executar_acoes_simulacao(driver)
+                # Executa as ações na página de simulação e o cadastro
+                if executar_acoes_simulacao(driver, contexto):
+                    print("\n--- Iniciando preenchimento do formulário ---")
+                    preencher_formulario_cadastro(driver, contexto)
             else:
                 print(f"Não foi possível acessar a página de simulação. URL atual: {driver.current_url}")
             driver.save_screenshot("screenshot_simulacao.png")
@@ -0,0 +1,111 @@
+import os
+import hmac
+import hashlib
+import threading
+import time
+import logging
+
+from scraper import fazer_login
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo (s) que uma sessão capturada é reaproveitada antes de forçar novo login
+SESSAO_TTL = float(os.getenv('SESSAO_TTL', '1200'))
+
+
+def resumo_senha(senha):
+    """Hash da senha guardado com a sessão: só quem informa a mesma senha reaproveita o login"""
+    return hashlib.sha256((senha or '').encode('utf-8')).hexdigest()
+
+
+def mesma_senha(sessao, senha):
+    return hmac.compare_digest(sessao['senha'], resumo_senha(senha))
+
+
+class GerenciadorSessoes:
+    """Guarda os cookies pós-login por usuário e os injeta em navegadores novos ou do pool"""
+
+    def __init__(self, ttl=SESSAO_TTL):
+        self.ttl = ttl
+        self._sessoes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def garantir_sessao(self, driver, url_inicial, contexto):
+        """Deixa o driver autenticado em url_inicial, reaproveitando a sessão do usuário quando válida.
+
+        Retorna True se o driver terminou autenticado na página inicial.
+        """
+        usuario = contexto.usuario
+        sessao = self._obter(usuario, contexto.senha)
+        if sessao and self._restaurar(driver, url_inicial, sessao['cookies']):
+            logger.info(f"Sessão reaproveitada para o usuário {usuario}")
+            return True
+
+        with self._lock_usuario(usuario):
+            # Outro job pode ter renovado a sessão enquanto aguardávamos o lock
+            nova = self._obter(usuario, contexto.senha)
+            if nova and nova is not sessao and self._restaurar(driver, url_inicial, nova['cookies']):
+                logger.info(f"Sessão renovada por outro job reaproveitada para o usuário {usuario}")
+                return True
+
+            # A sessão guardada só é trocada depois de um login aceito: uma senha errada não derruba a do operador
+            logger.info(f"Sessão inexistente ou expirada para o usuário {usuario}, fazendo login completo")
+            if not fazer_login(driver, url_inicial, contexto):
+                return False
+            driver.get(url_inicial)
+            if self._na_pagina_login(driver):
+                logger.error(f"Login do usuário {usuario} não foi aceito pelo portal")
+                return False
+            self._salvar(usuario, contexto.senha, driver.get_cookies())
+            return True
+
+    def invalidar(self, usuario):
+        with self._lock:
+            self._sessoes.pop(usuario, None)
+
+    def _obter(self, usuario, senha):
+        with self._lock:
+            sessao = self._sessoes.get(usuario)
+            if sessao and time.monotonic() - sessao['criada_em'] > self.ttl:
+                del self._sessoes[usuario]
+                return None
+            # Senha diferente da usada no login: faz um login completo, que o portal valida
+            return sessao if sessao and mesma_senha(sessao, senha) else None
+
+    def _salvar(self, usuario, senha, cookies):
+        with self._lock:
+            self._sessoes[usuario] = {'cookies': cookies, 'criada_em': time.monotonic(), 'senha': resumo_senha(senha)}
+
+    def _lock_usuario(self, usuario):
+        with self._lock:
+            return self._locks.setdefault(usuario, threading.Lock())
+
+    def _restaurar(self, driver, url_inicial, cookies):
+        """Injeta os cookies e confirma que o portal não redirecionou para o ICLogin"""
+        try:
+            self._injetar_cookies(driver, url_inicial, cookies)
+            driver.get(url_inicial)
+            return not self._na_pagina_login(driver)
+        except Exception as e:
+            logger.warning(f"Erro ao restaurar sessão: {str(e)}")
+            return False
+
+    def _injetar_cookies(self, driver, url_inicial, cookies):
+        # Via CDP os cookies podem ser definidos sem carregar uma página do domínio antes
+        if hasattr(driver, 'execute_cdp_cmd'):
+            driver.execute_cdp_cmd('Network.enable', {})
+            for cookie in cookies:
+                parametros = {k: v for k, v in cookie.items() if k in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'expiry', 'sameSite')}
+                if 'expiry' in parametros:
+                    parametros['expires'] = parametros.pop('expiry')
+                parametros.setdefault('url', url_inicial)
+                driver.execute_cdp_cmd('Network.setCookie', parametros)
+            return
+
+        driver.get(url_inicial)
+        for cookie in cookies:
+            driver.add_cookie(cookie)
+
+    def _na_pagina_login(self, driver):
+        return "ICLogin" in driver.current_url
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Arquivos de estado dos singletons dos módulos fora do diretório do projeto
+_ESTADO = tempfile.mkdtemp(prefix='pixcard-testes-')
+for variavel, nome in (('CEP_CACHE_ARQUIVO', 'cep.sqlite3'), ('CHECKPOINTS_ARQUIVO', 'checkpoints.jsonl'),
+                       ('IDEMPOTENCIA_ARQUIVO', 'idempotencia.sqlite3'), ('NOTIFICACOES_ARQUIVO', 'notificacoes.sqlite3'),
+                       ('AREA_TRABALHO_DIR', 'areas'), ('DOCUMENTOS_DIR', 'documentos'),
+                       ('DOCUMENTOS_BAIXADOS_DIR', 'baixados')):
+    os.environ[variavel] = os.path.join(_ESTADO, nome)
+
+import mock_portal
+
+
+@pytest.fixture(scope='session')
+def _servidor():
+    servidor, base = mock_portal.iniciar_servidor()
+    yield base
+    servidor.shutdown()
+
+
+@pytest.fixture
+def portal(_servidor, monkeypatch):
+    """URL base do mock_portal, com todos os atrasos zerados (o teste pode definir os que precisar)"""
+    for tipo in mock_portal.ATRASOS:
+        monkeypatch.setitem(mock_portal.ATRASOS, tipo, 0)
+    return _servidor
+
+
+@pytest.fixture
+def contexto(portal, tmp_path, monkeypatch):
+    """Lead completo do benchmark, com documentos em tmp_path e CEP e notificações apontados para o mock"""
+    from benchmark import LEAD_EXEMPLO, criar_documentos
+    from cep import resolvedor_cep
+    from contexto import ContextoCadastro
+
+    monkeypatch.setattr(resolvedor_cep, 'url_base', portal + '/ws')
+    monkeypatch.setenv('API_URL', portal + '/api/status')
+    return ContextoCadastro().atualizar(dict(LEAD_EXEMPLO, **criar_documentos(str(tmp_path), tamanho=16 * 1024)))
+
+
+@pytest.fixture(scope='session')
+def cliente_s3(_servidor):
+    """Cliente S3 do bucket simulado pelo mock (endereçamento por caminho, como DO_SPACES_ENDERECAMENTO=path)"""
+    import boto3
+    from botocore.client import Config
+
+    return boto3.session.Session().client('s3', region_name='us-east-1', endpoint_url=_servidor,
+                                          aws_access_key_id='teste', aws_secret_access_key='teste',
+                                          config=Config(s3={'addressing_style': 'path'}))
+
+
+def contador(nome):
+    return mock_portal.estado.estatisticas()[nome]
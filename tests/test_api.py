@@ -0,0 +1,54 @@
+import asyncio
+
+import api
+
+
+def enviar(corpo, headers):
+    """Executa um POST de documentos direto na aplicação ASGI, com o corpo em pedaços; retorna
+    (status, pedaços lidos pela aplicação)"""
+    pedacos = list(corpo)
+    lidos = 0
+    respostas = []
+
+    async def receive():
+        nonlocal lidos
+        if lidos < len(pedacos):
+            lidos += 1
+            return {'type': 'http.request', 'body': pedacos[lidos - 1], 'more_body': lidos < len(pedacos)}
+        return {'type': 'http.disconnect'}
+
+    async def send(mensagem):
+        respostas.append(mensagem)
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+             'path': '/simular-e-cadastrar', 'raw_path': b'/simular-e-cadastrar', 'query_string': b'',
+             'root_path': '', 'headers': headers, 'client': ('127.0.0.1', 1), 'server': ('127.0.0.1', 8000)}
+    asyncio.run(api.app(scope, receive, send))
+    return respostas[0]['status'], lidos
+
+
+def corpo_multipart(tamanho, pedaco=api.BLOCO):
+    yield b'--limite\r\nContent-Disposition: form-data; name="arquivo_rg_verso"; filename="rg.jpg"\r\n' \
+          b'Content-Type: image/jpeg\r\n\r\n'
+    for _ in range(tamanho // pedaco):
+        yield b'\xff' * pedaco
+
+
+MULTIPART = (b'content-type', b'multipart/form-data; boundary=limite')
+
+
+def test_content_length_acima_do_limite_recusado_sem_ler():
+    tamanho = api.ENVIO_TAMANHO_MAXIMO + 1
+    status, lidos = enviar(corpo_multipart(tamanho), [MULTIPART, (b'content-length', str(tamanho).encode())])
+
+    assert status == 413
+    assert lidos == 0
+
+
+def test_envio_chunked_interrompido_ao_passar_do_limite():
+    tamanho = api.ENVIO_TAMANHO_MAXIMO * 2
+    status, lidos = enviar(corpo_multipart(tamanho), [MULTIPART, (b'transfer-encoding', b'chunked')])
+
+    assert status == 413
+    # A leitura para no primeiro pedaço acima do limite, sem consumir o resto do corpo
+    assert lidos <= api.ENVIO_TAMANHO_MAXIMO // api.BLOCO + 2
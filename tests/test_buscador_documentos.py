@@ -0,0 +1,68 @@
+import pytest
+
+import mock_portal
+from area_trabalho import GerenciadorAreas
+from buscador_documentos import BuscadorDocumentos
+from conftest import contador
+from repositorio_documentos import RepositorioDocumentos
+
+
+@pytest.fixture
+def area(tmp_path):
+    gerenciador = GerenciadorAreas(str(tmp_path / 'areas'), repositorio=RepositorioDocumentos(str(tmp_path / 'documentos')))
+    area = gerenciador.criar()
+    yield area
+    area.remover()
+
+
+@pytest.fixture
+def buscador(cliente_s3):
+    return BuscadorDocumentos(cliente_s3, mock_portal.BUCKET, 'testes')
+
+
+def ler(caminho):
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('esquema', ['http', 'do'])
+def test_documento_sem_alteracao_nao_e_baixado_de_novo(portal, area, buscador, esquema):
+    chave = f'testes/rg-{esquema}.jpg'
+    referencia = f'{portal}/{mock_portal.BUCKET}/{chave}' if esquema == 'http' else f'do://rg-{esquema}.jpg'
+    mock_portal.estado.guardar_objeto(chave, b'versao 1')
+
+    baixados = contador('objetos_baixados')
+    primeiro = buscador.buscar(referencia, area)
+    assert ler(primeiro) == b'versao 1'
+    assert contador('objetos_baixados') - baixados == 1
+
+    nao_modificados = contador('objetos_nao_modificados')
+    segundo = buscador.buscar(referencia, area)
+    assert ler(segundo) == b'versao 1'
+    assert contador('objetos_baixados') - baixados == 1
+    assert contador('objetos_nao_modificados') - nao_modificados == 1
+
+    mock_portal.estado.guardar_objeto(chave, b'versao 2')
+    assert ler(buscador.buscar(referencia, area)) == b'versao 2'
+    assert contador('objetos_baixados') - baixados == 2
+
+
+def test_sem_repositorio_nas_areas_usa_as_copias_do_buscador(portal, tmp_path, cliente_s3):
+    buscador = BuscadorDocumentos(cliente_s3, mock_portal.BUCKET, 'testes',
+                                  repositorio=RepositorioDocumentos(str(tmp_path / 'baixados')))
+    gerenciador = GerenciadorAreas(str(tmp_path / 'areas'))
+    mock_portal.estado.guardar_objeto('testes/sem-repositorio.jpg', b'conteudo')
+    referencia = f'{portal}/{mock_portal.BUCKET}/testes/sem-repositorio.jpg'
+
+    baixados = contador('objetos_baixados')
+    nao_modificados = contador('objetos_nao_modificados')
+    with gerenciador.criar() as area:
+        assert ler(buscador.buscar(referencia, area)) == b'conteudo'
+    # Outro job, com a área do primeiro já apagada, recebe a sua própria cópia sem baixar de novo
+    with gerenciador.criar() as area:
+        caminho = buscador.buscar(referencia, area)
+        assert caminho.startswith(area.caminho)
+        assert ler(caminho) == b'conteudo'
+
+    assert contador('objetos_baixados') - baixados == 1
+    assert contador('objetos_nao_modificados') - nao_modificados == 1
@@ -0,0 +1,67 @@
+import threading
+
+import mock_portal
+from cep import ResolvedorCEP
+from conftest import contador
+
+
+def resolvedor(portal, tmp_path, **kwargs):
+    return ResolvedorCEP(url_base=portal + '/ws', arquivo_cache=str(tmp_path / 'cep.sqlite3'), **kwargs)
+
+
+def test_segunda_consulta_vem_da_memoria(portal, tmp_path):
+    cep = resolvedor(portal, tmp_path)
+    antes = contador('ceps')
+
+    assert cep.consultar('69301-000')['logradouro'] == 'RUA DAS FLORES'
+    assert cep.consultar('69301000')['logradouro'] == 'RUA DAS FLORES'
+    assert contador('ceps') - antes == 1
+
+
+def test_cache_em_disco_sobrevive_a_reinicio(portal, tmp_path):
+    resolvedor(portal, tmp_path).consultar('69301-001')
+    antes = contador('ceps')
+
+    assert resolvedor(portal, tmp_path).consultar('69301-001')['cep'] == '69301001'
+    assert contador('ceps') == antes
+
+
+def test_cache_em_disco_vencido_consulta_de_novo(portal, tmp_path):
+    resolvedor(portal, tmp_path, ttl=0).consultar('69301-002')
+    antes = contador('ceps')
+
+    assert resolvedor(portal, tmp_path, ttl=0).consultar('69301-002')['cep'] == '69301002'
+    assert contador('ceps') - antes == 1
+
+
+def test_cep_invalido_nao_consulta(portal, tmp_path):
+    antes = contador('ceps')
+
+    assert resolvedor(portal, tmp_path).consultar('6930') is None
+    assert contador('ceps') == antes
+
+
+def test_consultas_simultaneas_fazem_uma_requisicao(portal, tmp_path, monkeypatch):
+    monkeypatch.setitem(mock_portal.ATRASOS, 'cep', 0.2)
+    cep = resolvedor(portal, tmp_path)
+    antes = contador('ceps')
+    resultados = []
+
+    threads = [threading.Thread(target=lambda: resultados.append(cep.consultar('69301-003'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [dados['cep'] for dados in resultados] == ['69301003'] * 8
+    assert contador('ceps') - antes == 1
+
+
+def test_consultar_aproveita_o_prefetch(portal, tmp_path, monkeypatch):
+    monkeypatch.setitem(mock_portal.ATRASOS, 'cep', 0.2)
+    cep = resolvedor(portal, tmp_path)
+    antes = contador('ceps')
+
+    cep.prefetch('69301-004')
+    assert cep.consultar('69301-004')['cep'] == '69301004'
+    assert contador('ceps') - antes == 1
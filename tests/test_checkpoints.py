@@ -0,0 +1,34 @@
+import pytest
+
+import mock_portal
+from checkpoints import RegistroCheckpoints
+from conftest import contador
+from motor_http import SessaoPortal, SessoesHTTP
+from pipeline import PipelineHTTP, ErroEtapa, ORDEM_ETAPAS, LOGIN, DOCUMENTOS, APROVACAO
+
+
+def test_documento_recusado_nao_conclui_a_etapa(portal, contexto, tmp_path):
+    arquivo = str(tmp_path / 'checkpoints.jsonl')
+    pipeline = PipelineHTTP(SessoesHTTP(), portal + mock_portal.SIMULACAO)
+
+    def recusar(contexto):
+        # Só o primeiro documento é recusado; os outros dois são enviados
+        mock_portal.estado.recusar(1)
+        return contexto
+
+    checkpoint = RegistroCheckpoints(arquivo).abrir('job-documentos', contexto)
+    with pytest.raises(ErroEtapa) as erro:
+        pipeline.executar(SessaoPortal(), contexto, ORDEM_ETAPAS, checkpoint=checkpoint, preparar={DOCUMENTOS: recusar})
+    assert erro.value.etapa == DOCUMENTOS
+    assert not checkpoint.concluiu(DOCUMENTOS)
+
+    # Retomada como depois de reiniciar o processo: só as etapas concluídas são puladas
+    aprovadas = contador('aprovadas')
+    checkpoint = RegistroCheckpoints(arquivo).abrir('job-documentos', contexto)
+    resultados = pipeline.executar(SessaoPortal(), contexto, ORDEM_ETAPAS, checkpoint=checkpoint)
+
+    retomadas = [r['etapa'] for r in resultados if r.get('retomada')]
+    assert retomadas == [etapa for etapa in ORDEM_ETAPAS if etapa not in (LOGIN, DOCUMENTOS, APROVACAO)]
+    assert all(r['sucesso'] for r in resultados)
+    assert checkpoint.concluiu(DOCUMENTOS) and checkpoint.concluiu(APROVACAO)
+    assert contador('aprovadas') - aprovadas == 1
@@ -0,0 +1,66 @@
+import pytest
+
+import mock_portal
+from concorrencia import ControladorConcorrencia, REDUCAO
+from conftest import contador
+from motor_http import SessaoPortal, SessoesHTTP
+from pipeline import PipelineHTTP, ErroEtapa, ORDEM_ETAPAS, SIMULACAO
+
+# Etapas de um job que o controle observa (todas menos o login)
+ETAPAS_OBSERVADAS = len(ORDEM_ETAPAS) - 1
+
+
+@pytest.fixture
+def controlador():
+    # Uma decisão a cada job completo, sem esperar a janela de tempo
+    return ControladorConcorrencia(inicial=4, minima=1, maxima=8, janela=0, amostras=ETAPAS_OBSERVADAS, ativo=True)
+
+
+@pytest.fixture
+def pipeline(portal, controlador):
+    return PipelineHTTP(SessoesHTTP(), portal + mock_portal.SIMULACAO, observar=controlador.observar)
+
+
+def executar(pipeline, contexto, preparar=None):
+    return pipeline.executar(SessaoPortal(), contexto, ORDEM_ETAPAS, preparar=preparar)
+
+
+def test_portal_estavel_mantem_o_limite(portal, contexto, controlador, pipeline, monkeypatch):
+    monkeypatch.setitem(mock_portal.ATRASOS, 'postback', 0.01)
+    for _ in range(3):
+        executar(pipeline, contexto)
+
+    assert controlador.limite == 4
+    assert controlador.decisoes[REDUCAO] == 0
+
+
+def test_recusas_do_portal_reduzem_o_limite(portal, contexto, controlador, pipeline):
+    executar(pipeline, contexto)
+    recusadas = contador('recusadas')
+
+    def recusar(contexto):
+        # Depois do login, para que a recusa caia na simulação e não no login, que o controle ignora
+        mock_portal.estado.recusar(1)
+        return contexto
+
+    for _ in range(ETAPAS_OBSERVADAS):
+        with pytest.raises(ErroEtapa) as erro:
+            executar(pipeline, contexto, preparar={SIMULACAO: recusar})
+        assert erro.value.etapa == SIMULACAO
+        assert erro.value.limitada
+
+    assert contador('recusadas') - recusadas == ETAPAS_OBSERVADAS
+    assert controlador.decisoes[REDUCAO] == 1
+    assert controlador.limite == 2
+
+
+def test_portal_lento_reduz_o_limite(portal, contexto, controlador, pipeline, monkeypatch):
+    executar(pipeline, contexto)
+    assert controlador.decisoes[REDUCAO] == 0
+
+    # Cerca de 20 postbacks por job: bem acima de CONCORRENCIA_LENTIDAO_MAXIMA em relação ao mock sem atrasos
+    monkeypatch.setitem(mock_portal.ATRASOS, 'postback', 0.15)
+    executar(pipeline, contexto)
+
+    assert controlador.decisoes[REDUCAO] == 1
+    assert controlador.limite == 2
@@ -0,0 +1,26 @@
+import mock_portal
+from conftest import contador
+from motor_http import SessaoPortal, SessoesHTTP
+from pipeline import PipelineHTTP, ORDEM_ETAPAS, HTTP
+
+
+def test_job_completo_aprova_a_proposta(portal, contexto):
+    aprovadas = contador('aprovadas')
+    pipeline = PipelineHTTP(SessoesHTTP(), portal + mock_portal.SIMULACAO)
+
+    resultados = pipeline.executar(SessaoPortal(), contexto, ORDEM_ETAPAS)
+
+    assert [r['etapa'] for r in resultados] == ORDEM_ETAPAS
+    assert all(r['sucesso'] and r['motor'] == HTTP for r in resultados)
+    assert contador('aprovadas') - aprovadas == 1
+
+
+def test_sessao_reaproveitada_no_segundo_job(portal, contexto):
+    sessoes = SessoesHTTP()
+    pipeline = PipelineHTTP(sessoes, portal + mock_portal.SIMULACAO)
+    pipeline.executar(SessaoPortal(), contexto, ORDEM_ETAPAS)
+    sessoes_abertas = contador('sessoes')
+
+    pipeline.executar(SessaoPortal(), contexto, ORDEM_ETAPAS)
+
+    assert contador('sessoes') == sessoes_abertas
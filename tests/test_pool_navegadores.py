@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from pool_navegadores import NavegadorPool
+
+
+class DriverFalso:
+    """Só o que o pool usa de um WebDriver"""
+
+    current_url = 'about:blank'
+
+    def __init__(self, fechados):
+        self.fechados = fechados
+
+    def quit(self):
+        self.fechados.append(self)
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script):
+        pass
+
+    def get(self, url):
+        pass
+
+
+def test_encerrar_fecha_os_navegadores_emprestados():
+    fechados = []
+    pool = NavegadorPool(tamanho=2, fabrica=lambda: DriverFalso(fechados))
+    pool.iniciar()
+    emprestado = threading.Event()
+    devolver = threading.Event()
+
+    def job():
+        with pool.emprestar():
+            emprestado.set()
+            devolver.wait()
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    emprestado.wait()
+
+    pool.encerrar()
+    assert len(fechados) == 2
+
+    # A devolução depois do encerramento não fecha de novo nem volta para o pool
+    devolver.set()
+    thread.join()
+    assert len(fechados) == 2
+    assert pool.estatisticas()['total'] == 0
+    with pytest.raises(RuntimeError):
+        with pool.emprestar(timeout=0.1):
+            pass
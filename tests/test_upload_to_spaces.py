@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import mock_portal
+import upload_to_spaces
+from conftest import contador
+
+
+@pytest.fixture
+def arquivos(portal, cliente_s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_to_spaces, 'client', cliente_s3)
+    diretorio = tmp_path / 'lote'
+    diretorio.mkdir()
+    (diretorio / 'pequeno.jpg').write_bytes(os.urandom(64 * 1024))
+    # Acima de UPLOAD_MULTIPART_LIMITE (8MB): enviado em duas partes
+    (diretorio / 'grande.pdf').write_bytes(os.urandom(9 * upload_to_spaces.MB))
+    return upload_to_spaces.ler_entrada(str(diretorio))
+
+
+def enviar(arquivos, pasta):
+    return upload_to_spaces.enviar_lote(arquivos, mock_portal.BUCKET, pasta)
+
+
+def test_reenvio_pula_arquivos_sem_alteracao(arquivos):
+    enviados = contador('objetos_enviados')
+
+    assert enviar(arquivos, 'upload-1')['enviado'] == 2
+    assert contador('objetos_enviados') - enviados == 2
+
+    resumo = enviar(arquivos, 'upload-1')
+    assert (resumo['enviado'], resumo['ignorado'], resumo['falhou']) == (0, 2, 0)
+    assert contador('objetos_enviados') - enviados == 2
+
+
+def test_so_o_arquivo_alterado_e_reenviado(arquivos):
+    enviar(arquivos, 'upload-2')
+    pequeno = next(file['local'] for file in arquivos if file['spaces'] == 'pequeno.jpg')
+    with open(pequeno, 'ab') as f:
+        f.write(b'alterado')
+
+    resumo = enviar(arquivos, 'upload-2')
+    assert (resumo['enviado'], resumo['ignorado']) == (1, 1)
+    assert resumo['bytes'] == os.path.getsize(pequeno)
+
+
+def test_etag_multipart_calculado_confere_com_o_listado(arquivos):
+    enviar(arquivos, 'upload-3')
+    etags = upload_to_spaces.listar_etags(mock_portal.BUCKET, 'upload-3/')
+
+    for file in arquivos:
+        assert etags[f"upload-3/{file['spaces']}"] == upload_to_spaces.calcular_etag(file['local'])
+    assert etags['upload-3/grande.pdf'].endswith('-2"')
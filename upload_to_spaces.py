@@ -1,11 +1,44 @@
 import boto3
 from botocore.client import Config
+from boto3.s3.transfer import TransferConfig
+from s3transfer.utils import ChunksizeAdjuster
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import sys
+import json
+import time
+import hashlib
+import argparse
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+MB = 1024 * 1024
+
+# Uploads simultâneos (arquivos) e partes simultâneas de cada upload multipart
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '8'))
+UPLOAD_PARTES_SIMULTANEAS = int(os.getenv('UPLOAD_PARTES_SIMULTANEAS', '4'))
+# Arquivos a partir deste tamanho vão em partes (multipart) desse tamanho
+UPLOAD_MULTIPART_LIMITE = int(os.getenv('UPLOAD_MULTIPART_LIMITE', str(8 * MB)))
+UPLOAD_MULTIPART_PARTE = int(os.getenv('UPLOAD_MULTIPART_PARTE', str(8 * MB)))
+
+# Arquivos enviados quando nenhuma entrada é informada
+ARQUIVOS_EXEMPLO = [
+    {
+        'local': 'documentos/cnh.jpg',
+        'spaces': '1747591031684734949-rg2.jpg'
+    },
+    {
+        'local': 'documentos/cch.jpg',
+        'spaces': '1747591052268341173-residencia2.jpg'
+    },
+    {
+        'local': 'documentos/residencia.jpg',
+        'spaces': '1747591067021033417-cc2.jpg'
+    }
+]
+
 # Configuração do cliente DO Spaces
 session = boto3.session.Session()
 client = session.client('s3',
@@ -13,53 +46,146 @@ client = session.client('s3',
     endpoint_url=os.getenv('DO_SPACES_ENDPOINT'),
     aws_access_key_id=os.getenv('DO_SPACES_KEY'),
     aws_secret_access_key=os.getenv('DO_SPACES_SECRET'),
-    config=Config(s3={'addressing_style': 'virtual'})
+    config=Config(s3={'addressing_style': os.getenv('DO_SPACES_ENDERECAMENTO', 'virtual')},
+                  max_pool_connections=UPLOAD_WORKERS * UPLOAD_PARTES_SIMULTANEAS)
+)
+
+transferencia = TransferConfig(
+    multipart_threshold=UPLOAD_MULTIPART_LIMITE,
+    multipart_chunksize=UPLOAD_MULTIPART_PARTE,
+    max_concurrency=UPLOAD_PARTES_SIMULTANEAS
 )
 
-def upload_file(local_file, spaces_path):
-    """Faz upload de um arquivo para o DO Spaces"""
+
+def caminho_completo(spaces_path, folder=None):
+    folder = os.getenv('DO_SPACES_FOLDER') if folder is None else folder
+    return f"{folder.strip('/')}/{spaces_path}" if folder else spaces_path
+
+
+def calcular_etag(local_file, config=transferencia):
+    """ETag que o Spaces vai gerar para o arquivo enviado com este TransferConfig.
+
+    Upload simples: md5 do conteúdo. Multipart: md5 dos md5 de cada parte seguido de
+    "-<número de partes>", com as partes do mesmo tamanho que o upload_file usaria.
+    """
+    tamanho = os.path.getsize(local_file)
+    if tamanho < config.multipart_threshold:
+        md5 = hashlib.md5()
+        with open(local_file, 'rb') as f:
+            for bloco in iter(lambda: f.read(MB), b''):
+                md5.update(bloco)
+        return f'"{md5.hexdigest()}"'
+    parte = ChunksizeAdjuster().adjust_chunksize(config.multipart_chunksize, tamanho)
+    digests = []
+    with open(local_file, 'rb') as f:
+        for bloco in iter(lambda: f.read(parte), b''):
+            digests.append(hashlib.md5(bloco).digest())
+    return f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}"'
+
+
+def listar_etags(bucket, prefixo):
+    """ETags de todos os objetos sob o prefixo, numa listagem paginada (em vez de um HEAD por arquivo)"""
+    etags = {}
+    paginador = client.get_paginator('list_objects_v2')
+    for pagina in paginador.paginate(Bucket=bucket, Prefix=prefixo):
+        for objeto in pagina.get('Contents', []):
+            etags[objeto['Key']] = objeto['ETag']
+    return etags
+
+
+def upload_file(local_file, spaces_path, bucket=None, folder=None, etag_remoto=None, forcar=False):
+    """Faz upload de um arquivo para o DO Spaces, pulando-o se o conteúdo remoto já é o mesmo.
+
+    Retorna 'enviado', 'ignorado' ou 'falhou'.
+    """
     try:
-        bucket = os.getenv('DO_SPACES_BUCKET')
-        folder = os.getenv('DO_SPACES_FOLDER')
-        full_path = f"{folder}/{spaces_path}"
-        
+        bucket = bucket or os.getenv('DO_SPACES_BUCKET')
+        full_path = caminho_completo(spaces_path, folder)
+
+        if etag_remoto and not forcar and calcular_etag(local_file) == etag_remoto:
+            return 'ignorado'
+
         print(f"Fazendo upload de {local_file} para {full_path}")
-        client.upload_file(local_file, bucket, full_path)
-        print(f"Upload concluído com sucesso!")
-        
-        # Verifica se o arquivo foi realmente enviado
+        client.upload_file(local_file, bucket, full_path, Config=transferencia)
+        return 'enviado'
+
+    except Exception as e:
+        print(f"Erro ao fazer upload de {local_file}: {str(e)}")
+        return 'falhou'
+
+
+def ler_entrada(entrada):
+    """Arquivos a enviar: todos os de um diretório (o caminho relativo vira a chave) ou um
+    manifesto JSONL com {"local": ..., "spaces": ...} por linha"""
+    if entrada is None:
+        return ARQUIVOS_EXEMPLO
+    if os.path.isdir(entrada):
+        files = []
+        for raiz, _, nomes in os.walk(entrada):
+            for nome in sorted(nomes):
+                local = os.path.join(raiz, nome)
+                files.append({'local': local, 'spaces': os.path.relpath(local, entrada).replace(os.sep, '/')})
+        return files
+    with open(entrada, encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def enviar_lote(files, bucket=None, folder=None, workers=UPLOAD_WORKERS, forcar=False):
+    """Envia os arquivos em paralelo e retorna o resumo (contagens, bytes e tempo)"""
+    bucket = bucket or os.getenv('DO_SPACES_BUCKET')
+    folder = os.getenv('DO_SPACES_FOLDER') if folder is None else folder
+    prefixo = caminho_completo('', folder)
+    inicio = time.perf_counter()
+
+    etags = {}
+    if not forcar:
         try:
-            client.head_object(Bucket=bucket, Key=full_path)
-            print(f"Arquivo verificado com sucesso em {full_path}")
+            etags = listar_etags(bucket, prefixo)
+            print(f"{len(etags)} objetos já existentes em {bucket}/{prefixo}")
         except Exception as e:
-            print(f"Erro ao verificar arquivo: {str(e)}")
-            
-    except Exception as e:
-        print(f"Erro ao fazer upload: {str(e)}")
+            print(f"Erro ao listar objetos existentes, enviando todos: {str(e)}")
 
-def main():
-    # Lista de arquivos para upload
-    files = [
-        {
-            'local': 'documentos/cnh.jpg',
-            'spaces': '1747591031684734949-rg2.jpg'
-        },
-        {
-            'local': 'documentos/cch.jpg',
-            'spaces': '1747591052268341173-residencia2.jpg'
-        },
-        {
-            'local': 'documentos/residencia.jpg',
-            'spaces': '1747591067021033417-cc2.jpg'
-        }
-    ]
-    
-    # Faz upload de cada arquivo
-    for file in files:
-        if os.path.exists(file['local']):
-            upload_file(file['local'], file['spaces'])
-        else:
+    resumo = {'enviado': 0, 'ignorado': 0, 'falhou': 0, 'bytes': 0}
+
+    def enviar(file):
+        if not os.path.exists(file['local']):
             print(f"Arquivo local não encontrado: {file['local']}")
+            return 'falhou', 0
+        etag = etags.get(caminho_completo(file['spaces'], folder))
+        resultado = upload_file(file['local'], file['spaces'], bucket, folder, etag, forcar)
+        return resultado, os.path.getsize(file['local']) if resultado == 'enviado' else 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for futuro in as_completed([executor.submit(enviar, file) for file in files]):
+            resultado, tamanho = futuro.result()
+            resumo[resultado] += 1
+            resumo['bytes'] += tamanho
+
+    resumo['duracao'] = time.perf_counter() - inicio
+    return resumo
+
+
+def imprimir_resumo(resumo):
+    duracao = max(resumo['duracao'], 1e-9)
+    total = resumo['enviado'] + resumo['ignorado'] + resumo['falhou']
+    print(f"\n{total} arquivos em {resumo['duracao']:.1f}s: {resumo['enviado']} enviados, "
+          f"{resumo['ignorado']} sem alteração, {resumo['falhou']} com erro")
+    print(f"Vazão: {resumo['bytes'] / MB / duracao:.2f} MB/s, {total / duracao:.1f} arquivos/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia documentos para o DO Spaces em paralelo")
+    parser.add_argument('entrada', nargs='?',
+                        help="Diretório ou manifesto JSONL ({\"local\", \"spaces\"} por linha); sem ela, os arquivos de exemplo")
+    parser.add_argument('--pasta', default=None, help="Pasta no bucket (padrão: DO_SPACES_FOLDER)")
+    parser.add_argument('--workers', type=int, default=UPLOAD_WORKERS, help="Uploads simultâneos")
+    parser.add_argument('--forcar', action='store_true', help="Envia mesmo os arquivos que não mudaram")
+    args = parser.parse_args()
+
+    resumo = enviar_lote(ler_entrada(args.entrada), folder=args.pasta, workers=args.workers, forcar=args.forcar)
+    imprimir_resumo(resumo)
+    if resumo['falhou']:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()